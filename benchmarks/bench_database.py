@@ -0,0 +1,80 @@
+"""Benchmark guild settings reads and writes per second.
+
+"before" replays the old pattern of opening a connection per statement in the
+default rollback-journal mode; "after" goes through Database, which keeps one
+WAL connection per thread and serves reads from its in-memory copy.
+
+Run from the repository root:
+    python -m benchmarks.bench_database
+"""
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from database.db import Database
+
+GUILDS = 500
+OPERATIONS = 5000
+
+
+def rate(func, operations=OPERATIONS):
+    start = time.perf_counter()
+    for i in range(operations):
+        func(i % GUILDS + 1)
+    return operations / (time.perf_counter() - start)
+
+
+def connect_per_call(db_path):
+    def write(guild_id):
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            'INSERT INTO guild_settings (guild_id, embed_color) VALUES (?, ?) '
+            'ON CONFLICT(guild_id) DO UPDATE SET embed_color = ?',
+            (guild_id, "7289DA", "7289DA")
+        )
+        conn.commit()
+        conn.close()
+
+    def read(guild_id):
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            'SELECT embed_color, random_card_schedule, random_card_channel_id '
+            'FROM guild_settings WHERE guild_id = ?', (guild_id,)
+        ).fetchone()
+        conn.close()
+
+    return write, read
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = str(Path(tmp) / "before.db")
+        conn = sqlite3.connect(before_path)
+        conn.execute(
+            'CREATE TABLE guild_settings (guild_id INTEGER PRIMARY KEY, embed_color TEXT, '
+            'random_card_schedule TEXT, random_card_channel_id INTEGER)'
+        )
+        conn.close()
+        write, read = connect_per_call(before_path)
+        before_writes = rate(write)
+        before_reads = rate(read)
+
+        db = Database(str(Path(tmp) / "after.db"))
+        after_writes = rate(lambda guild_id: db.set_embed_color(guild_id, "7289DA"))
+        after_reads = rate(db.get_guild_settings, OPERATIONS * 20)
+        select = db._connect().execute
+        after_sql_reads = rate(lambda guild_id: select(
+            'SELECT embed_color, random_card_schedule, random_card_channel_id '
+            'FROM guild_settings WHERE guild_id = ?', (guild_id,)
+        ).fetchone())
+        Database.close_connections()
+
+    print(f"{'':24}{'before':>12}{'after':>12}")
+    print(f"{'writes/s':24}{before_writes:12.0f}{after_writes:12.0f}")
+    print(f"{'reads/s (SQL)':24}{before_reads:12.0f}{after_sql_reads:12.0f}")
+    print(f"{'reads/s (get_*)':24}{before_reads:12.0f}{after_reads:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
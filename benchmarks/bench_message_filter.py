@@ -0,0 +1,66 @@
+"""Benchmark how many ordinary chat messages per second get through MessageCommand.handle_message.
+
+Almost all messages a large bot sees contain no [[card]] lookup, so this measures the
+cost of turning them away. The "before" figure reproduces the previous on_message path:
+read ALLOW_READ_MESSAGE from the environment, then run an uncompiled regex.
+
+Run from the repository root:
+    python -m benchmarks.bench_message_filter
+"""
+import asyncio
+import os
+import re
+import time
+from types import SimpleNamespace
+
+from not_scryfall.message_commands import MessageCommand
+from not_scryfall.send_queue import SendQueue
+
+MESSAGES = 200_000
+CHAT = [
+    "anyone up for commander tonight?",
+    "lol that topdeck was disgusting",
+    "I think the new set looks great, especially the lands " * 4,
+    "[not a lookup] just brackets",
+    "gg",
+]
+
+
+def make_messages(author):
+    return [
+        SimpleNamespace(content=CHAT[index % len(CHAT)], author=author, guild=None)
+        for index in range(MESSAGES)
+    ]
+
+
+async def before(messages, bot):
+    start = time.perf_counter()
+    for message in messages:
+        if message.author == bot.user:
+            continue
+        if os.getenv("ALLOW_READ_MESSAGE", 'true').lower() == 'true':
+            card_names = re.findall(r"\[\[(.*?)\]\]", message.content)
+            if not card_names:
+                continue
+    return time.perf_counter() - start
+
+
+async def after(messages, bot):
+    # Messages without a lookup never send anything, so the queue stays idle
+    command = MessageCommand(bot, SendQueue())
+    start = time.perf_counter()
+    for message in messages:
+        await command.handle_message(message)
+    return time.perf_counter() - start
+
+
+def main():
+    bot = SimpleNamespace(user=object())
+    messages = make_messages(author=object())
+    for label, run in (("before", before), ("after", after)):
+        elapsed = min(asyncio.run(run(messages, bot)) for _ in range(3))
+        print(f"{label:8}{MESSAGES / elapsed:14,.0f} messages/s  ({elapsed / MESSAGES * 1e9:6.0f} ns each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark Helper.parse_schedule latency and the import time saved by loading dateparser lazily.
+
+Run from the repository root:
+    python -m benchmarks.bench_parse_schedule
+"""
+import subprocess
+import sys
+import timeit
+
+from not_scryfall.helpers import Helper
+
+SCHEDULES = [
+    "every day at 5PM",
+    "Every Monday at 10:30AM",
+    "daily 17:00",
+    "0 9 * * *",
+    "every friday at noon",
+]
+FALLBACK_SCHEDULE = "every day at half past five in the evening"
+
+
+def time_per_call(func, arg, number):
+    return timeit.timeit(lambda: func(arg), number=number) / number
+
+
+def import_time(statement):
+    """Wall time of a fresh interpreter running statement, minus a bare interpreter"""
+    def run(code):
+        best = float("inf")
+        for _ in range(5):
+            start = timeit.default_timer()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            best = min(best, timeit.default_timer() - start)
+        return best
+    return run(statement) - run("pass")
+
+
+def main():
+    print("Fast path (no dateparser):")
+    for schedule in SCHEDULES:
+        per_call = time_per_call(Helper.parse_schedule, schedule, 20000)
+        print(f"  {schedule!r:32} {per_call * 1e6:8.2f} us -> {Helper.parse_schedule(schedule)}")
+
+    # Warm the import so only the per-call cost is measured
+    Helper.parse_schedule(FALLBACK_SCHEDULE)
+    per_call = time_per_call(Helper.parse_schedule, FALLBACK_SCHEDULE, 50)
+    print("dateparser fallback:")
+    print(f"  {FALLBACK_SCHEDULE!r:32} {per_call * 1e6:8.2f} us")
+
+    print("Import time:")
+    print(f"  not_scryfall.helpers  {import_time('import not_scryfall.helpers') * 1e3:8.1f} ms")
+    print(f"  dateparser (now lazy) {import_time('import dateparser') * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark startup: import time of the bot and time until on_ready finishes.
+
+The time-to-ready run uses a stand-in gateway (on_ready is called directly, as
+the cluster's stub workers do), so it measures our own startup cost and not
+Discord's. Each run uses a fresh interpreter and an empty data directory.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 5
+
+TIME_TO_READY = f"""
+import time
+start = time.perf_counter()
+import sys, asyncio
+sys.path.insert(0, {str(ROOT)!r})
+from not_scryfall.bot import ScryfallBot
+imported = time.perf_counter()
+scryfall_bot = ScryfallBot()
+constructed = time.perf_counter()
+
+async def ready():
+    await scryfall_bot.bot.on_ready()
+    ready_at = time.perf_counter()
+    await scryfall_bot.db.close()
+    return ready_at
+
+ready_at = asyncio.run(ready())
+print(imported - start, constructed - imported, ready_at - constructed, ready_at - start)
+"""
+
+
+def import_times(module, top=10):
+    """Cumulative import time (us) per module from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            times[match.group(3)] = int(match.group(1))
+    return times
+
+
+def main():
+    times = import_times("not_scryfall.bot")
+    print(f"Import of not_scryfall.bot: {times['not_scryfall.bot'] / 1000:.1f} ms")
+    for name in ("discord", "aiohttp", "croniter", "dateparser", "database.db", "scryfall.scryfall"):
+        status = f"{times[name] / 1000:8.1f} ms" if name in times else "    deferred"
+        print(f"  {name:20}{status}")
+
+    samples = []
+    for _ in range(RUNS):
+        with tempfile.TemporaryDirectory() as data_root:
+            result = subprocess.run(
+                [sys.executable, "-c", TIME_TO_READY],
+                cwd=data_root, capture_output=True, text=True, check=True,
+                env={"ALLOW_READ_MESSAGE": "true", "PATH": ""}
+            )
+            samples.append([float(value) for value in result.stdout.split()[-4:]])
+
+    best = min(samples, key=lambda sample: sample[3])
+    print(f"Time to ready (stub gateway, best of {RUNS}):")
+    for label, value in zip(("import", "construct", "on_ready", "total"), best):
+        print(f"  {label:20}{value * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
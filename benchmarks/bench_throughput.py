@@ -0,0 +1,159 @@
+"""Benchmark lookup throughput and latency end to end, against a local fake Scryfall.
+
+Drives MessageCommand.handle_message, Helper.create_paginated_embed and the slash command
+callbacks with fake Discord objects, and reports p50/p99 latency and lookups per second for
+each. Scryfall's rate limit is lifted unless --rate-limit is given, so the numbers show the
+bot's own overhead; the lookup abuse limits and duplicate detection are turned off as well.
+Card names are drawn with a skew towards popular cards, as in real traffic.
+
+Run from the repository root:
+    python -m benchmarks.bench_throughput
+    python -m benchmarks.bench_throughput --latency 80 --jitter 40 --error-rate 0.01 --requests 500
+"""
+import os
+
+# Must be set before the bot's modules read them
+for variable in ("USER_LOOKUPS_PER_MINUTE", "CHANNEL_LOOKUPS_PER_MINUTE", "GUILD_LOOKUPS_PER_MINUTE",
+                 "DUPLICATE_LOOKUP_WINDOW", "CACHE_SNAPSHOT_INTERVAL"):
+    os.environ.setdefault(variable, "0")
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+from benchmarks.fake_scryfall import FakeScryfall, card_name, generate_cards
+from benchmarks.fakes import FakeChannel, FakeContext, FakeGuild, FakeMessage, FakeUser
+
+PREFIXES = ("", "", "", "!", "$", "?", "#", "@")
+SLASH_COMMANDS = ("card-info", "image", "price", "rulings", "legality", "sets")
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.names = [card_name(index) for index in range(args.cards)]
+        # Zipf-like popularity: the nth card is looked up about 1/n as often as the first
+        self.weights = [1 / (rank + 1) for rank in range(args.cards)]
+        # Enough channels that Discord's per-channel limit in the send queue rarely comes into play
+        self.guilds = [FakeGuild() for _ in range(50)]
+        self.channels = [FakeChannel(guild=guild, send_latency=args.discord_latency / 1000)
+                         for guild in self.guilds for _ in range(40)]
+        self.users = [FakeUser() for _ in range(200)]
+
+    def pick_name(self):
+        return self.rng.choices(self.names, self.weights)[0]
+
+    def setup_bot(self, fake_url):
+        import discord
+        from not_scryfall.bot import ScryfallBot
+        from not_scryfall.helpers import Helper
+        from scryfall.scryfall import ScryfallAPI
+
+        ScryfallAPI.BASE_URL = fake_url
+        if not self.args.rate_limit:
+            ScryfallAPI._min_delay = 0
+            ScryfallAPI._fair_queue.min_delay = 0
+        # No emoji fetches from Discord
+        Helper.emoji_ids, Helper.emoji_ids_loaded_at = {}, time.time()
+        self.bot = ScryfallBot()
+        self.api = ScryfallAPI
+        # Command groups such as /watch have no callback of their own
+        self.slash = {command.name: command.callback for command in self.bot.bot.pending_application_commands
+                      if not isinstance(command, discord.SlashCommandGroup)}
+
+    async def message_op(self):
+        channel = self.rng.choice(self.channels)
+        count = self.rng.choice((1, 1, 1, 2, 3))
+        text = " ".join(f"[[{self.rng.choice(PREFIXES)}{self.pick_name()}]]" for _ in range(count))
+        message = FakeMessage(f"check out {text}", channel, self.rng.choice(self.users), channel.guild)
+        await self.bot.message_command.handle_message(message)
+        return count
+
+    async def paginated_op(self):
+        embed_type = self.rng.choice(("rulings", "sets"))
+        name = self.pick_name()
+        if embed_type == "rulings":
+            card = await self.api.get_rulings(name)
+        else:
+            card = await self.api.get_sets(name)
+        if card:
+            pages = max(1, len(card[embed_type]) // 5)
+            await self.bot.pagination.helper.create_paginated_embed(card, embed_type, self.rng.randrange(pages))
+        return 1
+
+    async def slash_op(self):
+        command = self.rng.choice(SLASH_COMMANDS)
+        ctx = FakeContext(self.rng.choice(self.guilds), self.rng.choice(self.users), self.args.discord_latency / 1000)
+        if command == "sets":
+            await self.slash[command](ctx, self.pick_name())
+        else:
+            await self.slash[command](ctx, self.pick_name(), None)
+        return 1
+
+    async def run(self, name, op, fake):
+        self.api._cache.clear()
+        latencies = []
+        lookups = 0
+        remaining = iter(range(self.args.requests))
+        requests_before = fake.requests
+
+        async def worker():
+            nonlocal lookups
+            for _ in remaining:
+                start = time.perf_counter()
+                count = await op()
+                latencies.append(time.perf_counter() - start)
+                lookups += count
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(f"{name:12}{len(latencies):8}{lookups / elapsed:12.0f}"
+              f"{percentile(latencies, 0.5) * 1000:10.2f}{percentile(latencies, 0.99) * 1000:10.2f}"
+              f"{fake.requests - requests_before:12}")
+
+
+async def main(args):
+    harness = Harness(args)
+    cards = generate_cards(args.cards, args.seed)
+    async with FakeScryfall(cards, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                            error_rate=args.error_rate, seed=args.seed) as fake:
+        harness.setup_bot(fake.url)
+        print(f"Fake Scryfall: {args.latency:.0f} ms + up to {args.jitter:.0f} ms, {args.error_rate:.1%} errors; "
+              f"rate limit {'on' if args.rate_limit else 'off'}; concurrency {args.concurrency}")
+        print(f"{'scenario':12}{'ops':>8}{'lookups/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'scryfall':>12}")
+        scenarios = {"message": harness.message_op, "paginated": harness.paginated_op, "slash": harness.slash_op}
+        for name in args.scenarios:
+            await harness.run(name, scenarios[name], fake)
+        await harness.bot.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=["message", "paginated", "slash"],
+                        choices=["message", "paginated", "slash"])
+    parser.add_argument("--requests", type=int, default=2000, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="operations in flight at once")
+    parser.add_argument("--cards", type=int, default=500, help="size of the card pool")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Scryfall latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many random milliseconds more")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Scryfall responses that fail")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="milliseconds per fake Discord send")
+    parser.add_argument("--rate-limit", action="store_true", help="keep Scryfall's 10 requests per second")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    # The bot keeps its database and snapshots under ./data, so keep them out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="bench-throughput-"))
+    asyncio.run(main(arguments))
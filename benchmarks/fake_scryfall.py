@@ -0,0 +1,246 @@
+"""A local stand-in for the Scryfall API, for benchmarks that must not touch the real one.
+
+Serves the endpoints the bot uses (named, by id, collection, random, rulings and prints searches) from
+fixtures, with configurable latency and error rate. Fixtures are either a generated card
+pool or a JSON file mapping "path?query" to the recorded response body, where "{base}"
+in the body stands for the server's own URL. Every tenth generated card is double-faced,
+with face images served from /images (drawn with Pillow, if it is installed).
+
+Run on its own (from the repository root) to point a real bot at it:
+    python -m benchmarks.fake_scryfall --port 8765 --latency 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import uuid
+
+from aiohttp import web
+
+FORMATS = ("standard", "pioneer", "modern", "legacy", "vintage", "commander", "pauper")
+MANA_COSTS = ("{R}", "{1}{U}", "{2}{G}{G}", "{W}{U}", "{3}{B}{R}", "{X}{G}", "")
+IMAGE_SIZES = {"small": (146, 204), "normal": (488, 680), "large": (672, 936)}
+
+
+def card_name(index: int) -> str:
+    return f"Benchmark Card {index}"
+
+
+def generate_cards(count: int, seed: int = 1, names: list = None) -> dict:
+    """A reproducible pool of cards with rulings and printings, by lowercase name
+
+    Cards are named card_name(0) onwards, or after names when it is given (count is then ignored).
+    """
+    rng = random.Random(seed)
+    cards = {}
+    for index, name in enumerate(names if names is not None else map(card_name, range(count))):
+        card_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        oracle_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        cards[name.lower()] = {
+            "object": "card",
+            "id": card_id,
+            "oracle_id": oracle_id,
+            "name": name,
+            "mana_cost": rng.choice(MANA_COSTS),
+            "type_line": rng.choice(("Creature — Elf", "Instant", "Sorcery", "Artifact", "Legendary Creature — Human")),
+            "oracle_text": " ".join(rng.choice(("Flying", "Draw a card.", "Trample", "Destroy target creature.",
+                                                "Counter target spell.", "Haste")) for _ in range(rng.randint(1, 6))),
+            "scryfall_uri": f"https://scryfall.com/card/bench/{index}",
+            "image_uris": {size: f"https://cards.scryfall.io/{size}/{card_id}.jpg" for size in ("small", "normal", "large")},
+            "legalities": {fmt: rng.choice(("legal", "not_legal", "banned")) for fmt in FORMATS},
+            "rulings_uri": f"{{base}}/cards/{card_id}/rulings",
+            "prints_search_uri": f"{{base}}/cards/search?order=released&q=oracleid%3A{oracle_id}&unique=prints",
+            "_rulings": [
+                {"published_at": f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                 "comment": "A ruling about how this card works. " * rng.randint(1, 4)}
+                for _ in range(rng.choice((0, 1, 2, 5, 12, 30)))
+            ],
+            "_prints": [
+                {"set_name": f"Set {number}", "set": f"s{number:02d}", "collector_number": str(rng.randint(1, 300)),
+                 "released_at": f"20{rng.randint(10, 24)}-01-01",
+                 "prices": {"usd": f"{rng.uniform(0.1, 80):.2f}" if rng.random() > 0.2 else None}}
+                for number in range(rng.choice((1, 3, 8, 30, 60)))
+            ],
+        }
+        card = cards[name.lower()]
+        # Priced like its first printing, as Scryfall prices the card it returns
+        card["set"] = card["_prints"][0]["set"]
+        card["prices"] = dict(card["_prints"][0]["prices"])
+        if index % 10 == 9:
+            del card["image_uris"]
+            card["card_faces"] = [
+                {"name": f"{name} {side}",
+                 "image_uris": {size: f"{{base}}/images/{card_id}/{face}/{size}.jpg" for size in IMAGE_SIZES}}
+                for face, side in enumerate(("Front", "Back"))
+            ]
+    return cards
+
+
+class FakeScryfall:
+    """aiohttp server answering like Scryfall; use as an async context manager"""
+
+    def __init__(self, cards: dict = None, fixtures: dict = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: int = 1):
+        """
+        Args:
+            cards: Generated card pool from generate_cards(); ignored when fixtures are given
+            fixtures: Recorded responses by "path?query"
+            latency: Seconds added to every response
+            jitter: Up to this many seconds more, chosen at random per response
+            error_rate: Share of responses that fail with a 500
+        """
+        self.cards = cards if cards is not None else generate_cards(500, seed)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._by_id = {card["id"]: card for card in self.cards.values()}
+        self._by_oracle = {card["oracle_id"]: card for card in self.cards.values()}
+        self._images = {}  # (face, size) -> JPEG bytes
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @staticmethod
+    def load_fixtures(path: str) -> dict:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _public(self, value):
+        """A card or response with "{base}" pointing here and the private fields dropped"""
+        text = json.dumps({key: item for key, item in value.items() if not key.startswith("_")})
+        return json.loads(text.replace("{base}", self.url))
+
+    def _not_found(self):
+        return web.json_response({"object": "error", "code": "not_found", "status": 404}, status=404)
+
+    def _face_image(self, face: int, size: str):
+        """A plain JPEG the size of a Scryfall image, or None without Pillow"""
+        if (face, size) not in self._images:
+            try:
+                from PIL import Image
+            except ImportError:
+                return None
+            output = io.BytesIO()
+            Image.new("RGB", IMAGE_SIZES[size], ((90, 40, 40), (40, 40, 90))[face % 2]).save(output, "JPEG")
+            self._images[face, size] = output.getvalue()
+        return self._images[face, size]
+
+    async def _delay_or_fail(self):
+        """Wait out the latency, then a 500 response for the share that fail, or None"""
+        self.requests += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"object": "error", "status": 500}, status=500)
+        return None
+
+    async def _collection(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail()
+        if error:
+            return error
+        identifiers = (await request.json()).get("identifiers", [])
+        if len(identifiers) > 75:
+            return web.json_response({"object": "error", "status": 422}, status=422)
+        found, not_found = [], []
+        for identifier in identifiers:
+            if "id" in identifier:
+                card = self._by_id.get(identifier["id"])
+            else:
+                card = self.cards.get(identifier.get("name", "").lower())
+            if card:
+                found.append(self._public(card))
+            else:
+                not_found.append(identifier)
+        return web.json_response({"object": "list", "not_found": not_found, "data": found})
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail()
+        if error:
+            return error
+
+        if self.fixtures is not None:
+            key = request.path_qs.lstrip("/")
+            if key not in self.fixtures:
+                return self._not_found()
+            return web.json_response(json.loads(json.dumps(self.fixtures[key]).replace("{base}", self.url)))
+
+        parts = request.path.strip("/").split("/")
+        if len(parts) == 4 and parts[0] == "images" and parts[3].removesuffix(".jpg") in IMAGE_SIZES:
+            image = self._face_image(int(parts[2]), parts[3].removesuffix(".jpg"))
+            return web.Response(body=image, content_type="image/jpeg") if image else self._not_found()
+        if parts == ["cards", "named"]:
+            card = self.cards.get(request.query.get("fuzzy", "").strip().lower())
+        elif parts == ["cards", "random"]:
+            card = self._rng.choice(list(self.cards.values()))
+        elif parts == ["cards", "search"]:
+            card = self._by_oracle.get(request.query.get("q", "").removeprefix("oracleid:"))
+            if card:
+                return web.json_response({"object": "list", "has_more": False, "data": card["_prints"]})
+        elif len(parts) == 3 and parts[0] == "cards" and parts[2] == "rulings":
+            card = self._by_id.get(parts[1])
+            if card:
+                return web.json_response({"object": "list", "has_more": False, "data": card["_rulings"]})
+        elif len(parts) == 2 and parts[0] == "cards":
+            card = self._by_id.get(parts[1])
+        else:
+            card = None
+        return web.json_response(self._public(card)) if card else self._not_found()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/cards/collection", self._collection)
+        app.router.add_get("/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+async def serve(args):
+    fixtures = FakeScryfall.load_fixtures(args.fixtures) if args.fixtures else None
+    async with FakeScryfall(generate_cards(args.cards), fixtures, args.latency / 1000, args.jitter / 1000,
+                            args.error_rate, port=args.port) as fake:
+        print(f"Fake Scryfall on {fake.url}; cards are named {card_name(0)!r} to {card_name(args.cards - 1)!r}")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cards", type=int, default=500, help="size of the generated card pool")
+    parser.add_argument("--fixtures", help="JSON file of recorded responses to serve instead")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many random milliseconds more")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses that fail with a 500")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
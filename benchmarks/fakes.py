@@ -0,0 +1,98 @@
+"""Minimal stand-ins for the Discord objects the bot's handlers touch, for benchmarks.
+
+They record what the bot sent instead of talking to Discord; each send can be given an
+artificial latency to mimic the Discord API.
+"""
+import asyncio
+import itertools
+
+_ids = itertools.count(10 ** 17)
+
+
+class FakeUser:
+    def __init__(self, user_id: int = None):
+        self.id = user_id or next(_ids)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = None):
+        self.id = guild_id or next(_ids)
+
+
+class FakeMessage:
+    def __init__(self, content: str = "", channel: "FakeChannel" = None, author: FakeUser = None,
+                 guild: FakeGuild = None, embeds: list = None):
+        self.id = next(_ids)
+        self.content = content
+        self.channel = channel
+        self.author = author or FakeUser()
+        self.guild = guild
+        self.embeds = embeds or []
+        self.attachments = []
+        self.reactions = []
+
+    @property
+    def jump_url(self) -> str:
+        guild = self.guild.id if self.guild else "@me"
+        return f"https://discord.com/channels/{guild}/{self.channel.id}/{self.id}"
+
+    async def reply(self, content: str = None, **kwargs):
+        return await self.channel.send(content=content, reference=self, **kwargs)
+
+    async def add_reaction(self, emoji):
+        self.reactions.append(emoji)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int = None, guild: FakeGuild = None, send_latency: float = 0.0):
+        self.id = channel_id or next(_ids)
+        self.guild = guild
+        self.send_latency = send_latency
+        self.sent = []
+
+    async def send(self, content: str = None, embed=None, embeds: list = None, view=None, reference=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        message = FakeMessage(content, self, guild=self.guild, embeds=embeds or ([embed] if embed else []))
+        self.sent.append(message)
+        return message
+
+
+class FakeInteractionResponse:
+    """What the bot uses of discord.InteractionResponse"""
+
+    def __init__(self):
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+
+class FakeContext:
+    """What slash command callbacks use of discord.ApplicationContext"""
+
+    def __init__(self, guild: FakeGuild = None, author: FakeUser = None, send_latency: float = 0.0):
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.author = author or FakeUser()
+        self.send_latency = send_latency
+        self.responses = []
+        self.deferred = False
+        self.response = FakeInteractionResponse()
+
+    async def _sent(self, kind, kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.responses.append((kind, kwargs))
+
+    async def respond(self, content: str = None, **kwargs):
+        self.response.done = True
+        await self._sent("respond", {"content": content, **kwargs})
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+        self.response.done = True
+        await self._sent("defer", kwargs)
+
+    async def edit(self, **kwargs):
+        await self._sent("edit", kwargs)
@@ -0,0 +1,187 @@
+"""Replay recorded [[card]] lookups against the bot, with a local fake Scryfall in front.
+
+Reads logs written with LOOKUP_RECORD_PATH and sends each recorded message through
+MessageCommand.handle_message at its original pace, sped up by --speed, so capacity and
+cache settings can be tried against production-shaped load. The fake Scryfall serves a
+card for every recorded name. Scryfall's rate limit stays on unless --no-rate-limit is
+given; the lookup abuse limits are off unless --limits is given, since their per-minute
+budgets do not speed up with the replay. Cache expiry is sped up along with the replay.
+
+Run from the repository root:
+    python -m benchmarks.replay lookups.gz --speed 1 10 100
+    python -m benchmarks.replay lookups.gz.0 lookups.gz.1 --speed 100 --cache-size 1024 --latency 80
+"""
+import os
+import argparse
+import asyncio
+import gzip
+import random
+import tempfile
+import time
+
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+from benchmarks.fakes import FakeChannel, FakeGuild, FakeMessage, FakeUser
+
+LIMIT_VARIABLES = ("USER_LOOKUPS_PER_MINUTE", "CHANNEL_LOOKUPS_PER_MINUTE", "GUILD_LOOKUPS_PER_MINUTE",
+                   "DUPLICATE_LOOKUP_WINDOW")
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def read_log(paths: list) -> list:
+    """Recorded messages as (seconds from the first one, guild hash, [lookup, ...]), in time order"""
+    messages = {}
+    for file_number, path in enumerate(paths):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 6:
+                    continue
+                timestamp, message, guild, prefix, set_code, name = fields
+                lookup = f"{prefix}{name}|{set_code}" if set_code else f"{prefix}{name}"
+                key = (file_number, message)
+                if key not in messages:
+                    messages[key] = (float(timestamp), guild, [])
+                messages[key][2].append(lookup)
+    ordered = sorted(messages.values(), key=lambda message: message[0])
+    if not ordered:
+        return []
+    first = ordered[0][0]
+    return [(timestamp - first, guild, lookups) for timestamp, guild, lookups in ordered]
+
+
+def recorded_names(messages: list) -> list:
+    names = set()
+    for _, _, lookups in messages:
+        for lookup in lookups:
+            names.add(lookup.split("|")[0].lstrip("!$?#@"))
+    return sorted(names)
+
+
+class Replay:
+    def __init__(self, args, messages):
+        self.args = args
+        self.messages = messages
+        self.rng = random.Random(args.seed)
+        self.guilds = {}  # guild hash -> (FakeGuild or None for DMs, its channels, its users)
+
+    def _guild(self, guild_hash):
+        if guild_hash not in self.guilds:
+            guild = None if guild_hash == "dm" else FakeGuild()
+            channels = [FakeChannel(guild=guild, send_latency=self.args.discord_latency / 1000)
+                        for _ in range(self.args.channels_per_guild)]
+            self.guilds[guild_hash] = (guild, channels, [FakeUser() for _ in range(20)])
+        return self.guilds[guild_hash]
+
+    def setup_bot(self, fake_url):
+        from not_scryfall.bot import ScryfallBot
+        from not_scryfall.helpers import Helper
+        from scryfall.scryfall import ScryfallAPI
+
+        ScryfallAPI.BASE_URL = fake_url
+        if not self.args.rate_limit:
+            ScryfallAPI._min_delay = 0
+            ScryfallAPI._fair_queue.min_delay = 0
+        if self.args.cache_size:
+            ScryfallAPI._cache.max_entries = self.args.cache_size
+        self.ttl = self.args.cache_ttl or ScryfallAPI._cache.ttl
+        # No emoji fetches from Discord
+        Helper.emoji_ids, Helper.emoji_ids_loaded_at = {}, time.time()
+        self.bot = ScryfallBot()
+        self.api = ScryfallAPI
+
+    async def _send(self, guild_hash, lookups, latencies):
+        guild, channels, users = self._guild(guild_hash)
+        channel = self.rng.choice(channels)
+        content = " ".join(f"[[{lookup}]]" for lookup in lookups)
+        start = time.perf_counter()
+        await self.bot.message_command.handle_message(FakeMessage(content, channel, self.rng.choice(users), guild))
+        latencies.append(time.perf_counter() - start)
+
+    async def run(self, speed: float, fake):
+        from telemetry.metrics import CACHE_LOOKUPS
+
+        self.api._cache.clear()
+        self.api._cache.ttl = self.ttl / speed
+        self.bot.message_command.limiter.usage.clear()
+        cache_before = {result: CACHE_LOOKUPS._values.get((result,), 0) for result in ("hit", "shared", "miss")}
+        requests_before = fake.requests
+        latencies, tasks = [], []
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        for offset, guild_hash, lookups in self.messages:
+            delay = start + offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._send(guild_hash, lookups, latencies)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+
+        lookups = sum(len(message[2]) for message in self.messages)
+        cache = {result: CACHE_LOOKUPS._values.get((result,), 0) - count for result, count in cache_before.items()}
+        limited = sum(usage["limited"] for usage in self.bot.message_command.limiter.usage.values())
+        offered = lookups / max(self.messages[-1][0] / speed, 1e-9)
+        latencies.sort()
+        print(f"{speed:>6g}x{len(latencies):9}{offered:10.1f}{lookups / elapsed:10.1f}"
+              f"{percentile(latencies, 0.5) * 1000:10.1f}{percentile(latencies, 0.99) * 1000:10.1f}"
+              f"{latencies[-1] * 1000:10.1f}{fake.requests - requests_before:10}"
+              f"{cache['hit'] / max(sum(cache.values()), 1):10.1%}{limited:9}")
+
+
+async def main(args):
+    messages = read_log(args.logs)
+    if not messages:
+        print("No lookups recorded in those files.")
+        return
+    names = recorded_names(messages)
+    replay = Replay(args, messages)
+    async with FakeScryfall(generate_cards(0, args.seed, names), latency=args.latency / 1000,
+                            jitter=args.jitter / 1000, error_rate=args.error_rate, seed=args.seed) as fake:
+        replay.setup_bot(fake.url)
+        span = messages[-1][0]
+        print(f"{len(messages)} messages, {sum(len(message[2]) for message in messages)} lookups of "
+              f"{len(names)} cards over {span / 3600:.2f} hours from {len({m[1] for m in messages})} guilds")
+        print(f"Fake Scryfall: {args.latency:.0f} ms + up to {args.jitter:.0f} ms, {args.error_rate:.1%} errors; "
+              f"rate limit {'on' if args.rate_limit else 'off'}; lookup limits {'on' if args.limits else 'off'}; "
+              f"cache {replay.api._cache.max_entries} entries for {replay.ttl:.0f} s")
+        print(f"{'speed':>7}{'messages':>9}{'offered/s':>10}{'served/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+              f"{'max ms':>10}{'scryfall':>10}{'cache hit':>10}{'limited':>9}")
+        for speed in args.speed:
+            await replay.run(speed, fake)
+        await replay.bot.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="files written with LOOKUP_RECORD_PATH, one per cluster worker")
+    parser.add_argument("--speed", type=float, nargs="+", default=[1.0], help="replay this many times faster")
+    parser.add_argument("--cache-size", type=int, default=0, help="Scryfall cache entries, instead of SCRYFALL_CACHE_SIZE")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="cache seconds at 1x, instead of SCRYFALL_CACHE_TTL")
+    parser.add_argument("--channels-per-guild", type=int, default=10,
+                        help="fake channels each guild's lookups go to; each paces its replies like Discord")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Scryfall latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many random milliseconds more")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Scryfall responses that fail")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="milliseconds per fake Discord send")
+    parser.add_argument("--no-rate-limit", dest="rate_limit", action="store_false",
+                        help="lift Scryfall's 10 requests per second")
+    parser.add_argument("--limits", action="store_true", help="keep the per user, channel and guild lookup limits")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    arguments.logs = [os.path.abspath(path) for path in arguments.logs]
+    # Must be set before the bot's modules read them; the replay must not record itself either
+    os.environ["CACHE_SNAPSHOT_INTERVAL"] = "0"
+    os.environ["LOOKUP_RECORD_PATH"] = ""
+    if not arguments.limits:
+        for variable in LIMIT_VARIABLES:
+            os.environ[variable] = "0"
+    # The bot keeps its database and snapshots under ./data, so keep them out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="bench-replay-"))
+    asyncio.run(main(arguments))
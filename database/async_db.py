@@ -0,0 +1,180 @@
+import time
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from .db import Database
+from telemetry.metrics import DB_QUERY_LATENCY
+from telemetry.tracing import span
+
+# Most writes that get committed together in one transaction
+MAX_WRITE_BATCH = 64
+
+
+class AsyncDatabase:
+    """Awaitable facade over Database for use from the event loop
+
+    Writes are queued to a single writer thread, which commits everything queued
+    at the time in one transaction. Reads the in-memory settings copy can answer
+    return immediately; anything that needs SQL runs on a small read pool. Each
+    thread uses its own persistent connection, which WAL mode lets read while
+    the writer commits.
+
+    Opening the database (migrations and loading the settings copy) happens on the
+    writer thread, so it overlaps with logging in to Discord instead of delaying it.
+    """
+
+    def __init__(self, db_path='./data/guild_settings.db', read_workers=2):
+        self.db_path = db_path
+        self.db = None
+        self._init_error = None
+        self._ready = threading.Event()
+        self._read_pool = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='db-read')
+        self._writes = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+
+    async def wait_ready(self):
+        """Wait for the database to finish opening; raises if that failed"""
+        if not self._ready.is_set():
+            await asyncio.to_thread(self._ready.wait)
+        if self._init_error:
+            raise self._init_error
+        return self.db
+
+    def _writer_loop(self):
+        """Open the database, then drain the write queue, committing each drained batch as one transaction"""
+        try:
+            self.db = Database(self.db_path)
+        except Exception as e:
+            self._init_error = e
+        finally:
+            self._ready.set()
+
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < MAX_WRITE_BATCH:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Finish what was queued before close() and then stop
+                    self._writes.put(None)
+                    break
+                batch.append(item)
+
+            results = []
+            try:
+                if self._init_error:
+                    raise self._init_error
+                with self.db.batch():
+                    for method, args, future in batch:
+                        try:
+                            results.append((future, getattr(self.db, method)(*args), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+            except Exception as e:
+                # The commit itself failed, so none of the batch was written
+                results = [(future, None, e) for _, _, future in batch]
+
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    async def _write(self, method, *args):
+        """Queue a call of the named Database write method and wait for its commit"""
+        start = time.perf_counter()
+        future = Future()
+        self._writes.put((method, args, future))
+        try:
+            with span(f"db {method}"):
+                return await asyncio.wrap_future(future)
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - start, method)
+
+    async def _read(self, method, *args):
+        """Run the named Database read method on the read pool"""
+        db = await self.wait_ready()
+        start = time.perf_counter()
+        try:
+            with span(f"db {method}"):
+                return await asyncio.get_running_loop().run_in_executor(self._read_pool, getattr(db, method), *args)
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - start, method)
+
+    async def close(self):
+        """Flush queued writes and stop the worker threads"""
+        self._writes.put(None)
+        await asyncio.to_thread(self._writer.join)
+        self._read_pool.shutdown(wait=True)
+        Database.close_connections()
+
+    async def get_all_setting_keys(self):
+        """Get all setting keys"""
+        return await self._read('get_all_setting_keys')
+
+    async def get_scheduled_guilds(self):
+        """Get (guild_id, schedule, channel_id, last_posted) for every guild with a schedule and channel"""
+        return await self._read('get_scheduled_guilds')
+
+    async def get_guild_settings(self, guild_id):
+        """Get the settings for a guild, or return None if not set"""
+        return (await self.wait_ready()).get_guild_settings(guild_id)
+
+    async def get_embed_color(self, guild_id):
+        """Get the embed color for a guild, or return default if not set"""
+        return (await self.wait_ready()).get_embed_color(guild_id)
+
+    async def get_random_card_schedule(self, guild_id):
+        """Get the random card schedule for a guild, or return None if not set"""
+        return (await self.wait_ready()).get_random_card_schedule(guild_id)
+
+    async def get_random_card_channel_id(self, guild_id):
+        """Get the random card channel ID for a guild, or return None if not set"""
+        return (await self.wait_ready()).get_random_card_channel_id(guild_id)
+
+    async def remove_guild_setting(self, guild_id, setting):
+        """Remove a setting for a guild"""
+        return await self._write('remove_guild_setting', guild_id, setting)
+
+    async def set_embed_color(self, guild_id, color_hex):
+        """Set the embed color for a guild"""
+        return await self._write('set_embed_color', guild_id, color_hex)
+
+    async def set_random_card_schedule(self, guild_id, schedule):
+        """Set the random card schedule for a guild"""
+        return await self._write('set_random_card_schedule', guild_id, schedule)
+
+    async def set_random_card_channel_id(self, guild_id, channel_id):
+        """Set the random card channel ID for a guild"""
+        return await self._write('set_random_card_channel_id', guild_id, channel_id)
+
+    async def set_random_card_last_posted(self, guild_id, timestamp):
+        """Record when a guild's scheduled random card was last posted"""
+        return await self._write('set_random_card_last_posted', guild_id, timestamp)
+
+    async def get_price_watches(self, guild_id=None):
+        """Get the price watches of one guild, or of every guild"""
+        return await self._read('get_price_watches', guild_id)
+
+    async def count_price_watches(self, guild_id, except_card_id=None):
+        """Get how many printings a guild watches, not counting except_card_id"""
+        return await self._read('count_price_watches', guild_id, except_card_id)
+
+    async def set_price_watch(self, watch):
+        """Add or replace a guild's price watch on a printing"""
+        return await self._write('set_price_watch', watch)
+
+    async def remove_price_watch(self, guild_id, card_id):
+        """Stop watching a printing in a guild"""
+        return await self._write('remove_price_watch', guild_id, card_id)
+
+    async def update_watch_prices(self, updates):
+        """Record the prices a price alert check saw"""
+        return await self._write('update_watch_prices', updates)
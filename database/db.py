@@ -1,203 +1,361 @@
 import sqlite3
-import discord
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
-# Ensure the data directory exists
-data_dir = Path('./data')
-data_dir.mkdir(exist_ok=True)
+# Columns cached for every guild, in table order
+SETTING_COLUMNS = ('embed_color', 'random_card_schedule', 'random_card_channel_id')
 
-# Default settings
-DEFAULT_EMBED_COLOR = discord.Color.blurple()  # Discord purple
+# Pragmas applied to every connection when it is opened
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',  # Readers no longer block behind a writer
+    'PRAGMA synchronous = NORMAL',  # Safe with WAL, skips an fsync per commit
+    'PRAGMA cache_size = -8192',  # 8 MiB page cache
+    'PRAGMA mmap_size = 67108864',  # 64 MiB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Statements are kept as constants so sqlite3's per-connection statement cache
+# reuses the prepared statement instead of recompiling the SQL on every call
+SELECT_ALL_SETTINGS = (
+    f'SELECT guild_id, {", ".join(SETTING_COLUMNS)} FROM guild_settings'
+)
+UPSERT_SETTING = {
+    column: f'INSERT INTO guild_settings (guild_id, {column}) VALUES (?, ?) '
+            f'ON CONFLICT(guild_id) DO UPDATE SET {column} = excluded.{column}'
+    for column in SETTING_COLUMNS
+}
+CLEAR_SETTING = {
+    column: f'UPDATE guild_settings SET {column} = NULL WHERE guild_id = ?'
+    for column in SETTING_COLUMNS
+}
+
+@lru_cache(maxsize=1024)
+def _embed_color(color_hex):
+    """discord.Color for a stored hex color, or the default (Discord purple) if unset"""
+    # discord is imported here rather than at module load, so the database layer
+    # (and tools built on it) start without it
+    import discord
+    return discord.Color(int(color_hex, 16)) if color_hex else discord.Color.blurple()
+
+SELECT_SCHEDULED_GUILDS = (
+    'SELECT guild_id, random_card_schedule, random_card_channel_id, random_card_last_posted '
+    'FROM guild_settings '
+    'WHERE random_card_schedule IS NOT NULL AND random_card_channel_id IS NOT NULL'
+)
+UPDATE_LAST_POSTED = (
+    'UPDATE guild_settings SET random_card_last_posted = ? WHERE guild_id = ?'
+)
+
+# Price watch columns, in table order
+WATCH_COLUMNS = ('guild_id', 'card_id', 'channel_id', 'card_name', 'set_code', 'above', 'below',
+                 'change_percent', 'reference_price', 'last_price')
+SELECT_ALL_WATCHES = f'SELECT {", ".join(WATCH_COLUMNS)} FROM price_watches'
+SELECT_GUILD_WATCHES = f'{SELECT_ALL_WATCHES} WHERE guild_id = ? ORDER BY card_name'
+# Watches of a guild's other printings; IS NOT matches every row when no printing is given
+COUNT_GUILD_WATCHES = 'SELECT COUNT(*) FROM price_watches WHERE guild_id = ? AND card_id IS NOT ?'
+UPSERT_WATCH = (
+    f'INSERT INTO price_watches ({", ".join(WATCH_COLUMNS)}) VALUES ({", ".join("?" * len(WATCH_COLUMNS))}) '
+    'ON CONFLICT(guild_id, card_id) DO UPDATE SET channel_id = excluded.channel_id, '
+    'above = excluded.above, below = excluded.below, change_percent = excluded.change_percent, '
+    'reference_price = excluded.reference_price, last_price = excluded.last_price'
+)
+DELETE_WATCH = 'DELETE FROM price_watches WHERE guild_id = ? AND card_id = ?'
+UPDATE_WATCH_PRICES = (
+    'UPDATE price_watches SET reference_price = ?, last_price = ? WHERE guild_id = ? AND card_id = ?'
+)
+
+def _create_guild_settings(cursor):
+    """Migration 1: the guild_settings table, patching up tables from older versions"""
+    # Create settings table if it doesn't exist
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id INTEGER PRIMARY KEY,
+        embed_color TEXT DEFAULT NULL,
+        random_card_schedule TEXT DEFAULT NULL,
+        random_card_channel_id INTEGER DEFAULT NULL
+    )
+    ''')
+    # Check and add columns if they don't exist
+    cursor.execute("PRAGMA table_info(guild_settings)")
+    columns = [info[1] for info in cursor.fetchall()]
+
+    if 'random_card_schedule' not in columns:
+        cursor.execute('''
+        ALTER TABLE guild_settings
+        ADD COLUMN random_card_schedule TEXT DEFAULT NULL
+        ''')
+
+    if 'random_card_channel_id' not in columns:
+        cursor.execute('''
+        ALTER TABLE guild_settings
+        ADD COLUMN random_card_channel_id INTEGER DEFAULT NULL
+        ''')
+
+    if 'embed_color' not in columns:
+        cursor.execute('''
+        ALTER TABLE guild_settings
+        ADD COLUMN embed_color TEXT DEFAULT NULL
+        ''')
+
+def _index_scheduled_guilds(cursor):
+    """Migration 2: covering partial index for SELECT_SCHEDULED_GUILDS"""
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS guild_settings_scheduled
+    ON guild_settings (guild_id, random_card_schedule, random_card_channel_id)
+    WHERE random_card_schedule IS NOT NULL AND random_card_channel_id IS NOT NULL
+    ''')
+
+def _add_last_posted(cursor):
+    """Migration 3: when each guild's scheduled card last went out, for catching up after downtime"""
+    cursor.execute('''
+    ALTER TABLE guild_settings
+    ADD COLUMN random_card_last_posted REAL DEFAULT NULL
+    ''')
+    # Rebuild the scheduled guilds index so it still covers SELECT_SCHEDULED_GUILDS
+    cursor.execute('DROP INDEX IF EXISTS guild_settings_scheduled')
+    cursor.execute('''
+    CREATE INDEX guild_settings_scheduled
+    ON guild_settings (guild_id, random_card_schedule, random_card_channel_id, random_card_last_posted)
+    WHERE random_card_schedule IS NOT NULL AND random_card_channel_id IS NOT NULL
+    ''')
+
+def _create_price_watches(cursor):
+    """Migration 4: cards each guild watches for price alerts, by Scryfall printing id"""
+    cursor.execute('''
+    CREATE TABLE price_watches (
+        guild_id INTEGER NOT NULL,
+        card_id TEXT NOT NULL,
+        channel_id INTEGER NOT NULL,
+        card_name TEXT NOT NULL,
+        set_code TEXT,
+        above REAL DEFAULT NULL,
+        below REAL DEFAULT NULL,
+        change_percent REAL DEFAULT NULL,
+        reference_price REAL DEFAULT NULL,
+        last_price REAL DEFAULT NULL,
+        PRIMARY KEY (guild_id, card_id)
+    ) WITHOUT ROWID
+    ''')
+
+# Applied in order; a database's PRAGMA user_version is the number already applied
+MIGRATIONS = (
+    _create_guild_settings,
+    _index_scheduled_guilds,
+    _add_last_posted,
+    _create_price_watches,
+)
 
 class Database:
+    # In-memory copy of guild_settings, shared by every Database instance and keyed
+    # by db_path. Loaded once per process, then kept in sync by the set_* methods.
+    _settings_cache = {}
+    # Long-lived connections, one per thread and db_path, since sqlite3
+    # connections must not be used from two threads at once
+    _local = threading.local()
+    _connections = []
+    _connections_lock = threading.Lock()
+    # Migrations and the settings load run once per db_path per process
+    _setup_lock = threading.Lock()
+
     def __init__(self, db_path='./data/guild_settings.db'):
         self.db_path = db_path
-        self._initialize_db()
-    
-    def _initialize_db(self):
-        """Initialize the database with required tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create settings table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS guild_settings (
-            guild_id INTEGER PRIMARY KEY,
-            embed_color TEXT DEFAULT NULL,
-            random_card_schedule TEXT DEFAULT NULL,
-            random_card_channel_id INTEGER DEFAULT NULL
-        )
-        ''')
-        # Check and add columns if they don't exist
-        cursor.execute("PRAGMA table_info(guild_settings)")
-        columns = [info[1] for info in cursor.fetchall()]
-
-        if 'random_card_schedule' not in columns:
-            cursor.execute('''
-            ALTER TABLE guild_settings
-            ADD COLUMN random_card_schedule TEXT DEFAULT NULL
-            ''')
-
-        if 'random_card_channel_id' not in columns:
-            cursor.execute('''
-            ALTER TABLE guild_settings
-            ADD COLUMN random_card_channel_id INTEGER DEFAULT NULL
-            ''')
-
-        if 'embed_color' not in columns:
-            cursor.execute('''
-            ALTER TABLE guild_settings
-            ADD COLUMN embed_color TEXT DEFAULT NULL
-            ''')
-        
-        conn.commit()
-        conn.close()
-    
+        if db_path not in Database._settings_cache:
+            with Database._setup_lock:
+                if db_path not in Database._settings_cache:
+                    self._migrate()
+                    Database._settings_cache[db_path] = self._load_settings_cache()
+        self._cache = Database._settings_cache[db_path]
+
+    def _connect(self):
+        """Get this thread's connection to the database, opening it on first use"""
+        connections = getattr(Database._local, 'connections', None)
+        if connections is None:
+            connections = Database._local.connections = {}
+
+        conn = connections.get(self.db_path)
+        if conn is None:
+            # Ensure the data directory exists
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # check_same_thread is off only so close_connections can close every
+            # thread's connection at shutdown
+            conn = sqlite3.connect(self.db_path, cached_statements=128, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            connections[self.db_path] = conn
+            with Database._connections_lock:
+                Database._connections.append(conn)
+        return conn
+
+    @classmethod
+    def close_connections(cls):
+        """Close every connection opened by this process"""
+        with cls._connections_lock:
+            for conn in cls._connections:
+                conn.close()
+            cls._connections.clear()
+        cls._local = threading.local()
+
+    @contextmanager
+    def batch(self):
+        """Run every write made by this thread inside the block as one transaction"""
+        conn = self._connect()
+        Database._local.in_batch = True
+        try:
+            yield
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            # Writes inside the batch already updated the in-memory copy, so re-read it. Read
+            # threads share the copy, so replace its entries one at a time rather than empty it,
+            # which would briefly show every guild as unconfigured.
+            settings = self._load_settings_cache()
+            for guild_id in self._cache.keys() - settings.keys():
+                self._cache.pop(guild_id, None)
+            self._cache.update(settings)
+            raise
+        finally:
+            Database._local.in_batch = False
+
+    def _commit(self, conn):
+        """Commit now, unless a batch() on this thread will commit for us"""
+        if not getattr(Database._local, 'in_batch', False):
+            conn.commit()
+
+    def _migrate(self):
+        """Bring the schema up to date, using PRAGMA user_version to skip applied migrations"""
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            cursor = conn.cursor()
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+
+    def _load_settings_cache(self):
+        """Read every guild's settings into a dict of guild_id -> settings row"""
+        rows = self._connect().execute(SELECT_ALL_SETTINGS).fetchall()
+        return {row[0]: dict(zip(SETTING_COLUMNS, row[1:])) for row in rows}
+
+    def _write_setting(self, guild_id, setting, value):
+        """Upsert one setting and mirror it in the in-memory copy"""
+        conn = self._connect()
+        conn.execute(UPSERT_SETTING[setting], (guild_id, value))
+        self._commit(conn)
+
+        row = self._cache.get(guild_id)
+        if row is None:
+            row = self._cache[guild_id] = dict.fromkeys(SETTING_COLUMNS)
+        row[setting] = value
+
     def get_all_setting_keys(self):
         """Get all setting keys"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("PRAGMA table_info(guild_settings)")
-        columns = [info[1] for info in cursor.fetchall()]
-        
-        conn.close()
-        return columns
-    
+        cursor = self._connect().execute("PRAGMA table_info(guild_settings)")
+        return [info[1] for info in cursor.fetchall()]
+
+    def get_scheduled_guilds(self):
+        """Get every guild with both a random card schedule and channel set
+
+        Returns:
+            list: (guild_id, schedule, channel_id, last_posted) tuples, last_posted
+            being a Unix timestamp or None
+        """
+        return self._connect().execute(SELECT_SCHEDULED_GUILDS).fetchall()
+
+    def set_random_card_last_posted(self, guild_id, timestamp):
+        """Record when a guild's scheduled random card was last posted
+
+        Args:
+            guild_id: The Discord guild ID
+            timestamp: Unix timestamp of the scheduled fire time that was posted
+        """
+        conn = self._connect()
+        conn.execute(UPDATE_LAST_POSTED, (timestamp, guild_id))
+        self._commit(conn)
+        return True
+
     def get_guild_settings(self, guild_id):
         """Get the settings for a guild, or return None if not set"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT embed_color, random_card_schedule, random_card_channel_id '
-            'FROM guild_settings WHERE guild_id = ?', 
-            (guild_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
+        row = self._cache.get(guild_id)
+        if row:
             return {
-                'embed_color': discord.Color(int(result[0], 16)) if result[0] else DEFAULT_EMBED_COLOR,
-                'random_card_schedule': result[1],
-                'random_card_channel_id': result[2]
+                'embed_color': _embed_color(row['embed_color']),
+                'random_card_schedule': row['random_card_schedule'],
+                'random_card_channel_id': row['random_card_channel_id']
             }
         return None
+
     def remove_guild_setting(self, guild_id, setting):
         """Remove a setting for a guild
-        
+
         Args:
             guild_id: The Discord guild ID
             setting: The setting to remove
-        
+
         Returns:
             bool: True if successful, False otherwise
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            f'UPDATE guild_settings SET {setting} = NULL WHERE guild_id = ?',
-            (guild_id,)
-        )
-        
-        conn.commit()
-        conn.close()
+        if setting not in SETTING_COLUMNS:
+            return False
+
+        conn = self._connect()
+        conn.execute(CLEAR_SETTING[setting], (guild_id,))
+        self._commit(conn)
+
+        if guild_id in self._cache:
+            self._cache[guild_id][setting] = None
         return True
+
     def get_embed_color(self, guild_id):
         """Get the embed color for a guild, or return default if not set"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT embed_color FROM guild_settings WHERE guild_id = ?', 
-            (guild_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and result[0]:
-            # Convert the stored hex color to discord.Color
-            return discord.Color(int(result[0], 16))
-        return DEFAULT_EMBED_COLOR
-    
+        row = self._cache.get(guild_id)
+        # Convert the stored hex color to discord.Color
+        return _embed_color(row['embed_color'] if row else None)
+
     def set_embed_color(self, guild_id, color_hex):
         """Set the embed color for a guild
-        
+
         Args:
             guild_id: The Discord guild ID
             color_hex: Hex color string (e.g. "7289DA" for Discord Blurple)
-        
+
         Returns:
             bool: True if successful, False otherwise
         """
         try:
             # Validate the hex color
             int(color_hex, 16)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                'INSERT INTO guild_settings (guild_id, embed_color) VALUES (?, ?) '
-                'ON CONFLICT(guild_id) DO UPDATE SET embed_color = ?',
-                (guild_id, color_hex, color_hex)
-            )
-            
-            conn.commit()
-            conn.close()
-            return True
         except ValueError:
             return False  # Invalid hex color
+
+        self._write_setting(guild_id, 'embed_color', color_hex)
+        return True
+
     def get_random_card_schedule(self, guild_id):
         """Get the random card schedule for a guild, or return None if not set"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT random_card_schedule FROM guild_settings WHERE guild_id = ?', 
-            (guild_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        return result[0] if result else None
+        row = self._cache.get(guild_id)
+        return row['random_card_schedule'] if row else None
+
     def set_random_card_schedule(self, guild_id, schedule):
         """Set the random card schedule for a guild
-        
+
         Args:
             guild_id: The Discord guild ID
             schedule: The schedule string
-        
+
         Returns:
             bool: True if successful, False otherwise
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO guild_settings (guild_id, random_card_schedule) VALUES (?, ?) '
-            'ON CONFLICT(guild_id) DO UPDATE SET random_card_schedule = ?',
-            (guild_id, schedule, schedule)
-        )
-        
-        conn.commit()
-        conn.close()
+        self._write_setting(guild_id, 'random_card_schedule', schedule)
         return True
+
     def get_random_card_channel_id(self, guild_id):
         """Get the random card channel ID for a guild, or return None if not set"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT random_card_channel_id FROM guild_settings WHERE guild_id = ?', 
-            (guild_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        return result[0] if result else None
+        row = self._cache.get(guild_id)
+        return row['random_card_channel_id'] if row else None
+
     def set_random_card_channel_id(self, guild_id, channel_id):
         """Set the random card channel ID for a guild
 
@@ -205,15 +363,56 @@ class Database:
             guild_id: The Discord guild ID
             channel_id: The channel ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO guild_settings (guild_id, random_card_channel_id) VALUES (?, ?) '
-            'ON CONFLICT(guild_id) DO UPDATE SET random_card_channel_id = ?',
-            (guild_id, channel_id, channel_id)
-        )
-        
-        conn.commit()
-        conn.close()
-        return True
\ No newline at end of file
+        # The INTEGER column coerces digit strings, so store the int to keep the cache in step
+        self._write_setting(guild_id, 'random_card_channel_id', int(channel_id))
+        return True
+
+    def get_price_watches(self, guild_id=None):
+        """Get the price watches of one guild, sorted by card name, or of every guild
+
+        Returns:
+            list: Dicts with a key for each of WATCH_COLUMNS
+        """
+        conn = self._connect()
+        if guild_id is None:
+            rows = conn.execute(SELECT_ALL_WATCHES).fetchall()
+        else:
+            rows = conn.execute(SELECT_GUILD_WATCHES, (guild_id,)).fetchall()
+        return [dict(zip(WATCH_COLUMNS, row)) for row in rows]
+
+    def count_price_watches(self, guild_id, except_card_id=None):
+        """Get how many printings a guild watches, not counting except_card_id"""
+        return self._connect().execute(COUNT_GUILD_WATCHES, (guild_id, except_card_id)).fetchone()[0]
+
+    def set_price_watch(self, watch):
+        """Add a price watch, or replace the guild's watch on the same printing
+
+        Args:
+            watch: Dict with a key for each of WATCH_COLUMNS
+        """
+        conn = self._connect()
+        conn.execute(UPSERT_WATCH, tuple(watch[column] for column in WATCH_COLUMNS))
+        self._commit(conn)
+        return True
+
+    def remove_price_watch(self, guild_id, card_id):
+        """Stop watching a printing in a guild
+
+        Returns:
+            bool: False if the guild did not watch that printing
+        """
+        conn = self._connect()
+        removed = conn.execute(DELETE_WATCH, (guild_id, card_id)).rowcount
+        self._commit(conn)
+        return removed > 0
+
+    def update_watch_prices(self, updates):
+        """Record the prices a price alert check saw
+
+        Args:
+            updates: (reference_price, last_price, guild_id, card_id) tuples
+        """
+        conn = self._connect()
+        conn.executemany(UPDATE_WATCH_PRICES, updates)
+        self._commit(conn)
+        return True
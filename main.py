@@ -1,4 +1,8 @@
 from not_scryfall.bot import ScryfallBot
+from not_scryfall.cluster import CLUSTER_WORKERS, run_cluster
 
 if __name__ == "__main__":
-    ScryfallBot().run()
+    if CLUSTER_WORKERS > 1:
+        run_cluster()
+    else:
+        ScryfallBot().run()
@@ -1,117 +1,190 @@
 import os
+import math
+import asyncio
 import discord
 from datetime import datetime
-from .message_commands import MessageCommand
+from .message_commands import MessageCommand, ALLOW_READ_MESSAGE
 from .slash_commands import SlashCommand
 from scryfall.scryfall import ScryfallAPI
-from database.db import Database
-from discord.ext import tasks
-import croniter
+from scryfall.fair_queue import current_flow
+from database.async_db import AsyncDatabase
+from .scheduler import CronScheduler
+from .snapshot import CacheSnapshot, SNAPSHOT_PATH
+from .send_queue import SendQueue, SCHEDULED
+from .pagination import Pagination
+from .price_alerts import PriceAlerts
+from .prewarm import CachePrewarmer, POPULARITY_PATH, POPULARITY_HALF_LIFE
+from scryfall.popularity import PopularityTracker
+from .helpers import Helper
+from telemetry.metrics import (
+    REGISTRY, METRICS_PORT, MetricsServer, SHARD_LATENCY, QUEUE_DEPTH, CACHE_ENTRIES, GUILD_LOOKUPS)
+from telemetry.recorder import LookupRecorder, LOOKUP_RECORD_PATH
+from telemetry.log import get_logger
+
+# Post the same card in every slot of a day instead of one card per slot
+SCHEDULED_CARD_OF_THE_DAY = os.getenv("SCHEDULED_CARD_OF_THE_DAY", "false").lower() == "true"
+log = get_logger(__name__)
 
 
 class ScryfallBot:
-    def __init__(self):
+    def __init__(self, shard_ids=None, shard_count=None):
+        """
+        Args:
+            shard_ids: Shards this process runs, when it is one worker of a cluster
+            shard_count: Total shards across the cluster
+        """
         # Setup bot configuration
         self.test_guild_id = os.getenv("TEST_GUILD_ID")
         intents = discord.Intents.default()
         intents.message_content = True
         intents.guilds = True
+        bot_options = {}
+        if shard_ids is not None:
+            bot_options = {"shard_ids": shard_ids, "shard_count": shard_count}
         # Initialize bot
         if self.test_guild_id:
-            print(f"Running in test mode with guild ID {self.test_guild_id}")
+            log.info("Running in test mode", guild=self.test_guild_id)
             self.bot = discord.AutoShardedBot(
-                intents=intents, debug_guild=int(self.test_guild_id), )
+                intents=intents, debug_guild=int(self.test_guild_id), **bot_options)
         else:
-            self.bot = discord.AutoShardedBot(intents=intents)
+            self.bot = discord.AutoShardedBot(intents=intents, **bot_options)
         self.bot.default_command_integration_types = {
             discord.IntegrationType.guild_install, discord.IntegrationType.user_install}
 
+        # Shared by every component so SQLite work stays off the event loop
+        self.db = AsyncDatabase()
+
+        # Paces replies and scheduled posts per channel, replies first
+        self.send_queue = SendQueue()
+
+        # Page buttons hold no state, so one listener answers them for every message
+        self.pagination = Pagination(Helper(self.bot, self.db))
+        self.bot.add_listener(self.pagination.handle_interaction, "on_interaction")
+
+        # Opt-in recording of anonymized lookups for benchmarks/replay.py; one file per cluster worker
+        self.recorder = None
+        if LOOKUP_RECORD_PATH and ALLOW_READ_MESSAGE:
+            record_path = LOOKUP_RECORD_PATH if shard_ids is None else f"{LOOKUP_RECORD_PATH}.{shard_ids[0]}"
+            self.recorder = LookupRecorder(record_path)
+
+        # Lookup counts from messages and slash commands decide which cards are kept cached
+        self.popularity = PopularityTracker(half_life=POPULARITY_HALF_LIFE)
+        popularity_path = POPULARITY_PATH if shard_ids is None else f"{POPULARITY_PATH}.{shard_ids[0]}"
+        self.prewarmer = CachePrewarmer(self.popularity, popularity_path)
+        self.prewarmer.load()
+
+        # One handler serves every message, so ordinary chat costs next to nothing
+        self.message_command = MessageCommand(
+            self.bot, self.send_queue, self.pagination, self.recorder, self.popularity, self.db
+        ) if ALLOW_READ_MESSAGE else None
+
         # Setup event handlers
         self._setup_events()
 
         # Register commands - pass the ScryfallBot instance so slash commands can access it
         SlashCommand(self.bot, self)
 
-        self.schedules = {}
-        self.post_card_task.start()
+        self.scheduler = CronScheduler(self._post_due_cards)
+        # Checks watched card prices on a schedule of its own, posting alerts like scheduled cards
+        self.price_alerts = PriceAlerts(self.bot, self.db, self.send_queue)
+        # Slot (or day) -> task fetching the random card every guild in it will share,
+        # or the card itself when restored from a snapshot
+        self._slot_cards = {}
+
+        # Warm the caches from the previous run; each cluster worker keeps its own file
+        snapshot_path = SNAPSHOT_PATH if shard_ids is None else f"{SNAPSHOT_PATH}.{shard_ids[0]}"
+        self.snapshot = CacheSnapshot(self, snapshot_path, SCHEDULED_CARD_OF_THE_DAY)
+        self.snapshot.load()
+
+        # Optional Prometheus endpoint; cluster workers listen on METRICS_PORT plus their first shard id
+        self.metrics_server = None
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(METRICS_PORT + (shard_ids[0] if shard_ids else 0))
+            REGISTRY.add_collector(self._collect_metrics)
+
+        # bot.run() shuts down through bot.close(), so route that through our cleanup
+        self._bot_close = self.bot.close
+        self.bot.close = self.close
+        self._closed = False
 
     def _setup_events(self):
         @self.bot.event
         async def on_ready():
-            self._load_schedules()
-            print("Bot started.")
+            # on_ready fires again after reconnects, only load schedules once
+            if not self.scheduler.running:
+                await self._load_schedules()
+                self.scheduler.start()
+                self.price_alerts.start()
+                self.snapshot.start()
+                self.prewarmer.start()
+                if self.metrics_server:
+                    await self.metrics_server.start()
+                if self.recorder:
+                    self.recorder.start()
+            log.info("Bot started")
 
-        @self.bot.event
-        async def on_message(message: discord.Message):
-            if message.author == self.bot.user:
-                return
-            if os.getenv("ALLOW_READ_MESSAGE", 'true').lower() == 'true':
-                await MessageCommand.handle_message(message, self.bot)
+        @self.bot.before_invoke
+        async def set_scryfall_flow(ctx: discord.ApplicationContext):
+            # Slash commands take turns for Scryfall requests with the rest of their guild
+            current_flow.set(ctx.guild_id or f"dm-{ctx.author.id}")
+
+        if self.message_command:
+            @self.bot.event
+            async def on_message(message: discord.Message):
+                await self.message_command.handle_message(message)
 
         @self.bot.event
         async def on_close():
             await ScryfallAPI.close()
 
-    def _load_schedules(self):
-        db = Database()
-        for guild in self.bot.guilds:
-            guild_settings = db.get_guild_settings(guild.id)
-            if guild_settings:
-                cron_schedule = guild_settings['random_card_schedule']
-                channel_id = guild_settings['random_card_channel_id']
-                if cron_schedule and channel_id:
-                    self.schedules[guild.id] = (cron_schedule, int(channel_id))
-
-    def reload_guild_schedule(self, guild_id):
+    async def _load_schedules(self):
+        for guild_id, cron_schedule, channel_id, last_posted in await self.db.get_scheduled_guilds():
+            # Only schedule guilds this bot can currently see
+            if self.bot.get_guild(guild_id):
+                if last_posted is not None:
+                    last_posted = datetime.fromtimestamp(last_posted)
+                self.scheduler.set(guild_id, cron_schedule, int(channel_id), last_posted)
+
+    async def reload_guild_schedule(self, guild_id):
         """Reload the schedule for a specific guild from database"""
-        db = Database()
-        guild_settings = db.get_guild_settings(guild_id)
-        # Remove existing schedule for this guild
-        if guild_id in self.schedules:
-            del self.schedules[guild_id]
+        guild_settings = await self.db.get_guild_settings(guild_id)
 
-        # Add updated schedule if both settings are present
+        # Replace the guild's schedule if both settings are present, otherwise drop it
         if guild_settings:
             cron_schedule = guild_settings['random_card_schedule']
             channel_id = guild_settings['random_card_channel_id']
             if cron_schedule and channel_id:
-                self.schedules[guild_id] = (cron_schedule, int(channel_id))
-            else:
-                self.schedules.pop(guild_id, None)
+                return self.scheduler.set(guild_id, cron_schedule, int(channel_id))
+        self.scheduler.remove(guild_id)
         return True
 
-    @tasks.loop(seconds=60)
-    async def post_card_task(self):
-        now = datetime.now()
-        for guild_id, (cron_schedule, channel_id) in self.schedules.items():
-            if self._is_time_to_post(cron_schedule, now):
-                await self._send_scheduled_card(channel_id)
-
-    def _is_time_to_post(self, cron_schedule, now):
-        # Get the previous scheduled run time
-        cron = croniter.croniter(cron_schedule, now)
-        prev_run = cron.get_prev(datetime)
-        next_run = cron.get_next(datetime)
-        # If the difference between now and the previous run is less than 1 minute,
-        # it means we're in the same minute when a post should occur
-        time_since_prev = now - prev_run
-        seconds_since_prev = time_since_prev.total_seconds()
-        print(f"Seconds since previous run: {seconds_since_prev}")
-        print(f"Next run: {next_run}")
-        print(f"Now: {now}")
-        # With a 60-second check interval, use the same window for posting
-        return seconds_since_prev < 60
-
-    async def _send_scheduled_card(self, channel_id: int):
-        """Send a random card to the specified channel"""
-        card = await ScryfallAPI.get_random_card()
+    async def _get_slot_card(self, fire_time):
+        """Fetch the random card for a time slot, once no matter how many guilds are in it"""
+        key = fire_time.date() if SCHEDULED_CARD_OF_THE_DAY else fire_time
+        if key not in self._slot_cards:
+            # Slots are only ever looked up around the current time, so forget older ones
+            for old_key in [k for k in self._slot_cards if k < key]:
+                del self._slot_cards[old_key]
+            self._slot_cards[key] = asyncio.ensure_future(ScryfallAPI.get_random_card())
+
+        card = self._slot_cards[key]
+        if isinstance(card, asyncio.Future):
+            try:
+                card = await asyncio.shield(card)
+            except Exception as e:
+                # Fetched for every guild in the slot, so one error is logged rather than raised to each
+                log.warning("Random card lookup failed", fire_time=fire_time, error=e)
+                card = None
         if not card:
-            print("Failed to fetch a card.")
-            return
+            # Let the next slot try again rather than remembering the failure
+            self._slot_cards.pop(key, None)
+        return card
 
-        channel = self.bot.get_channel(channel_id)
-        if not channel:
-            print(f"Error: Could not find channel {channel_id}")
+    async def _post_due_cards(self, fire_time, due):
+        """Post the scheduled random card for every guild due at fire_time"""
+        card = await self._get_slot_card(fire_time)
+        if not card:
+            log.warning("Could not fetch the scheduled card", fire_time=fire_time)
             return
 
         embed = discord.Embed(
@@ -122,20 +195,66 @@ class ScryfallBot:
             embed.set_image(url=card["images"][0])
         embed.set_footer(text="Data provided by Scryfall")
 
-        await channel.send(embed=embed)
+        # The send queue limits how many of these go out at once
+        async def post(guild_id, channel_id):
+            try:
+                await self._send_scheduled_card(channel_id, embed)
+            except discord.HTTPException as e:
+                log.warning("Could not post scheduled card", guild=guild_id, channel=channel_id, error=e)
+            await self.db.set_random_card_last_posted(guild_id, fire_time.timestamp())
+
+        await asyncio.gather(*(post(guild_id, channel_id) for guild_id, channel_id in due))
+
+    async def _send_scheduled_card(self, channel_id: int, embed: discord.Embed):
+        """Send the slot's random card embed to the specified channel"""
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            log.warning("Scheduled card channel not found", channel=channel_id)
+            return
+
+        await self.send_queue.send(channel, SCHEDULED, embeds=[embed])
+
+    def _collect_metrics(self):
+        """Refresh the gauges that mirror live state, right before a scrape"""
+        SHARD_LATENCY.clear()
+        for shard_id, latency in self.bot.latencies:
+            if math.isfinite(latency):
+                SHARD_LATENCY.set(latency, shard_id)
+        QUEUE_DEPTH.set(len(ScryfallAPI._fair_queue), "scryfall")
+        QUEUE_DEPTH.set(len(self.send_queue), "send")
+        CACHE_ENTRIES.set(len(ScryfallAPI._cache))
+        if self.message_command:
+            GUILD_LOOKUPS.clear()
+            for guild_id, usage in self.message_command.limiter.top_guilds():
+                for kind, count in usage.items():
+                    GUILD_LOOKUPS.set(count, guild_id or "dm", kind)
 
     async def close(self):
         """Cleanup and shutdown"""
-        print("Shutting down...")
-        # Removed scheduler shutdown
+        if self._closed:
+            return
+        self._closed = True
+        log.info("Shutting down")
+        self.scheduler.stop()
+        self.price_alerts.stop()
+        self.snapshot.stop()
+        await self.snapshot.save()
+        self.prewarmer.stop()
+        await self.prewarmer.save()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.recorder:
+            await self.recorder.stop()
+        await self.send_queue.close()
+        Helper.card_images.close()
         await ScryfallAPI.close()
-        await self.bot.close()
-        self.post_card_task.cancel()
+        await self.db.close()
+        await self._bot_close()
 
     def run(self):
         """Start the bot"""
         bot_token = os.getenv("BOT_TOKEN", "").strip()
         if not bot_token:
-            print("Error: BOT_TOKEN environment variable is empty or not set.")
+            log.error("BOT_TOKEN environment variable is empty or not set")
             exit(1)
         self.bot.run(bot_token)
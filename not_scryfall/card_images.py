@@ -0,0 +1,156 @@
+import io
+import os
+import asyncio
+import discord
+import multiprocessing
+from typing import NamedTuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from scryfall.scryfall import ScryfallAPI
+from telemetry.log import get_logger
+from telemetry.tracing import span
+
+# Where composited double-faced card images are kept, one PNG per card id
+CARD_IMAGE_DIR = os.getenv("CARD_IMAGE_DIR", "./data/images")
+# Most composited images kept on disk; the least recently sent are deleted first
+CARD_IMAGE_CACHE_SIZE = int(os.getenv("CARD_IMAGE_CACHE_SIZE", "1000"))
+# Processes compositing images; 0 sends one embed per face instead
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Transparent pixels between the faces
+FACE_GAP = 16
+log = get_logger(__name__)
+
+
+class CardImage(NamedTuple):
+    """A composited image, held in memory so it can be sent however often, and whatever is pruned"""
+    filename: str
+    data: bytes
+
+    def to_file(self) -> discord.File:
+        """A discord.File to send; each can only be sent once"""
+        return discord.File(io.BytesIO(self.data), filename=self.filename)
+
+
+def _composite(faces: list, path: str) -> bytes:
+    """Paste the face images side by side into a PNG at path, returning it; runs in a worker process"""
+    # Only the worker processes need Pillow
+    from PIL import Image
+
+    images = [Image.open(io.BytesIO(face)).convert("RGBA") for face in faces]
+    width = sum(image.width for image in images) + FACE_GAP * (len(images) - 1)
+    sheet = Image.new("RGBA", (width, max(image.height for image in images)), (0, 0, 0, 0))
+    x = 0
+    for image in images:
+        sheet.paste(image, (x, 0))
+        x += image.width + FACE_GAP
+    output = io.BytesIO()
+    sheet.save(output, "PNG")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(output.getvalue())
+    os.replace(temp_path, path)
+    return output.getvalue()
+
+
+class CardImages:
+    """Composites the faces of double-faced cards into one image, cached on disk by card id
+
+    Face images are fetched concurrently and pasted together in a process pool, so the
+    event loop only waits on them. Lookups of a card already being composited share the
+    same work.
+    """
+
+    def __init__(self, directory: str = CARD_IMAGE_DIR, workers: int = IMAGE_WORKERS,
+                 cache_size: int = CARD_IMAGE_CACHE_SIZE):
+        self.directory = directory
+        self.workers = workers
+        self.cache_size = cache_size
+        self._pool = None
+        self._inflight = {}  # card id -> task compositing it
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Forking would copy the bot's threads' locks mid-use, so start clean processes
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def composite(self, card: dict) -> Optional[CardImage]:
+        """A PNG showing every face of the card, or None if it has one face or compositing failed"""
+        card_id = card.get("id")
+        if not self.workers or not card_id or len(card.get("images") or []) < 2:
+            return None
+
+        if card_id in self._inflight:
+            return await asyncio.shield(self._inflight[card_id])
+        task = asyncio.ensure_future(self._build(card_id, card["images"]))
+        self._inflight[card_id] = task
+        task.add_done_callback(lambda done: self._inflight.pop(card_id, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, card_id: str, image_urls: list) -> Optional[CardImage]:
+        filename = f"{card_id}.png"
+        path = os.path.join(self.directory, filename)
+        # Read here rather than when sending, so pruning can't delete it first and the event loop never reads files
+        data = await asyncio.to_thread(self._read, path)
+        if data is not None:
+            return CardImage(filename, data)
+
+        try:
+            with span("image fetch"):
+                faces = await asyncio.gather(*(self._download(url) for url in image_urls))
+            with span("image composite"):
+                data = await asyncio.get_running_loop().run_in_executor(self._get_pool(), _composite, faces, path)
+        except ImportError:
+            log.warning("Pillow is not installed, sending one image per card face")
+            self.workers = 0
+            return None
+        except BrokenProcessPool:
+            log.warning("Image worker process died, starting new ones", card=card_id)
+            self._pool = None
+            return None
+        except Exception as e:
+            log.warning("Could not composite card faces", card=card_id, error=e)
+            return None
+
+        await asyncio.to_thread(self._prune)
+        return CardImage(filename, data)
+
+    @staticmethod
+    async def _download(url: str) -> bytes:
+        session = await ScryfallAPI.get_session()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    @staticmethod
+    def _read(path: str) -> Optional[bytes]:
+        """A cached image, marked as just used, or None if it is not cached"""
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Pruned since, which is fine now it is in memory
+        return data
+
+    def _prune(self):
+        """Delete the least recently used images past cache_size"""
+        with os.scandir(self.directory) as entries:
+            images = [entry for entry in entries if entry.name.endswith(".png")]
+        if len(images) <= self.cache_size:
+            return
+        images.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in images[:len(images) - self.cache_size]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,167 @@
+import os
+import time
+import signal
+import asyncio
+import multiprocessing
+from scryfall.cache import TTLCache
+from scryfall.coordinator import Coordinator
+from scryfall.scryfall import ScryfallAPI
+from telemetry.log import get_logger
+
+# Worker processes to run; 1 keeps the plain single-process bot
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "1"))
+# Total shards split across the workers, defaulting to one per worker
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or CLUSTER_WORKERS
+COORDINATOR_SOCKET = os.getenv("COORDINATOR_SOCKET", "./data/coordinator.sock")
+# Run workers against a stand-in gateway instead of Discord, for trying the cluster locally
+CLUSTER_STUB_GATEWAY = os.getenv("CLUSTER_STUB_GATEWAY", "false").lower() == "true"
+# Card names each stub worker looks up once it is "ready", comma separated
+CLUSTER_STUB_LOOKUPS = [name.strip() for name in os.getenv("CLUSTER_STUB_LOOKUPS", "").split(",") if name.strip()]
+# A worker that exits sooner than this after starting counts as failing to start
+WORKER_STABLE_SECONDS = 60
+# Restarts of a failing worker wait twice as long each time, from 5 seconds up to 5 minutes
+WORKER_RESTART_DELAY = 5
+MAX_WORKER_RESTART_DELAY = 300
+# Failed starts in a row after which a worker is given up on, as it will likely never start (e.g. a bad token)
+MAX_WORKER_START_FAILURES = int(os.getenv("MAX_WORKER_START_FAILURES", "5"))
+log = get_logger(__name__)
+
+
+def restart_delay(failures):
+    """Seconds to wait before restarting a worker that has failed to start failures times in a row"""
+    if failures == 0:
+        return WORKER_RESTART_DELAY
+    return min(WORKER_RESTART_DELAY * 2 ** (failures - 1), MAX_WORKER_RESTART_DELAY)
+
+
+def shard_ranges(workers, shard_count):
+    """Split shard ids 0..shard_count-1 into one contiguous, non-empty range per worker"""
+    workers = min(workers, shard_count)
+    per_worker, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for index in range(workers):
+        end = start + per_worker + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def _stub_gateway(scryfall_bot, shard_ids):
+    """Stand-in for a gateway session: fire on_ready, run the configured lookups, then idle"""
+    await scryfall_bot.bot.on_ready()
+    log.info("Ready (stub gateway)", shards=f"{shard_ids[0]}-{shard_ids[-1]}")
+    for card_name in CLUSTER_STUB_LOOKUPS:
+        start = time.perf_counter()
+        card = await ScryfallAPI.get_card(card_name)
+        elapsed = (time.perf_counter() - start) * 1000
+        log.info("Stub lookup", lookup=card_name, card=card["name"] if card else None, ms=round(elapsed, 1))
+    await asyncio.Event().wait()
+
+
+def _run_worker(shard_ids, shard_count, socket_path, stub):
+    """Entry point of a worker process, which owns shard_ids out of shard_count"""
+    from .bot import ScryfallBot
+
+    ScryfallAPI.use_coordinator(socket_path)
+    scryfall_bot = ScryfallBot(shard_ids=shard_ids, shard_count=shard_count)
+    if stub:
+        try:
+            asyncio.run(_stub_gateway(scryfall_bot, shard_ids))
+        except KeyboardInterrupt:
+            pass
+    else:
+        scryfall_bot.run()
+
+
+async def _supervise(workers, shard_count, socket_path, stub):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    coordinator = Coordinator(
+        socket_path,
+        ScryfallAPI._min_delay,
+        TTLCache(max_entries=ScryfallAPI._cache.max_entries, ttl=ScryfallAPI._cache.ttl),
+    )
+    await coordinator.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    context = multiprocessing.get_context("spawn")
+    processes = {}  # index -> (process, shard ids, monotonic start time)
+    failures = {}  # index -> failed starts in a row
+    restarts = {}  # index -> (monotonic time to restart at, shard ids)
+
+    def spawn(index, shard_ids):
+        process = context.Process(
+            target=_run_worker,
+            args=(shard_ids, shard_count, socket_path, stub),
+            name=f"shards-{shard_ids[0]}-{shard_ids[-1]}",
+        )
+        process.start()
+        processes[index] = (process, shard_ids, time.monotonic())
+
+    ranges = shard_ranges(workers, shard_count)
+    log.info("Starting workers", workers=len(ranges), shards=shard_count)
+    for index, shard_ids in enumerate(ranges):
+        spawn(index, shard_ids)
+
+    try:
+        while not stop.is_set() and (processes or restarts):
+            now = time.monotonic()
+            timeout = min([5] + [restart_at - now for restart_at, _ in restarts.values()])
+            try:
+                await asyncio.wait_for(stop.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            if stop.is_set():
+                break
+
+            now = time.monotonic()
+            for index, (process, shard_ids, started_at) in list(processes.items()):
+                if process.is_alive():
+                    if now - started_at >= WORKER_STABLE_SECONDS:
+                        failures.pop(index, None)
+                    continue
+                del processes[index]
+                if now - started_at < WORKER_STABLE_SECONDS:
+                    failures[index] = failures.get(index, 0) + 1
+                else:
+                    failures.pop(index, None)
+                if failures.get(index, 0) >= MAX_WORKER_START_FAILURES:
+                    log.error("Worker keeps failing to start, giving up on it", worker=process.name,
+                              exit_code=process.exitcode, failures=failures[index])
+                    continue
+                delay = restart_delay(failures.get(index, 0))
+                log.warning("Worker exited, restarting", worker=process.name, exit_code=process.exitcode,
+                            delay=delay)
+                restarts[index] = (now + delay, shard_ids)
+            for index, (restart_at, shard_ids) in list(restarts.items()):
+                if restart_at <= now:
+                    del restarts[index]
+                    spawn(index, shard_ids)
+        if not stop.is_set():
+            log.error("Every worker failed to start, stopping")
+    finally:
+        log.info("Stopping workers")
+        for process, _, _ in processes.values():
+            process.terminate()
+        for process, _, _ in processes.values():
+            await asyncio.to_thread(process.join, 30)
+        await coordinator.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_cluster(workers=CLUSTER_WORKERS, shard_count=SHARD_COUNT, socket_path=COORDINATOR_SOCKET,
+                stub=CLUSTER_STUB_GATEWAY):
+    """Run the bot as several worker processes, each owning a contiguous range of shards
+
+    This process hosts the Coordinator, so workers share one Scryfall response cache and
+    one rate limit instead of each spending the full 10 requests per second, and restarts
+    any worker that dies, backing off when one keeps failing to start and giving up on it
+    after MAX_WORKER_START_FAILURES. Each worker only schedules and answers for its own guilds.
+    """
+    asyncio.run(_supervise(workers, shard_count, socket_path, stub))
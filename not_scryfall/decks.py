@@ -0,0 +1,148 @@
+import re
+import uuid
+from typing import NamedTuple, Optional
+from scryfall.cache import TTLCache
+from scryfall.scryfall import ScryfallAPI
+
+# Most decklist lines priced; past this a deck would take more than a few collection requests
+MAX_DECK_LINES = 250
+# Largest attached decklist read
+MAX_DECKLIST_BYTES = 64 * 1024
+# Plain text lists; MTGO's XML .dek files are not read
+DECKLIST_EXTENSIONS = (".txt", ".dec", ".csv")
+DECK_LINES_PER_PAGE = 20
+# Section headers in Arena, MTGO and Moxfield exports
+SECTION_PATTERN = re.compile(
+    r"(?P<section>deck|main ?deck|main ?board|commanders?|companion|side ?board|maybe ?board)\s*:?", re.IGNORECASE)
+# "4 Lightning Bolt", "4x Lightning Bolt (M10) 146 *F*" or "SB: 2 Duress"; *F* marks foils, *E* etched foils
+DECK_LINE_PATTERN = re.compile(
+    r"(?P<sideboard>SB:\s*)?(?:(?P<quantity>\d+)x?\s+)?(?P<name>.+?)"
+    r"(?:\s+\((?P<set>[A-Za-z0-9]{2,6})\)(?:\s+\S+)?)?(?:\s+\*(?P<finish>[FE])\*)?",
+    re.IGNORECASE
+)
+FINISHES = {"F": "foil", "E": "etched"}
+# Slash command options are one line, so "4 Lightning Bolt; 20 Mountain" splits at semicolons,
+# or without any, "4 Lightning Bolt 20 Mountain" splits before each count. A number right
+# after a set code, as in "4 Lightning Bolt (M10) 146 20 Mountain", is a collector number.
+INLINE_SEPARATOR_PATTERN = re.compile(r"\s*;\s*")
+INLINE_COUNT_PATTERN = re.compile(r"(?<![)\s])\s+(?=\d+x?\s)")
+DECK_ID_NAMESPACE = uuid.UUID("0b6f4f8e-2f43-4d7c-9a4e-3b8c1d0e5a71")
+
+# Priced decks by id, so their page buttons can redraw them without pricing the deck again
+_summaries = TTLCache(max_entries=256, ttl=3600)
+
+
+class DeckEntry(NamedTuple):
+    quantity: int
+    name: str
+    set_code: Optional[str] = None
+    sideboard: bool = False
+    finish: Optional[str] = None  # "foil" or "etched", priced as that finish
+
+
+def parse_decklist(text: str) -> list:
+    """Entries of a pasted or exported decklist, skipping section headers, comments and blank lines"""
+    lines = text.splitlines()
+    if len(lines) == 1:
+        pattern = INLINE_SEPARATOR_PATTERN if ";" in lines[0] else INLINE_COUNT_PATTERN
+        lines = pattern.split(lines[0])
+
+    entries = []
+    sideboard = False
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(("//", "#")):
+            continue
+        section = SECTION_PATTERN.fullmatch(line)
+        if section:
+            sideboard = section.group("section").lower().replace(" ", "") in ("sideboard", "maybeboard")
+            continue
+        match = DECK_LINE_PATTERN.fullmatch(line)
+        quantity = int(match.group("quantity") or 1)
+        if quantity:
+            finish = FINISHES.get((match.group("finish") or "").upper())
+            entries.append(DeckEntry(quantity, match.group("name"), match.group("set"),
+                                     sideboard or bool(match.group("sideboard")), finish))
+    return entries
+
+
+async def read_attachment(attachments: list) -> Optional[str]:
+    """Text of the first attachment that looks like a decklist, or None"""
+    for attachment in attachments:
+        content_type = (attachment.content_type or "").split(";")[0]
+        is_text = content_type.startswith("text/") and content_type not in ("text/xml", "text/html")
+        if (is_text or attachment.filename.lower().endswith(DECKLIST_EXTENSIONS)) \
+                and attachment.size <= MAX_DECKLIST_BYTES:
+            return (await attachment.read()).decode("utf-8", errors="replace")
+    return None
+
+
+def deck_id(entries: list) -> str:
+    """The same id for the same list of cards, however it was written"""
+    key = "\n".join(f"{entry.quantity} {entry.name.lower()} {(entry.set_code or '').lower()} {entry.sideboard:d}"
+                    + (f" {entry.finish}" if entry.finish else "") for entry in entries)
+    return str(uuid.uuid5(DECK_ID_NAMESPACE, key))
+
+
+async def get_deck_summary(summary_id: str) -> Optional[dict]:
+    """A deck priced in the last hour by price_deck, or None"""
+    return _summaries.get(summary_id)
+
+
+async def price_deck(entries: list) -> Optional[dict]:
+    """
+    Price every entry of a decklist, fetching its cards in a few collection requests
+
+    Returns:
+        dict: Totals and a line per entry, most expensive first, or None if Scryfall could not be reached
+    """
+    # numpy is slow to import, so only load it when a deck is priced
+    import numpy as np
+
+    skipped = max(len(entries) - MAX_DECK_LINES, 0)
+    entries = entries[:MAX_DECK_LINES]
+    summary_id = deck_id(entries)
+    summary = _summaries.get(summary_id)
+    if summary is not None:
+        return summary
+
+    identifiers = [{"name": entry.name, "set": entry.set_code} if entry.set_code else {"name": entry.name}
+                   for entry in entries]
+    cards = await ScryfallAPI.get_collection(identifiers)
+    if cards is None:
+        return None
+
+    quantities = np.array([entry.quantity for entry in entries], dtype=np.int64)
+    unit_prices = np.array([ScryfallAPI.usd_price(card, entry.finish) for card, entry in zip(cards, entries)],
+                           dtype=np.float64)
+    sideboard = np.array([entry.sideboard for entry in entries], dtype=bool)
+    line_totals = quantities * unit_prices
+    priced = ~np.isnan(unit_prices)
+    # Most expensive first, unpriced cards last
+    order = np.argsort(np.where(priced, -line_totals, np.inf), kind="stable")
+
+    summary = {
+        "id": summary_id,
+        "scryfall_uri": None,
+        "total": float(np.nansum(line_totals)),
+        "main_total": float(np.nansum(line_totals[~sideboard])),
+        "sideboard_total": float(np.nansum(line_totals[sideboard])),
+        "card_count": int(quantities.sum()),
+        "sideboard_count": int(quantities[sideboard].sum()),
+        "not_found": [entry.name for entry, card in zip(entries, cards) if card is None],
+        "unpriced": [card["name"] for card, has_price in zip(cards, priced) if card is not None and not has_price],
+        "skipped_lines": skipped,
+        "lines": [
+            {
+                "quantity": int(quantities[index]),
+                "name": (cards[index]["name"] if cards[index] else entries[index].name)
+                + (f" ({entries[index].finish})" if entries[index].finish else ""),
+                "found": cards[index] is not None,
+                "price": float(unit_prices[index]) if priced[index] else None,
+                "total": float(line_totals[index]) if priced[index] else None,
+            }
+            for index in order
+        ],
+    }
+    _summaries.set(summary_id, summary)
+    return summary
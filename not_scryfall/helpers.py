@@ -1,23 +1,64 @@
+import os
 import re
+import time
+import asyncio
 import discord
 from scryfall.scryfall import ScryfallAPI
 from typing import Optional
 import math
-from database.db import Database
-import dateparser
+from database.async_db import AsyncDatabase
+from telemetry.tracing import span
+from .card_images import CardImages
+from .decks import DECK_LINES_PER_PAGE
+
+# Schedule parsing patterns used by Helper.parse_schedule
+CRON_FIELD = r"(?:[\d*/,\-]+)"
+CRON_NAMED_FIELD = r"(?:[\d*/,\-]|[A-Za-z]{3})+"
+CRON_PATTERN = re.compile(
+    rf"^{CRON_FIELD}\s+{CRON_FIELD}\s+{CRON_FIELD}\s+{CRON_NAMED_FIELD}\s+{CRON_NAMED_FIELD}$"
+)
+TIME_PATTERN = re.compile(
+    r"(?<![\d:])(?P<hour>\d{1,2})(?::(?P<minute>[0-5]\d))?\s*(?:(?P<meridiem>[ap])\.?m\.?)?(?![\w:])",
+    re.IGNORECASE
+)
+NAMED_TIME_PATTERN = re.compile(r"\b(noon|midnight)\b", re.IGNORECASE)
+DAILY_PATTERN = re.compile(r'(?:every|each)\s+day|daily', re.IGNORECASE)
+WEEKLY_PATTERN = re.compile(
+    r'(?:every|each)\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday|week|mon|tue|wed|thu|fri|sat|sun)\b',
+    re.IGNORECASE
+)
+DAY_NAME_PATTERN = re.compile(
+    r'\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tue|wed|thu|fri|sat|sun)\b',
+    re.IGNORECASE
+)
+WEEKDAYS = {'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 0}
+
+# How long the emoji name -> id map is used before it is fetched again
+EMOJI_REFRESH_SECONDS = float(os.getenv("EMOJI_REFRESH_SECONDS", "3600"))
 
 
 class Helper:
-    def __init__(self, bot):
+    # Emoji name -> id, shared by every Helper so mana symbols don't each cost a fetch_emojis
+    emoji_ids = None
+    emoji_ids_loaded_at = 0.0
+    # Shared so every Helper uses the same process pool and disk cache
+    card_images = CardImages()
+
+    def __init__(self, bot, db: AsyncDatabase = None):
+        """
+        Args:
+            db: The bot's shared database, for guilds' embed colors; without one embeds use the default color
+        """
         self.bot = bot
-        self.db = Database()
+        self.db = db
 
     async def _get_emoji_id(self, emoji_name: str):
-        emojis = await self.bot.fetch_emojis()
-        for emoji in emojis:
-            if emoji.name == emoji_name.lower():
-                return emoji.id
-        return None
+        if Helper.emoji_ids is None or time.time() - Helper.emoji_ids_loaded_at > EMOJI_REFRESH_SECONDS:
+            with span("emoji fetch"):
+                emojis = await self.bot.fetch_emojis()
+            Helper.emoji_ids = {emoji.name: emoji.id for emoji in emojis}
+            Helper.emoji_ids_loaded_at = time.time()
+        return Helper.emoji_ids.get(emoji_name.lower())
 
     async def _format_mana_cost(self, mana_cost: str):
         mana_string = ""
@@ -39,12 +80,77 @@ class Helper:
                     mana_symbol, f"<:mana{symbol}:{emoji_id}>")
         return oracle_text
 
-    def _get_guild_embed_color(self, guild_id=None):
+    async def _get_guild_embed_color(self, guild_id=None):
         """Get the appropriate embed color for a guild"""
-        if guild_id:
-            return self.db.get_embed_color(guild_id)
+        if guild_id and self.db:
+            return await self.db.get_embed_color(guild_id)
         return discord.Color.blurple()
 
+    def _loaded_guild_embed_color(self, guild_id=None):
+        """The guild's embed color without waiting, or the default until the database has opened"""
+        database = self.db.db if self.db else None
+        if guild_id and database:
+            # Answered from the in-memory settings copy, so it never touches SQLite
+            return database.get_embed_color(guild_id)
+        return discord.Color.blurple()
+
+    @staticmethod
+    def _schedule_to_cron(schedule_text, hour, minute):
+        """Build a cron expression from the recurrence words in a schedule and a time"""
+        if DAILY_PATTERN.search(schedule_text):
+            return f"{minute} {hour} * * *"  # Every day at the specified time
+        if WEEKLY_PATTERN.search(schedule_text):
+            # Map weekday names to cron day numbers (0-6, where 0 is Sunday)
+            day_name = DAY_NAME_PATTERN.search(schedule_text)
+            if day_name:
+                day_of_week = WEEKDAYS[day_name.group(1).lower()[:3]]
+                return f"{minute} {hour} * * {day_of_week}"  # Every specified weekday at the specified time
+            # If no specific day mentioned but "weekly", default to Monday
+            return f"{minute} {hour} * * 1"
+
+        # Default: if we can parse the time but not the recurrence pattern, assume daily
+        return f"{minute} {hour} * * *"
+
+    @staticmethod
+    def _parse_schedule_fast(schedule_text):
+        """
+        Parse the common schedule forms without dateparser
+
+        Handles raw cron expressions and "every day at 5PM", "every Monday at 10:30AM",
+        "daily 17:00", "noon" and "midnight" style times.
+
+        Returns:
+            str: Cron expression, or None if the text needs the slow parser
+        """
+        schedule_text = schedule_text.strip()
+        if CRON_PATTERN.match(schedule_text):
+            return schedule_text
+
+        # Bare numbers ("every 2 days") are not times, so take the first match with
+        # minutes or an AM/PM marker
+        time_match = next(
+            (match for match in TIME_PATTERN.finditer(schedule_text)
+             if match.group("minute") or match.group("meridiem")),
+            None
+        )
+        if time_match:
+            hour = int(time_match.group("hour"))
+            minute = int(time_match.group("minute") or 0)
+            meridiem = time_match.group("meridiem")
+            if meridiem:
+                if not 1 <= hour <= 12:
+                    return None
+                hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+            elif hour > 23:
+                return None
+        else:
+            named_time = NAMED_TIME_PATTERN.search(schedule_text)
+            if not named_time:
+                return None
+            hour, minute = (12, 0) if named_time.group(1).lower() == "noon" else (0, 0)
+
+        return Helper._schedule_to_cron(schedule_text, hour, minute)
+
     @staticmethod
     def parse_schedule(schedule_text):
         """
@@ -57,11 +163,14 @@ class Helper:
             str: Cron expression or original text if can't be parsed
         """
         schedule_text = schedule_text.strip()
-        
-        # Try to identify recurring schedule patterns
-        daily_pattern = re.search(r'(?:every|each)\s+day|daily', schedule_text, re.IGNORECASE)
-        weekly_pattern = re.search(r'(?:every|each)\s+(monday|tuesday|wednesday|thursday|friday|saturday|sunday|week|mon|tue|wed|thu|fri|sat|sun)', schedule_text, re.IGNORECASE)
-        
+
+        cron_schedule = Helper._parse_schedule_fast(schedule_text)
+        if cron_schedule:
+            return cron_schedule
+
+        # dateparser is slow to import, so only load it when the fast path gives up
+        import dateparser
+
         # Try to parse time using dateparser
         # Create a reference time string
         time_ref = "at " + schedule_text.split("at ")[-1] if "at " in schedule_text else schedule_text
@@ -70,39 +179,15 @@ class Helper:
         if not parsed_time:
             return schedule_text  # Return original if we can't parse the time
         
-        # Extract hour and minute
-        hour = parsed_time.hour
-        minute = parsed_time.minute
-        
-        # Determine the schedule type and create appropriate cron expression
-        if daily_pattern:
-            return f"{minute} {hour} * * *"  # Every day at the specified time
-        elif weekly_pattern:
-            # Map weekday names to cron day numbers (0-6, where 0 is Sunday)
-            days_mapping = {
-                'monday': 1, 'mon': 1,
-                'tuesday': 2, 'tue': 2,
-                'wednesday': 3, 'wed': 3,
-                'thursday': 4, 'thu': 4, 
-                'friday': 5, 'fri': 5,
-                'saturday': 6, 'sat': 6,
-                'sunday': 0, 'sun': 0
-            }
-            
-            day_of_week = None
-            for day_name, day_num in days_mapping.items():
-                if re.search(r'\b' + day_name + r'\b', schedule_text, re.IGNORECASE):
-                    day_of_week = day_num
-                    break
-            
-            if day_of_week is not None:
-                return f"{minute} {hour} * * {day_of_week}"  # Every specified weekday at the specified time
-            else:
-                # If no specific day mentioned but "weekly", default to Monday
-                return f"{minute} {hour} * * 1"
-        
-        # Default: if we can parse the time but not the recurrence pattern, assume daily
-        return f"{minute} {hour} * * *"
+        return Helper._schedule_to_cron(schedule_text, parsed_time.hour, parsed_time.minute)
+
+    @staticmethod
+    async def parse_schedule_async(schedule_text):
+        """Parse a schedule like parse_schedule, running the dateparser fallback in a worker thread"""
+        cron_schedule = Helper._parse_schedule_fast(schedule_text)
+        if cron_schedule:
+            return cron_schedule
+        return await asyncio.to_thread(Helper.parse_schedule, schedule_text)
 
 
     async def create_paginated_embed(self, card, embed_type="card", page=0, guild_id=None):
@@ -112,7 +197,7 @@ class Helper:
         # Create embed with guild-specific color
         embed = discord.Embed(
             url=card["scryfall_uri"],
-            color=self._get_guild_embed_color(guild_id)
+            color=await self._get_guild_embed_color(guild_id)
         )
         embed.set_footer(text="Data provided by Scryfall")
         total_pages = 1
@@ -200,6 +285,34 @@ class Helper:
                 embed.title = f"No price data for {card['name']}"
                 embed.description = "This card may not be available for purchase or price data is unavailable."
                 
+        elif embed_type == "deck":
+            lines = card["lines"]
+            total_pages = max(math.ceil(len(lines) / DECK_LINES_PER_PAGE), 1)
+            page = min(page, total_pages - 1)
+            start_idx = page * DECK_LINES_PER_PAGE
+
+            embed.title = f"Deck price: ${card['total']:.2f} (Page {page + 1}/{total_pages})"
+            embed.description = "\n".join(
+                f"{line['quantity']}x {line['name']} - ${line['total']:.2f}"
+                + (f" (${line['price']:.2f} each)" if line["quantity"] > 1 else "")
+                if line["price"] is not None
+                else f"{line['quantity']}x {line['name']} - {'no price' if line['found'] else 'not found'}"
+                for line in lines[start_idx:start_idx + DECK_LINES_PER_PAGE]
+            )
+            embed.add_field(name="Cards", value=str(card["card_count"]), inline=True)
+            if card["sideboard_count"]:
+                embed.add_field(name="Main deck", value=f"${card['main_total']:.2f}", inline=True)
+                embed.add_field(name="Sideboard", value=f"${card['sideboard_total']:.2f}", inline=True)
+            for name, names in (("Not found", card["not_found"]), ("No price", card["unpriced"])):
+                if names:
+                    value = ", ".join(names)
+                    embed.add_field(name=name, value=value if len(value) <= 1024 else value[:1021] + "...",
+                                    inline=False)
+            if card["skipped_lines"]:
+                embed.add_field(name="Not priced",
+                                value=f"Only the first {len(lines)} lines are priced, "
+                                      f"{card['skipped_lines']} more were left out.", inline=False)
+
         elif embed_type == "legality":
             if "legalities" in card and card["legalities"]:
                 embed.title = f"Format Legality for {card['name']}"
@@ -234,9 +347,14 @@ class Helper:
         return embed
 
     async def get_image_embed(self, card_name: str, set_code: str = None, guild_id=None):
+        """
+        Returns:
+            tuple: (embeds, CardImages they show as attachments), or (None, []) if the card could not be fetched.
+                Double-faced cards get one embed showing both faces side by side.
+        """
         card = await ScryfallAPI.get_image(card_name, set_code)
         if not card:
-            return None
+            return None, []
 
         embeds = []
         embed = await self.create_card_embed(card, "image", guild_id)
@@ -244,12 +362,35 @@ class Helper:
             embeds.append(embed)
 
             if len(card["images"]) > 1:
+                image = await Helper.card_images.composite(card)
+                if image:
+                    embed.set_image(url=f"attachment://{image.filename}")
+                    return embeds, [image]
+
+                # Without a composite image, show the back face in an embed of its own
                 card_back = dict(card)
                 card_back["name"] = f"{card['name']} (Back)"
                 card_back["images"] = [card["images"][1]]
                 back_embed = await self.create_card_embed(card_back, "image", guild_id)
                 embeds.append(back_embed)
-        return embeds
+        return embeds, []
+
+    def get_skeleton_embed(self, card_name: str, set_code: str = None, guild_id=None, loading: str = "Loading..."):
+        """Embed with just the card's name and image from the cache, or None if the card isn't cached"""
+        card = ScryfallAPI.get_cached_card(card_name, set_code)
+        if not card:
+            return None
+
+        embed = discord.Embed(
+            title=card["name"],
+            url=card["scryfall_uri"],
+            description=loading,
+            color=self._loaded_guild_embed_color(guild_id)
+        )
+        if card["small_image"]:
+            embed.set_thumbnail(url=card["small_image"])
+        embed.set_footer(text="Data provided by Scryfall")
+        return embed
 
     async def get_price_embed(self, card_name: str, set_code: str = None, guild_id=None):
         card = await ScryfallAPI.get_price(card_name, set_code)
@@ -1,144 +1,275 @@
 import re
 import os
+import time
+import asyncio
 import discord
+from typing import NamedTuple, Optional
 from .helpers import Helper
-from discord.ui import Button, View
+from .pagination import Pagination
+from .rate_limits import LookupLimiter
+from .decks import parse_decklist, price_deck, read_attachment
+from .send_queue import SendQueue, MAX_EMBEDS_PER_MESSAGE, MAX_EMBED_CHARS_PER_MESSAGE
+from discord.ui import View
 from scryfall.scryfall import ScryfallAPI
+from database.async_db import AsyncDatabase
+from scryfall.fair_queue import current_flow
+from scryfall.popularity import PopularityTracker, lookup_key
+from telemetry.metrics import LOOKUP_LATENCY
+from telemetry.recorder import LookupRecorder
+from telemetry.tracing import trace, span
+from telemetry.log import get_logger
 
+# Most [[card]] lookups answered for one message
+MAX_CARDS_PER_MESSAGE = int(os.getenv("MAX_CARDS_PER_MESSAGE", "10"))
+ALLOW_READ_MESSAGE = os.getenv("ALLOW_READ_MESSAGE", 'true').lower() == 'true'
+CARD_LOOKUP_PATTERN = re.compile(r"\[\[(.*?)\]\]")
+# [[$deck 4 Lightning Bolt; 20 Mountain]], or [[$deck]] with the list below it or attached
+DECK_LOOKUP_PATTERN = re.compile(r"\[\[\$deck\b(.*?)\]\]", re.IGNORECASE | re.DOTALL)
+log = get_logger(__name__)
+log.info("Message commands enabled" if ALLOW_READ_MESSAGE else "Message commands disabled", setting="ALLOW_READ_MESSAGE")
 
-class MessagePaginationView(View):
-    def __init__(self, helper, card, embed_type, guild_id=None, timeout=180):
-        super().__init__(timeout=timeout)
-        self.helper = helper
-        self.card = card
-        self.embed_type = embed_type
-        self.guild_id = guild_id
-        self.current_page = 0
-        self.total_pages = None
-        # Initialize buttons as disabled until setup is complete
-        self.prev_page.disabled = True
-        self.next_page.disabled = True
-
-    async def setup(self):
-        """Initialize the view with the first embed and page count"""
-        embed, self.total_pages = await self.helper.create_paginated_embed(
-            self.card, self.embed_type, 0, self.guild_id
-        )
-        self.prev_page.disabled = True
-        self.next_page.disabled = self.total_pages <= 1
-        return embed
-
-    async def update_message(self, interaction: discord.Interaction):
-        embed, self.total_pages = await self.helper.create_paginated_embed(
-            self.card, self.embed_type, self.current_page, self.guild_id
-        )
-        self.prev_page.disabled = self.current_page <= 0
-        self.next_page.disabled = self.current_page >= self.total_pages - 1
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
-    async def prev_page(self, button: Button, interaction: discord.Interaction):
-        if self.current_page > 0:
-            self.current_page -= 1
-            await self.update_message(interaction)
-
-    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
-    async def next_page(self, button: Button, interaction: discord.Interaction):
-        if self.total_pages and self.current_page < self.total_pages - 1:
-            self.current_page += 1
-            await self.update_message(interaction)
+
+class LookupResult(NamedTuple):
+    """What one [[card]] lookup produced, ready to be packed into replies"""
+    embeds: list
+    view: Optional[View] = None
+    text: Optional[str] = None  # Shown instead of embeds, e.g. an error
+    files: tuple = ()  # CardImages the embeds show as attachments
 
 
 class MessageCommand:
-    # Print if ALLOW_READ_MESSAGE is enabled when this module is imported
-    ALLOW_READ_MESSAGE_enabled = os.getenv("ALLOW_READ_MESSAGE", 'true').lower()
-    print(f"ALLOW_READ_MESSAGE={ALLOW_READ_MESSAGE_enabled}. Bot will respond to message commands.")
+    """Answers [[card]] lookups in chat messages; one instance serves every message"""
+
+    def __init__(self, bot, send_queue: SendQueue, pagination: Pagination = None,
+                 recorder: LookupRecorder = None, popularity: PopularityTracker = None, db: AsyncDatabase = None):
+        self.bot = bot
+        self.send_queue = send_queue
+        self.card_lookup = Helper(bot, db)
+        self.pagination = pagination or Pagination(self.card_lookup)
+        self.limiter = LookupLimiter()
+        self.recorder = recorder
+        self.popularity = popularity
 
-    def __init__(self, message: discord.Message, bot):
-        self.message = message
-        self.card_lookup = Helper(bot)
-        self.guild_id = message.guild.id if message.guild else None
+    @staticmethod
+    def _failed(card_name: str, what: str = "a card"):
+        return LookupResult([], text=f"Could not fetch {what} for `{card_name}` at the moment. Please try again later.")
 
-    async def image_lookup(self, card_name: str, set_code: str = None):
-        embeds = await self.card_lookup.get_image_embed(card_name, set_code, self.guild_id)
+    async def image_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
+        embeds, files = await self.card_lookup.get_image_embed(card_name, set_code, guild_id)
         if not embeds:
-            await self.message.reply("Could not fetch a card at the moment. Please try again later.")
-            return
-        for embed in embeds:
-            await self.message.reply(embed=embed)
+            return self._failed(card_name)
+        return LookupResult(embeds, files=tuple(files))
 
-    async def price_lookup(self, card_name: str, set_code: str = None):
-        embed = await self.card_lookup.get_price_embed(card_name, set_code, self.guild_id)
+    async def price_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
+        embed = await self.card_lookup.get_price_embed(card_name, set_code, guild_id)
         if not embed:
-            await self.message.reply("Could not fetch a card at the moment. Please try again later.")
-            return
-        await self.message.reply(embed=embed)
+            return self._failed(card_name)
+        return LookupResult([embed])
 
-    async def rulings_lookup(self, card_name: str, set_code: str = None):
+    async def rulings_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
         card = await ScryfallAPI.get_rulings(card_name, set_code)
         if not card:
-            await self.message.reply("Could not fetch a card at the moment. Please try again later.")
-            return
+            return self._failed(card_name)
 
-        view = MessagePaginationView(self.card_lookup, card, "rulings", self.guild_id)
-        embed = await view.setup()
-        await self.message.reply(embed=embed, view=view if view.total_pages > 1 else None)
+        embed, view = await self.pagination.first_page(card, "rulings", guild_id)
+        return LookupResult([embed], view)
 
-    async def legality_lookup(self, card_name: str, set_code: str = None):
-        embed = await self.card_lookup.get_legality_embed(card_name, set_code, self.guild_id)
+    async def legality_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
+        embed = await self.card_lookup.get_legality_embed(card_name, set_code, guild_id)
         if not embed:
-            await self.message.reply("Could not fetch a card at the moment. Please try again later.")
-            return
-        await self.message.reply(embed=embed)
+            return self._failed(card_name)
+        return LookupResult([embed])
 
-    async def default_lookup(self, card_name: str, set_code: str = None):
-        embed = await self.card_lookup.get_card_embed(card_name, set_code, self.guild_id)
+    async def default_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
+        embed = await self.card_lookup.get_card_embed(card_name, set_code, guild_id)
         if not embed:
-            await self.message.reply("Could not fetch a card at the moment. Please try again later.")
-            return
-        await self.message.reply(embed=embed)
+            return self._failed(card_name)
+        return LookupResult([embed])
 
-    async def sets_lookup(self, card_name: str, set_code: str = None):
+    async def sets_lookup(self, card_name: str, set_code: str = None, guild_id: int = None):
         card = await ScryfallAPI.get_sets(card_name)
         if not card:
-            await self.message.reply("Could not fetch sets at the moment. Please try again later.")
-            return
+            return self._failed(card_name, "sets")
 
-        view = MessagePaginationView(self.card_lookup, card, "sets", self.guild_id)
-        embed = await view.setup()
-        await self.message.reply(embed=embed, view=view if view.total_pages > 1 else None)
+        embed, view = await self.pagination.first_page(card, "sets", guild_id)
+        return LookupResult([embed], view)
 
-    async def process_card_name(self, card_name: str):
+    async def process_card_name(self, card_name: str, guild_id: int = None) -> LookupResult:
         # Split card name and set code if present
         card_parts = card_name.split('|')
         card_base = card_parts[0].strip()
         set_code = card_parts[1].strip() if len(card_parts) > 1 else None
 
         if card_base.startswith("!"):
-            await self.image_lookup(card_base[1:], set_code)
+            lookup, embed_type = self.image_lookup, "image"
         elif card_base.startswith("$"):
-            await self.price_lookup(card_base[1:], set_code)
+            lookup, embed_type = self.price_lookup, "price"
         elif card_base.startswith("?"):
-            await self.rulings_lookup(card_base[1:], set_code)
+            lookup, embed_type = self.rulings_lookup, "rulings"
         elif card_base.startswith("#"):
-            await self.legality_lookup(card_base[1:], set_code)
+            lookup, embed_type = self.legality_lookup, "legality"
         elif card_base.startswith("@"):
-            await self.sets_lookup(card_base[1:], set_code)
+            lookup, embed_type = self.sets_lookup, "sets"
         else:
-            await self.default_lookup(card_base, set_code)
+            lookup, embed_type = self.default_lookup, "card"
+        if embed_type != "card":
+            card_base = card_base[1:]
 
-    @classmethod
-    async def handle_message(cls, message: discord.Message, bot):
-        if message.author == bot.user:
-            return
+        start = time.perf_counter()
+        try:
+            with span(f"lookup {embed_type} {card_base!r}"):
+                result = await lookup(card_base, set_code, guild_id)
+        finally:
+            LOOKUP_LATENCY.observe(time.perf_counter() - start, embed_type)
+        if self.popularity and not result.text:
+            self.popularity.add(lookup_key(card_base, set_code))
+        return result
+
+    async def reply_with_results(self, message: discord.Message, results, notes=()) -> list:
+        """Reply with every result in order, packing embeds into as few messages as Discord allows
+
+        Returns the reply each result's embeds ended up in, or None for text results.
+        """
+        sent = [None] * len(results)
+        lines = list(notes)
+        embeds = []
+        embed_chars = 0
+        files = []
+        packed = []  # Indexes of the results in the pending reply
+
+        async def flush():
+            nonlocal lines, embeds, embed_chars, files, packed
+            if lines or embeds:
+                reply = await self.send_queue.reply(
+                    message, "\n".join(lines) or None, embeds, files=[image.to_file() for image in files])
+                for index in packed:
+                    sent[index] = reply
+            lines, embeds, embed_chars, files, packed = [], [], 0, [], []
+
+        for index, result in enumerate(results):
+            if result.text:
+                lines.append(result.text)
+            elif result.view:
+                # Paginated results need a message of their own to carry the buttons
+                await flush()
+                sent[index] = await self.send_queue.reply(message, embeds=result.embeds[:1], view=result.view)
+                result.view.stop()
+            else:
+                for embed in result.embeds:
+                    if len(embeds) == MAX_EMBEDS_PER_MESSAGE or embed_chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE:
+                        await flush()
+                    embeds.append(embed)
+                    embed_chars += len(embed)
+                # At most one file per embed, so Discord's 10 attachments a message are never exceeded
+                files.extend(result.files)
+                packed.append(index)
+        await flush()
+        return sent
 
+    async def handle_message(self, message: discord.Message):
         content = message.content
-        card_lookup_regex = r"\[\[(.*?)\]\]"
-        card_names = re.findall(card_lookup_regex, content)
+        # Nearly every message has no lookup at all, so turn those away before anything else
+        if "[[" not in content or message.author == self.bot.user:
+            return
+
+        deck = DECK_LOOKUP_PATTERN.search(content)
+        if deck:
+            await self.handle_deck(message, deck.group(1).strip() or content[deck.end():].strip())
+            return
 
+        # Looking a card up twice in one message only answers it once
+        card_names = list({name.strip().lower(): name for name in CARD_LOOKUP_PATTERN.findall(content)}.values())
         if not card_names:
             return
 
-        command = cls(message, bot)
-        for card_name in card_names:
-            await command.process_card_name(card_name)
+        notes = []
+        if len(card_names) > MAX_CARDS_PER_MESSAGE:
+            notes.append(f"Only the first {MAX_CARDS_PER_MESSAGE} cards in a message are looked up.")
+            card_names = card_names[:MAX_CARDS_PER_MESSAGE]
+
+        guild_id = message.guild.id if message.guild else None
+        channel_id = message.channel.id
+        if self.recorder:
+            # Recorded before the limits below, so replays see the demand rather than what was answered
+            self.recorder.record(guild_id, card_names)
+        results = [None] * len(card_names)
+        to_fetch = []
+        for index, card_name in enumerate(card_names):
+            jump_url = self.limiter.recent_answer(channel_id, guild_id, card_name)
+            if jump_url:
+                results[index] = LookupResult([], text=f"`{card_name}` was just looked up here: {jump_url}")
+            else:
+                to_fetch.append(index)
+
+        allowed = self.limiter.allow(message.author.id, channel_id, guild_id, len(to_fetch))
+        if allowed < len(to_fetch):
+            if allowed == 0 and len(to_fetch) == len(card_names):
+                # Nothing to answer, so don't add to the flood with a reply
+                await self._react(message, "\N{HOURGLASS WITH FLOWING SAND}")
+                return
+            notes.append(f"Skipped {len(to_fetch) - allowed} lookups, cards are being looked up too quickly here.")
+            for index in to_fetch[allowed:]:
+                results[index] = LookupResult([])
+            to_fetch = to_fetch[:allowed]
+
+        with trace(f"[[card]] message with {len(to_fetch)} lookups"):
+            # Scryfall requests made for these lookups take turns with other guilds' requests
+            current_flow.set(guild_id or f"dm-{message.author.id}")
+            # Resolve every lookup at once; gather keeps the results in message order
+            fetched = await asyncio.gather(
+                *(self.process_card_name(card_names[index], guild_id) for index in to_fetch),
+                return_exceptions=True
+            )
+            for index, result in zip(to_fetch, fetched):
+                if isinstance(result, Exception):
+                    log.warning("Lookup failed", lookup=card_names[index], exc_info=result)
+                    result = self._failed(card_names[index])
+                results[index] = result
+
+            sent = await self.reply_with_results(message, results, notes)
+            for index in to_fetch:
+                if sent[index] is not None:
+                    self.limiter.remember_answer(channel_id, card_names[index], sent[index].jump_url)
+
+    async def handle_deck(self, message: discord.Message, decklist: str):
+        """Reply with the price of a [[$deck]] decklist, read from the attachments if none was written"""
+        guild_id = message.guild.id if message.guild else None
+        usage = "Write the decklist after `[[$deck]]` or attach it as a text file."
+        if not decklist.strip() and not message.attachments:
+            await self.send_queue.reply(message, usage)
+            return
+        # A deck takes a few collection requests however long it is, so it counts as one lookup.
+        # Checked before any attachment is downloaded.
+        if not self.limiter.allow(message.author.id, message.channel.id, guild_id, 1):
+            await self._react(message, "\N{HOURGLASS WITH FLOWING SAND}")
+            return
+        entries = parse_decklist(decklist or await read_attachment(message.attachments) or "")
+        if not entries:
+            await self.send_queue.reply(message, usage)
+            return
+
+        with trace(f"[[$deck]] message with {len(entries)} lines"):
+            current_flow.set(guild_id or f"dm-{message.author.id}")
+            start = time.perf_counter()
+            try:
+                with span("price deck"):
+                    deck = await price_deck(entries)
+            except Exception as e:
+                # Answered like a deck Scryfall could not price, as failed [[card]] lookups are
+                log.warning("Deck lookup failed", lines=len(entries), exc_info=e)
+                deck = None
+            finally:
+                LOOKUP_LATENCY.observe(time.perf_counter() - start, "deck")
+            if deck:
+                embed, view = await self.pagination.first_page(deck, "deck", guild_id)
+                result = LookupResult([embed], view)
+            else:
+                result = LookupResult([], text="Could not fetch prices for this deck at the moment. Please try again later.")
+            await self.reply_with_results(message, [result])
+
+    @staticmethod
+    async def _react(message: discord.Message, emoji: str):
+        try:
+            await message.add_reaction(emoji)
+        except discord.HTTPException:
+            pass
@@ -0,0 +1,85 @@
+import re
+import time
+import discord
+from discord.ui import Button, View
+from scryfall.scryfall import ScryfallAPI
+from scryfall.fair_queue import current_flow
+from .helpers import Helper
+from .decks import get_deck_summary
+from telemetry.metrics import COMMAND_LATENCY
+from telemetry.tracing import trace, span
+
+# Page buttons carry everything needed to draw their page: "page:<embed type>:<card id>:<page>"
+PAGE_BUTTON_PATTERN = re.compile(r"page:(rulings|sets|deck):([0-9a-f-]{36}):(\d+)")
+# How each paginated embed type gets its card again by id
+PAGINATED_CARDS = {
+    "rulings": ScryfallAPI.get_rulings_by_id,
+    "sets": ScryfallAPI.get_sets_by_id,
+    # Deck summaries aren't on Scryfall, so their buttons stop working once the summary expires
+    "deck": get_deck_summary,
+}
+
+
+def page_buttons(embed_type: str, card_id: str, page: int, total_pages: int) -> View:
+    """Previous/Next buttons for a page; send it, then stop() it so py-cord does not keep it"""
+    view = View(timeout=None)
+    view.add_item(Button(
+        label="Previous", style=discord.ButtonStyle.secondary, disabled=page <= 0,
+        custom_id=f"page:{embed_type}:{card_id}:{max(page - 1, 0)}"
+    ))
+    view.add_item(Button(
+        label="Next", style=discord.ButtonStyle.secondary, disabled=page >= total_pages - 1,
+        custom_id=f"page:{embed_type}:{card_id}:{page + 1}"
+    ))
+    return view
+
+
+class Pagination:
+    """Paginated rulings, sets and deck price embeds whose buttons keep working without any stored state
+
+    Nothing is held per message: a button's custom_id names the card, embed type and page
+    it leads to, and clicks re-render that page from the Scryfall response cache. Memory
+    stays bounded by that cache however many paginated messages are out there, and the
+    buttons keep working across restarts.
+    """
+
+    def __init__(self, helper: Helper):
+        self.helper = helper
+
+    async def first_page(self, card: dict, embed_type: str, guild_id=None):
+        """The first page's embed, and its buttons or None if there is only one page"""
+        embed, total_pages = await self.helper.create_paginated_embed(card, embed_type, 0, guild_id)
+        if total_pages <= 1 or not card.get("id"):
+            return embed, None
+        return embed, page_buttons(embed_type, card["id"], 0, total_pages)
+
+    async def handle_interaction(self, interaction: discord.Interaction):
+        """on_interaction listener that answers page button clicks"""
+        if interaction.type is not discord.InteractionType.component:
+            return
+        match = PAGE_BUTTON_PATTERN.fullmatch((interaction.data or {}).get("custom_id", ""))
+        if not match:
+            return
+
+        start = time.perf_counter()
+        embed_type, card_id, page = match.group(1), match.group(2), int(match.group(3))
+        current_flow.set(interaction.guild_id or f"dm-{interaction.user.id}")
+        with trace(f"{embed_type} page button"):
+            card = await PAGINATED_CARDS[embed_type](card_id)
+            if not card:
+                await interaction.response.send_message(
+                    "This deck's prices have expired, please price it again." if embed_type == "deck"
+                    else "Could not fetch this card at the moment. Please try again later.", ephemeral=True)
+                return
+
+            embed, total_pages = await self.helper.create_paginated_embed(card, embed_type, page, interaction.guild_id)
+            if page >= total_pages:
+                # The card has fewer pages than when the buttons were made
+                page = total_pages - 1
+                embed, total_pages = await self.helper.create_paginated_embed(
+                    card, embed_type, page, interaction.guild_id)
+            view = page_buttons(embed_type, card_id, page, total_pages)
+            with span("discord edit"):
+                await interaction.response.edit_message(embed=embed, view=view)
+            view.stop()
+        COMMAND_LATENCY.observe(time.perf_counter() - start, "page-button")
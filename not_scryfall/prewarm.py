@@ -0,0 +1,90 @@
+import os
+import time
+import asyncio
+from scryfall.scryfall import ScryfallAPI
+from scryfall.fair_queue import in_background
+from scryfall.popularity import PopularityTracker
+from .saved_state import write_json_gz, read_json_gz
+from telemetry.log import get_logger
+
+POPULARITY_PATH = os.getenv("POPULARITY_PATH", "./data/popularity.json.gz")
+# How many of the most looked up cards are kept cached; 0 turns prewarming off
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "100"))
+# Seconds between prewarming rounds, which also save the counts
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "600"))
+# Lookup counts halve over this many hours
+POPULARITY_HALF_LIFE = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "24")) * 3600
+POPULARITY_VERSION = 1
+log = get_logger(__name__)
+
+
+class CachePrewarmer:
+    """Keeps the most looked up cards cached before anyone asks for them again
+
+    Every PREWARM_INTERVAL seconds the top PREWARM_TOP_N cards by decayed lookup count get
+    their lookup, rulings and printings fetched if they are missing from the cache or
+    would expire before the next round. Those requests go in the rate limiter's background
+    lane, so they only use capacity no lookup is waiting for. The counts are saved to disk
+    each round and on shutdown.
+    """
+
+    def __init__(self, popularity: PopularityTracker, path: str = POPULARITY_PATH,
+                 top_n: int = PREWARM_TOP_N, interval: float = PREWARM_INTERVAL):
+        self.popularity = popularity
+        self.path = path
+        self.top_n = top_n
+        self.interval = interval
+        self._task = None
+
+    async def save(self):
+        """Write the lookup counts; serialization happens off the event loop"""
+        state = {"version": POPULARITY_VERSION, "written_at": time.time(), "popularity": self.popularity.dump()}
+        try:
+            await asyncio.to_thread(write_json_gz, self.path, state)
+        except OSError as e:
+            log.warning("Could not save lookup counts", path=self.path, error=e)
+
+    def load(self):
+        """Restore the lookup counts saved by the last run, decayed for the time since"""
+        state = read_json_gz(self.path)
+        if state is None:
+            return
+
+        if state.get("version") != POPULARITY_VERSION or not self.popularity.load(state["popularity"]):
+            log.info("Ignoring lookup counts from an older version", path=self.path)
+            return
+        self.popularity.decay()
+        log.info("Restored lookup counts", path=self.path, cards=len(self.popularity))
+
+    def start(self):
+        """Prewarm periodically until stop()"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._prewarm_periodically())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _prewarm_periodically(self):
+        # Only this task's requests wait for spare capacity
+        in_background.set(True)
+        while True:
+            await self.prewarm()
+            await self.save()
+            await asyncio.sleep(self.interval)
+
+    async def prewarm(self) -> int:
+        """Cache the top cards' responses that are missing or expiring soon, returning how many cards were checked"""
+        self.popularity.decay()
+        top = self.popularity.top(self.top_n) if self.top_n > 0 else []
+        start = time.perf_counter()
+        for key, _ in top:
+            card_name, _, set_code = key.partition("|")
+            try:
+                await ScryfallAPI.prewarm(card_name, set_code or None, min_ttl=self.interval)
+            except Exception as e:
+                log.warning("Could not prewarm card", card=key, error=e)
+        if top:
+            log.info("Prewarmed popular cards", cards=len(top), seconds=round(time.perf_counter() - start, 1))
+        return len(top)
@@ -0,0 +1,154 @@
+import os
+import math
+import asyncio
+import discord
+from scryfall.scryfall import ScryfallAPI
+from .scheduler import CronScheduler
+from .send_queue import SendQueue, SCHEDULED
+from telemetry.log import get_logger
+
+# When watched prices are checked, in cron format; Scryfall updates prices about once a day. Empty turns checks off
+PRICE_ALERT_SCHEDULE = os.getenv("PRICE_ALERT_SCHEDULE", "0 */6 * * *")
+# Most cards one guild may watch, which bounds the collection requests a check takes
+MAX_WATCHES_PER_GUILD = int(os.getenv("MAX_WATCHES_PER_GUILD", "50"))
+# Scheduler key of the check, which runs for every guild at once
+PRICE_ALERT_CHECK = "price-alerts"
+MAX_ALERT_DESCRIPTION_CHARS = 4000
+log = get_logger(__name__)
+
+
+def evaluate(current, last, reference, above, below, change_percent):
+    """
+    Which watches fire, in one pass over arrays holding an element per watch
+
+    NaN stands for a missing price or an unset condition, and never fires. Thresholds
+    fire when the price crossed them since the last check; a change fires once the
+    price is change_percent away from the reference price.
+
+    Returns:
+        tuple: (rose above, fell below, moved) boolean arrays
+    """
+    import numpy as np
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rose = (last < above) & (current >= above)
+        fell = (last > below) & (current <= below)
+        moved = (reference > 0) & (np.abs(current - reference) / reference * 100 >= change_percent)
+    return rose, fell, moved
+
+
+def _or_none(value):
+    """A numpy float as a Python float for SQLite, or None for NaN"""
+    return None if math.isnan(value) else float(value)
+
+
+def describe(watch: dict) -> str:
+    """The conditions of a watch, e.g. "above $5.00, moves 20%" """
+    conditions = []
+    if watch["above"] is not None:
+        conditions.append(f"above ${watch['above']:.2f}")
+    if watch["below"] is not None:
+        conditions.append(f"below ${watch['below']:.2f}")
+    if watch["change_percent"] is not None:
+        conditions.append(f"moves {watch['change_percent']:g}%")
+    return ", ".join(conditions)
+
+
+class PriceAlerts:
+    """Checks every watched printing's price on a schedule and posts alerts to the guilds' channels
+
+    A check fetches each watched printing once through collection requests, however many
+    guilds watch it, then evaluates every watch together against the resulting price array.
+    """
+
+    def __init__(self, bot: discord.AutoShardedBot, db, send_queue: SendQueue):
+        self.bot = bot
+        self.db = db
+        self.send_queue = send_queue
+        self.scheduler = CronScheduler(self._on_due)
+
+    def start(self):
+        if PRICE_ALERT_SCHEDULE and not self.scheduler.running:
+            self.scheduler.set(PRICE_ALERT_CHECK, PRICE_ALERT_SCHEDULE, None)
+            self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    async def _on_due(self, fire_time, due):
+        await self.check()
+
+    async def check(self) -> int:
+        """Check every watch of the guilds this bot can see, returning how many alerts were posted"""
+        # numpy is slow to import, so only load it when prices are checked
+        import numpy as np
+
+        # Cluster workers share the database, so each checks only its own guilds
+        watches = [watch for watch in await self.db.get_price_watches() if self.bot.get_guild(watch["guild_id"])]
+        if not watches:
+            return 0
+
+        card_ids, card_index = np.unique([watch["card_id"] for watch in watches], return_inverse=True)
+        cards = await ScryfallAPI.get_collection([{"id": str(card_id)} for card_id in card_ids])
+        if cards is None:
+            log.warning("Could not fetch prices for price alerts", cards=len(card_ids))
+            return 0
+
+        def column(name):
+            return np.array([watch[name] for watch in watches], dtype=np.float64)
+
+        prices = np.array([ScryfallAPI.usd_price(card) for card in cards], dtype=np.float64)
+        current = prices[card_index]
+        last, reference = column("last_price"), column("reference_price")
+        rose, fell, moved = evaluate(current, last, reference, column("above"), column("below"),
+                                     column("change_percent"))
+
+        # A move is measured from the price of the last move alert, or the first price seen
+        new_reference = np.where(moved | (np.isnan(reference) & ~np.isnan(current)), current, reference)
+        new_last = np.where(np.isnan(current), last, current)
+        changed = ~(np.isclose(new_reference, reference, equal_nan=True) & np.isclose(new_last, last, equal_nan=True))
+        updates = [(_or_none(new_reference[index]), _or_none(new_last[index]),
+                    watches[index]["guild_id"], watches[index]["card_id"]) for index in np.flatnonzero(changed)]
+        if updates:
+            await self.db.update_watch_prices(updates)
+
+        lines = {}  # (guild id, channel id) -> alert lines
+        for index in np.flatnonzero(rose | fell | moved):
+            watch, card = watches[index], cards[card_index[index]]
+            reasons = []
+            if rose[index]:
+                reasons.append(f"rose above ${watch['above']:.2f}")
+            if fell[index]:
+                reasons.append(f"fell below ${watch['below']:.2f}")
+            if moved[index]:
+                reasons.append(f"moved {(current[index] / reference[index] - 1) * 100:+.0f}% "
+                               f"from ${reference[index]:.2f}")
+            lines.setdefault((watch["guild_id"], watch["channel_id"]), []).append(
+                f"[{watch['card_name']}]({card['scryfall_uri']}) ({(watch['set_code'] or '').upper()}) "
+                f"is ${current[index]:.2f}: {', '.join(reasons)}")
+
+        # The send queue limits how many of these go out at once
+        await asyncio.gather(*(self._post(guild_id, channel_id, channel_lines)
+                               for (guild_id, channel_id), channel_lines in lines.items()))
+        return sum(len(channel_lines) for channel_lines in lines.values())
+
+    async def _post(self, guild_id: int, channel_id: int, lines: list):
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            log.warning("Price alert channel not found", guild=guild_id, channel=channel_id)
+            return
+
+        color = await self.db.get_embed_color(guild_id)
+        chunks = [[]]
+        for line in lines:
+            if sum(len(chunk_line) + 1 for chunk_line in chunks[-1]) + len(line) > MAX_ALERT_DESCRIPTION_CHARS:
+                chunks.append([])
+            chunks[-1].append(line)
+        for chunk in chunks:
+            embed = discord.Embed(title="Price alerts", description="\n".join(chunk), color=color)
+            embed.set_footer(text="Data provided by Scryfall")
+            try:
+                await self.send_queue.send(channel, SCHEDULED, embeds=[embed])
+            except discord.HTTPException as e:
+                log.warning("Could not post price alerts", guild=guild_id, channel=channel_id, error=e)
+                return
@@ -0,0 +1,105 @@
+import os
+import time
+from typing import Optional
+from collections import Counter, OrderedDict
+from telemetry.log import get_logger
+
+# [[card]] lookups allowed per minute, in bursts of up to as many; 0 turns a limit off
+USER_LOOKUPS_PER_MINUTE = float(os.getenv("USER_LOOKUPS_PER_MINUTE", "20"))
+CHANNEL_LOOKUPS_PER_MINUTE = float(os.getenv("CHANNEL_LOOKUPS_PER_MINUTE", "40"))
+GUILD_LOOKUPS_PER_MINUTE = float(os.getenv("GUILD_LOOKUPS_PER_MINUTE", "120"))
+# Repeating a lookup in the same channel within this many seconds points at the earlier answer
+DUPLICATE_LOOKUP_WINDOW = float(os.getenv("DUPLICATE_LOOKUP_WINDOW", "60"))
+# Most users, channels or recent answers remembered; the least recently seen are forgotten
+MAX_TRACKED_KEYS = 10000
+log = get_logger(__name__)
+
+
+class TokenBuckets:
+    """One token bucket per key, each refilling at per_minute tokens a minute up to per_minute"""
+
+    def __init__(self, per_minute: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def available(self, key, now: float) -> float:
+        if self.capacity <= 0:
+            return float("inf")
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+        tokens, updated_at = entry
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def spend(self, key, tokens: int, now: float):
+        if self.capacity <= 0:
+            return
+        self._buckets[key] = (self.available(key, now) - tokens, now)
+        self._buckets.move_to_end(key)
+        # A forgotten key just starts again with a full bucket
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class LookupLimiter:
+    """Keeps one user, channel or guild from spending the whole Scryfall budget
+
+    Every lookup costs a token from the user's, the channel's and the guild's bucket. Lookups
+    answered in the same channel a moment ago are not fetched again but pointed at instead,
+    which costs nothing. Usage is counted per guild so heavy users can be spotted.
+    """
+
+    def __init__(self):
+        self.users = TokenBuckets(USER_LOOKUPS_PER_MINUTE)
+        self.channels = TokenBuckets(CHANNEL_LOOKUPS_PER_MINUTE)
+        self.guilds = TokenBuckets(GUILD_LOOKUPS_PER_MINUTE)
+        self.usage = {}  # guild_id (None for DMs) -> Counter of lookups, limited and deduplicated
+        self._answers = OrderedDict()  # (channel_id, lookup) -> (answered_at, jump_url)
+
+    def _count(self, guild_id, **counts):
+        usage = self.usage.get(guild_id)
+        if usage is None:
+            usage = self.usage[guild_id] = Counter()
+        usage.update(counts)
+
+    def allow(self, user_id: int, channel_id: int, guild_id: Optional[int], count: int) -> int:
+        """Spend tokens for up to count lookups, returning how many of them may go ahead"""
+        now = time.monotonic()
+        allowed = max(0, int(min(
+            count,
+            self.users.available(user_id, now),
+            self.channels.available(channel_id, now),
+            self.guilds.available(guild_id, now),
+        )))
+        for buckets, key in ((self.users, user_id), (self.channels, channel_id), (self.guilds, guild_id)):
+            buckets.spend(key, allowed, now)
+
+        self._count(guild_id, lookups=allowed, limited=count - allowed)
+        if allowed < count:
+            # Logged about once a minute per guild, however hard it keeps hitting the limit
+            log.warning("Lookup limit reached", guild=guild_id, channel=channel_id, user=user_id,
+                        **self.usage[guild_id], extra={"repeat_key": guild_id or f"dm-{user_id}"})
+        return allowed
+
+    def recent_answer(self, channel_id: int, guild_id: Optional[int], lookup: str) -> Optional[str]:
+        """Link to where this lookup was answered in the channel within the window, if it was"""
+        answer = self._answers.get((channel_id, lookup.strip().lower()))
+        if answer is None or time.monotonic() - answer[0] > DUPLICATE_LOOKUP_WINDOW:
+            return None
+        self._count(guild_id, deduplicated=1)
+        return answer[1]
+
+    def remember_answer(self, channel_id: int, lookup: str, jump_url: str):
+        if DUPLICATE_LOOKUP_WINDOW <= 0:
+            return
+        key = (channel_id, lookup.strip().lower())
+        self._answers[key] = (time.monotonic(), jump_url)
+        self._answers.move_to_end(key)
+        while len(self._answers) > MAX_TRACKED_KEYS:
+            self._answers.popitem(last=False)
+
+    def top_guilds(self, count: int = 10) -> list:
+        """The guilds with the most lookups, as (guild_id, usage) pairs"""
+        return sorted(self.usage.items(), key=lambda item: item[1]["lookups"], reverse=True)[:count]
@@ -0,0 +1,29 @@
+import os
+import gzip
+import json
+from typing import Optional
+from telemetry.log import get_logger
+
+log = get_logger(__name__)
+
+
+def write_json_gz(path: str, data: dict):
+    """Write data as gzipped JSON, replacing the file at path only once the whole of it is written"""
+    # Write to a temporary file first so a crash mid-write never leaves a torn file
+    temp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=5) as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def read_json_gz(path: str) -> Optional[dict]:
+    """Data written by write_json_gz, or None if there is no file or it can't be read"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable saved state", path=path, error=e)
+        return None
@@ -0,0 +1,157 @@
+import os
+import heapq
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+from telemetry.log import get_logger
+
+# Fires missed while the bot was down are caught up (once) if they are at most this old
+CATCH_UP_WINDOW = timedelta(hours=float(os.getenv("SCHEDULE_CATCH_UP_HOURS", "24")))
+log = get_logger(__name__)
+
+
+def _next_fire(cron_schedule, base):
+    """The first time after base that cron_schedule fires"""
+    # Deferred so croniter only loads once there are schedules to run
+    import croniter
+    return croniter.croniter(cron_schedule, base).get_next(datetime)
+
+
+class CronScheduler:
+    """Min-heap of (next_fire_time, guild_id) that sleeps until the earliest post is due
+
+    Changing or removing a guild's schedule pushes a new heap entry (or just forgets the
+    guild) and leaves the old entry to be skipped when it reaches the top, so updates
+    cost O(log n). Only guilds that fire get their next time recomputed.
+    """
+
+    def __init__(self, on_due):
+        """
+        Args:
+            on_due: Coroutine function called as on_due(fire_time, [(guild_id, channel_id), ...])
+                with every guild due at the same fire time
+        """
+        self._on_due = on_due
+        self._heap = []  # (fire_time, entry_id, guild_id)
+        self._entries = {}  # guild_id -> (entry_id, cron_schedule, channel_id)
+        self._entry_ids = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._posting = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, guild_id):
+        return guild_id in self._entries
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def set(self, guild_id, cron_schedule, channel_id, last_posted=None):
+        """Schedule (or reschedule) a guild
+
+        Args:
+            last_posted: When the guild last posted. If a fire was missed since then and
+                is inside CATCH_UP_WINDOW, it is made due immediately.
+
+        Returns:
+            bool: False if the cron expression is invalid
+        """
+        now = datetime.now()
+        try:
+            if last_posted is not None:
+                fire_time = _next_fire(cron_schedule, last_posted)
+                if fire_time < now - CATCH_UP_WINDOW:
+                    fire_time = _next_fire(cron_schedule, now)
+            else:
+                fire_time = _next_fire(cron_schedule, now)
+        except (ValueError, KeyError) as e:
+            log.warning("Invalid schedule", guild=guild_id, schedule=cron_schedule, error=e)
+            self.remove(guild_id)
+            return False
+
+        entry_id = next(self._entry_ids)
+        self._entries[guild_id] = (entry_id, cron_schedule, channel_id)
+        heapq.heappush(self._heap, (fire_time, entry_id, guild_id))
+        if self._heap[0][1] == entry_id:
+            # New earliest post, so cut the current sleep short
+            self._wakeup.set()
+        self._compact()
+        return True
+
+    def remove(self, guild_id):
+        """Stop posting for a guild; its heap entry is dropped when it surfaces"""
+        self._entries.pop(guild_id, None)
+        self._compact()
+
+    def _compact(self):
+        """Rebuild the heap once stale entries outnumber live ones"""
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [item for item in self._heap if self._is_live(item)]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, item):
+        entry = self._entries.get(item[2])
+        return entry is not None and entry[0] == item[1]
+
+    def _peek(self):
+        """Earliest live heap item, discarding stale ones on the way"""
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    async def _sleep_until(self, fire_time):
+        self._wakeup.clear()
+        timeout = None
+        if fire_time is not None:
+            timeout = max((fire_time - datetime.now()).total_seconds(), 0)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            head = self._peek()
+            if head is None or head[0] > datetime.now():
+                await self._sleep_until(head[0] if head else None)
+                continue
+
+            fire_time = head[0]
+            now = datetime.now()
+            due = []
+            while head is not None and head[0] == fire_time:
+                heapq.heappop(self._heap)
+                guild_id = head[2]
+                _, cron_schedule, channel_id = self._entries[guild_id]
+                due.append((guild_id, channel_id))
+
+                # Next fire after this one; if the loop fell behind, skip to the future
+                # instead of replaying every missed slot
+                next_fire = _next_fire(cron_schedule, fire_time)
+                if next_fire <= now:
+                    next_fire = _next_fire(cron_schedule, now)
+                heapq.heappush(self._heap, (next_fire, self._entries[guild_id][0], guild_id))
+                head = self._peek()
+
+            # Post in the background so a slow slot never delays the next one
+            task = asyncio.create_task(self._post(fire_time, due))
+            self._posting.add(task)
+            task.add_done_callback(self._posting.discard)
+
+    async def _post(self, fire_time, due):
+        try:
+            await self._on_due(fire_time, due)
+        except Exception:
+            log.exception("Could not post scheduled cards", fire_time=fire_time, guilds=len(due))
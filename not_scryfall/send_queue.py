@@ -0,0 +1,207 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import discord
+from telemetry.metrics import SEND_QUEUE_WAIT
+from telemetry.tracing import span
+
+# Priorities; lower goes first
+INTERACTIVE = 0
+SCHEDULED = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SCHEDULED: "scheduled"}
+
+# Messages being sent at once across all channels
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "16"))
+# Most scheduled posts being sent at once, leaving the other senders free for replies
+SCHEDULED_POST_CONCURRENCY = int(os.getenv("SCHEDULED_POST_CONCURRENCY", "10"))
+# Discord lets a channel take about 5 messages every 5 seconds
+CHANNEL_SEND_BURST = 5
+CHANNEL_SEND_INTERVAL = 1.0
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_CONTENT_CHARS = 2000
+MAX_TRACKED_CHANNELS = 10000
+
+
+class _Send:
+    __slots__ = ("channel", "content", "embeds", "view", "reference", "files", "future", "queued_at")
+
+    def __init__(self, channel, content, embeds, view, reference, files, future):
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds or []
+        self.view = view
+        self.reference = reference
+        self.files = files
+        self.future = future
+        self.queued_at = time.monotonic()
+
+    def can_merge(self, other: "_Send") -> bool:
+        """Whether other can go out in the same message as this send"""
+        if self.view or other.view or self.files or other.files or self.reference is not other.reference:
+            return False
+        if len(self.embeds) + len(other.embeds) > MAX_EMBEDS_PER_MESSAGE:
+            return False
+        if sum(len(embed) for embed in self.embeds + other.embeds) > MAX_EMBED_CHARS_PER_MESSAGE:
+            return False
+        return len(self.content or "") + len(other.content or "") < MAX_CONTENT_CHARS
+
+
+class SendQueue:
+    """Sends every outgoing message, so bursts are paced instead of blocking in py-cord
+
+    Each channel gets a bucket matching Discord's per-channel limit, and a channel's queued
+    messages go out one at a time in order. Replies to users go before scheduled posts,
+    and scheduled posts never take up every sender. Queued messages for the same channel
+    are merged into one message where Discord allows it.
+
+    Interaction responses (ctx.respond) have their own webhook limits and a 3 second
+    deadline, so they are sent directly rather than through here.
+    """
+
+    def __init__(self, concurrency: int = SEND_CONCURRENCY, scheduled_concurrency: int = SCHEDULED_POST_CONCURRENCY):
+        self.concurrency = concurrency
+        self.scheduled_concurrency = min(scheduled_concurrency, concurrency)
+        self._pending = {}  # channel id -> heap of (priority, seq, _Send)
+        self._ready = []  # (priority, seq, channel id) for channels that may send now
+        self._busy = set()  # Channels with a send in flight
+        self._waiting = set()  # Channels waiting for their bucket to refill
+        self._tat = {}  # channel id -> theoretical arrival time of its next send
+        self._scheduled_in_flight = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._workers = []
+
+    def __len__(self):
+        return sum(len(pending) for pending in self._pending.values())
+
+    async def send(self, channel: discord.abc.Messageable, priority: int = INTERACTIVE, content: str = None,
+                   embeds: list = None, view: discord.ui.View = None,
+                   reference: discord.Message = None, files: list = None) -> discord.Message:
+        """Queue a message and wait until it is sent, returning it; send errors are raised here"""
+        if not self._workers:
+            self._wakeup = asyncio.Event()
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+        future = asyncio.get_running_loop().create_future()
+        job = _Send(channel, content, embeds, view, reference, files, future)
+        pending = self._pending.setdefault(channel.id, [])
+        heapq.heappush(pending, (priority, next(self._seq), job))
+        self._make_ready(channel.id, priority)
+        with span(f"discord send ({PRIORITY_NAMES[priority]})"):
+            return await future
+
+    async def reply(self, message: discord.Message, content: str = None, embeds: list = None,
+                    view: discord.ui.View = None, files: list = None) -> discord.Message:
+        return await self.send(message.channel, INTERACTIVE, content, embeds, view, reference=message, files=files)
+
+    def _make_ready(self, channel_id: int, priority: int):
+        heapq.heappush(self._ready, (priority, next(self._seq), channel_id))
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _bucket_wait(self, channel_id: int, now: float) -> float:
+        tolerance = (CHANNEL_SEND_BURST - 1) * CHANNEL_SEND_INTERVAL
+        return max(0.0, self._tat.get(channel_id, now) - tolerance - now)
+
+    def _refilled(self, channel_id: int):
+        self._waiting.discard(channel_id)
+        pending = self._pending.get(channel_id)
+        if pending:
+            self._make_ready(channel_id, pending[0][0])
+
+    def _take(self):
+        """Pop the channel that should send next, or None if none may send right now"""
+        held = []  # Scheduled channels passed over while their lane is full
+        try:
+            while self._ready:
+                entry = heapq.heappop(self._ready)
+                channel_id = entry[2]
+                pending = self._pending.get(channel_id)
+                # Drop entries for channels that are already being served or were emptied
+                if channel_id in self._busy or channel_id in self._waiting or not pending:
+                    continue
+                if pending[0][0] == SCHEDULED and self._scheduled_in_flight >= self.scheduled_concurrency:
+                    # Hold it for when the lane frees up, under its pending priority in case the entry
+                    # was queued for a reply since sent. Replies sort first, so only stop scanning
+                    # once the entries left are scheduled too.
+                    held.append((SCHEDULED, entry[1], channel_id))
+                    if entry[0] == SCHEDULED:
+                        return None
+                    continue
+                wait = self._bucket_wait(channel_id, time.monotonic())
+                if wait > 0:
+                    self._waiting.add(channel_id)
+                    asyncio.get_running_loop().call_later(wait, self._refilled, channel_id)
+                    continue
+                return channel_id
+            return None
+        finally:
+            for entry in held:
+                heapq.heappush(self._ready, entry)
+
+    async def _work(self):
+        while True:
+            channel_id = self._take()
+            if channel_id is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._send_next(channel_id)
+
+    async def _send_next(self, channel_id: int):
+        pending = self._pending[channel_id]
+        priority, _, job = heapq.heappop(pending)
+        merged = [job]
+        while pending and pending[0][0] == priority and job.can_merge(pending[0][2]):
+            other = heapq.heappop(pending)[2]
+            job.embeds = job.embeds + other.embeds
+            if other.content:
+                job.content = f"{job.content}\n{other.content}" if job.content else other.content
+            merged.append(other)
+
+        self._busy.add(channel_id)
+        if priority == SCHEDULED:
+            self._scheduled_in_flight += 1
+        now = time.monotonic()
+        self._tat[channel_id] = max(self._tat.get(channel_id, now), now) + CHANNEL_SEND_INTERVAL
+        for queued in merged:
+            SEND_QUEUE_WAIT.observe(now - queued.queued_at, PRIORITY_NAMES[priority])
+        try:
+            message = await job.channel.send(
+                content=job.content, embeds=job.embeds or None, view=job.view, reference=job.reference,
+                files=job.files or None)
+            for queued in merged:
+                if not queued.future.done():
+                    queued.future.set_result(message)
+        except Exception as e:
+            for queued in merged:
+                if not queued.future.done():
+                    queued.future.set_exception(e)
+        finally:
+            self._busy.discard(channel_id)
+            if priority == SCHEDULED:
+                self._scheduled_in_flight -= 1
+            if pending:
+                self._make_ready(channel_id, pending[0][0])
+            else:
+                del self._pending[channel_id]
+                self._forget_idle_channels()
+            self._wakeup.set()
+
+    def _forget_idle_channels(self):
+        if len(self._tat) > MAX_TRACKED_CHANNELS:
+            now = time.monotonic()
+            self._tat = {channel_id: tat for channel_id, tat in self._tat.items() if tat > now}
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for pending in self._pending.values():
+            for _, _, job in pending:
+                if not job.future.done():
+                    job.future.cancel()
+        self._pending.clear()
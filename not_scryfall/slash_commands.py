@@ -1,62 +1,53 @@
 import os
+import math
+import time
+import asyncio
 import discord
 import discord.bot
 from .helpers import Helper
-from discord.ui import Button, View
+from .pagination import Pagination
+from .decks import parse_decklist, price_deck, read_attachment
+from .price_alerts import MAX_WATCHES_PER_GUILD, describe
 from scryfall.scryfall import ScryfallAPI
-from database.db import Database
-
-
-
-class PaginationView(View):
-    def __init__(self, helper: Helper, card, embed_type, guild_id=None, timeout=180):
-        super().__init__(timeout=timeout)
-        self.helper:Helper = helper
-        self.card = card
-        self.embed_type = embed_type
-        self.guild_id = guild_id
-        self.current_page = 0
-        self.total_pages = None
-        # Initialize buttons as disabled until setup is complete
-        self.prev_page.disabled = True
-        self.next_page.disabled = True
-
-    async def setup(self):
-        """Initialize the view with the first embed and page count"""
-        embed, self.total_pages = await self.helper.create_paginated_embed(
-            self.card, self.embed_type, 0, self.guild_id
-        )
-        self.prev_page.disabled = True
-        self.next_page.disabled = self.total_pages <= 1
-        return embed
+from scryfall.popularity import PopularityTracker, lookup_key
+from database.async_db import AsyncDatabase
+from telemetry.metrics import COMMAND_LATENCY
+from telemetry.tracing import trace, span
+from telemetry.log import get_logger
+
+# Defer a command when its response is expected to take longer than this many seconds
+AUTO_DEFER_SECONDS = float(os.getenv("AUTO_DEFER_SECONDS", "1.5"))
+NOT_FOUND = "Could not fetch a card at the moment. Please try again later."
+LOOKUP_FAILED = "Something went wrong with that lookup. Please try again later."
+log = get_logger(__name__)
 
-    async def update_message(self, interaction: discord.Interaction):
-        embed, self.total_pages = await self.helper.create_paginated_embed(
-            self.card, self.embed_type, self.current_page, self.guild_id
-        )
-        self.prev_page.disabled = self.current_page <= 0
-        self.next_page.disabled = self.current_page >= self.total_pages - 1
-        await interaction.response.edit_message(embed=embed, view=self)
 
-    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
-    async def prev_page(self, button: Button, interaction: discord.Interaction):
-        if self.current_page > 0:
-            self.current_page -= 1
-            await self.update_message(interaction)
+class LatencyEstimate:
+    """Exponentially weighted moving average of each command's response time"""
 
-    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
-    async def next_page(self, button: Button, interaction: discord.Interaction):
-        if self.total_pages and self.current_page < self.total_pages - 1:
-            self.current_page += 1
-            await self.update_message(interaction)
+    def __init__(self, weight: float = 0.2):
+        self.weight = weight
+        self._averages = {}
+
+    def observe(self, command_name: str, seconds: float):
+        average = self._averages.get(command_name)
+        self._averages[command_name] = seconds if average is None else average + self.weight * (seconds - average)
+
+    def projected(self, command_name: str) -> float:
+        """Expected seconds for the command, counting Scryfall requests already queued ahead of it"""
+        backlog = len(ScryfallAPI._fair_queue) * ScryfallAPI._min_delay
+        return self._averages.get(command_name, 0.0) + backlog
 
 
 class SlashCommand:
     def __init__(self, bot, parent_bot=None):
         self.bot: discord.bot.AutoShardedBot = bot
         self.parent_bot = parent_bot  # Store reference to the parent ScryfallBot instance
-        self.card_lookup = Helper(bot)
-        self.db: Database = Database()
+        self.db: AsyncDatabase = parent_bot.db if parent_bot else AsyncDatabase()
+        self.card_lookup = Helper(bot, self.db)
+        self.pagination: Pagination = parent_bot.pagination if parent_bot else Pagination(self.card_lookup)
+        self.latency = LatencyEstimate()
+        self.popularity: PopularityTracker = parent_bot.popularity if parent_bot else None
         self.register_commands()
 
     def register_commands(self):
@@ -64,17 +55,71 @@ class SlashCommand:
         self._register_card_command()
         self._register_image_command()
         self._register_price_command()
+        self._register_deck_price_command()
         self._register_rulings_command()
         self._register_legality_command()
         self._register_help_command()
         self._register_sets_command()
         self._register_settings_command()
+        self._register_watch_commands()
+
+    async def _respond(self, ctx, command_name: str, lookup, skeleton: discord.Embed = None, card: tuple = None):
+        """
+        Respond with the result of a lookup without missing Discord's 3 second deadline
+
+        Args:
+            command_name: The command, whose past response times decide whether to defer
+            lookup: Coroutine returning the keyword arguments for ctx.respond
+            skeleton: Embed from cached data to show at once, edited into the full response later
+            card: (card name, set code) the lookup is for, counted towards its popularity if found
+        """
+        with trace(f"/{command_name}"):
+            start = time.perf_counter()
+            # The lookup's stages land in this command's trace
+            task = asyncio.ensure_future(lookup)
+            try:
+                if skeleton:
+                    with span("discord skeleton"):
+                        await ctx.respond(embed=skeleton)
+                # Defer at once when the command is expected to be slow, otherwise as soon as it turns out to be,
+                # unless the command already deferred before its lookup
+                elif not ctx.response.is_done() and (
+                        self.latency.projected(command_name) > AUTO_DEFER_SECONDS
+                        or not (await asyncio.wait({task}, timeout=AUTO_DEFER_SECONDS))[0]):
+                    with span("discord defer"):
+                        await ctx.defer()
+                try:
+                    response = await task
+                except Exception:
+                    # Replace the skeleton or the deferred "thinking" message rather than leave it loading
+                    log.exception("Slash command failed", command=command_name)
+                    response = {"content": LOOKUP_FAILED, "embed": None}
+            finally:
+                task.cancel()
+                elapsed = time.perf_counter() - start
+                self.latency.observe(command_name, elapsed)
+                COMMAND_LATENCY.observe(elapsed, command_name)
+
+            if self.popularity and card and not response.get("content"):
+                self.popularity.add(lookup_key(*card))
+            with span("discord send"):
+                if skeleton:
+                    await ctx.edit(**response)
+                else:
+                    await ctx.respond(**response)
+            if response.get("view"):
+                response["view"].stop()
+
+    @staticmethod
+    def _embed_or_error(embed, error: str = NOT_FOUND) -> dict:
+        # Clearing the embed matters when the response replaces a skeleton
+        return {"embed": embed} if embed else {"content": error, "embed": None}
 
     def _register_random_command(self):
         if os.getenv("ENABLE_RANDOM_COMMAND", "true").lower() != "true":
-            print("ENABLE_RANDOM_COMMAND!=true. Random Card slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_RANDOM_COMMAND")
             return
-        print("ENABLE_RANDOM_COMMAND=true. Random Card slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_RANDOM_COMMAND")
 
         @self.bot.command(
             description="Fetch a random Magic: The Gathering card from Scryfall.",
@@ -82,19 +127,22 @@ class SlashCommand:
         )
         async def random_card(ctx):
             guild_id = ctx.guild.id if ctx.guild else None
-            embeds = await self.card_lookup.get_image_embed("random", None, guild_id)
-            if not embeds:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
-                return
-            await ctx.respond(embed=embeds[0])
-            if len(embeds) > 1:
-                await ctx.respond(embed=embeds[1])
+
+            async def lookup():
+                embeds, files = await self.card_lookup.get_image_embed("random", None, guild_id)
+                if not embeds:
+                    return self._embed_or_error(None)
+                response = {"embeds": embeds}
+                if files:
+                    response["files"] = [image.to_file() for image in files]
+                return response
+            await self._respond(ctx, "random-card", lookup())
 
     def _register_card_command(self):
         if os.getenv("ENABLE_CARD_INFO_COMMAND", "true").lower() != "true":
-            print("ENABLE_CARD_INFO_COMMAND!=true. Card Info slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_CARD_INFO_COMMAND")
             return
-        print("ENABLE_CARD_INFO_COMMAND=true. Card Info slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_CARD_INFO_COMMAND")
 
         @self.bot.command(
             description="Fetch a specific Magic: The Gathering card from Scryfall.",
@@ -108,17 +156,16 @@ class SlashCommand:
                 description="Set code (optional)", name="set", required=False)
         ):
             guild_id = ctx.guild.id if ctx.guild else None
-            embed = await self.card_lookup.get_card_embed(card_name, set_code, guild_id)
-            if not embed:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
-                return
-            await ctx.respond(embed=embed)
+
+            async def lookup():
+                return self._embed_or_error(await self.card_lookup.get_card_embed(card_name, set_code, guild_id))
+            await self._respond(ctx, "card-info", lookup(), card=(card_name, set_code))
 
     def _register_image_command(self):
         if os.getenv("ENABLE_IMAGE_COMMAND", "true").lower() != "true":
-            print("ENABLE_IMAGE_COMMAND!=true. Image slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_IMAGE_COMMAND")
             return
-        print("ENABLE_IMAGE_COMMAND=true. Image slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_IMAGE_COMMAND")
 
         @self.bot.command(
             description="Fetch a specific Magic: The Gathering card's image from Scryfall.",
@@ -132,19 +179,22 @@ class SlashCommand:
                 description="Set code (optional)", name="set", required=False)
         ):
             guild_id = ctx.guild.id if ctx.guild else None
-            embeds = await self.card_lookup.get_image_embed(card_name, set_code, guild_id)
-            if not embeds:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
-                return
-            await ctx.respond(embed=embeds[0])
-            if len(embeds) > 1:
-                await ctx.respond(embed=embeds[1])
+
+            async def lookup():
+                embeds, files = await self.card_lookup.get_image_embed(card_name, set_code, guild_id)
+                if not embeds:
+                    return self._embed_or_error(None)
+                response = {"embeds": embeds}
+                if files:
+                    response["files"] = [image.to_file() for image in files]
+                return response
+            await self._respond(ctx, "image", lookup(), card=(card_name, set_code))
 
     def _register_price_command(self):
         if os.getenv("ENABLE_PRICE_COMMAND", "true").lower() != "true":
-            print("ENABLE_PRICE_COMMAND!=true. Price slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_PRICE_COMMAND")
             return
-        print("ENABLE_PRICE_COMMAND=true. Price slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_PRICE_COMMAND")
 
         @self.bot.command(
             description="Fetch a specific Magic: The Gathering card's price from Scryfall.",
@@ -158,17 +208,57 @@ class SlashCommand:
                 description="Set code (optional)", name="set", required=False)
         ):
             guild_id = ctx.guild.id if ctx.guild else None
-            card = await self.card_lookup.get_price_embed(card_name, set_code, guild_id)
-            if not card:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
+
+            async def lookup():
+                return self._embed_or_error(await self.card_lookup.get_price_embed(card_name, set_code, guild_id))
+            # Prices take a second request, so show the card from the cache while they load
+            skeleton = self.card_lookup.get_skeleton_embed(card_name, set_code, guild_id, "Loading prices...")
+            await self._respond(ctx, "price", lookup(), skeleton, (card_name, set_code))
+
+    def _register_deck_price_command(self):
+        if os.getenv("ENABLE_DECK_PRICE_COMMAND", "true").lower() != "true":
+            log.info("Slash command disabled", setting="ENABLE_DECK_PRICE_COMMAND")
+            return
+        log.info("Slash command enabled", setting="ENABLE_DECK_PRICE_COMMAND")
+
+        @self.bot.command(
+            description="Price a whole Magic: The Gathering decklist with Scryfall prices.",
+            name="deck-price"
+        )
+        async def deck_price(
+            ctx,
+            decklist: str = discord.Option(
+                description="Cards like 4 Lightning Bolt; 20 Mountain", required=False),
+            file: discord.Attachment = discord.Option(
+                description="Decklist exported as a text file", required=False)
+        ):
+            guild_id = ctx.guild.id if ctx.guild else None
+            usage = "Write a decklist or attach one as a text file."
+            if not decklist and not file:
+                await ctx.respond(usage, ephemeral=True)
+                return
+            if not decklist:
+                # Downloading the file could outlast Discord's 3 second deadline
+                await ctx.defer()
+            entries = parse_decklist(decklist or await read_attachment([file]) or "")
+            if not entries:
+                await ctx.respond(usage, ephemeral=True)
                 return
-            await ctx.respond(embed=card)
+
+            async def lookup():
+                deck = await price_deck(entries)
+                if not deck:
+                    return self._embed_or_error(
+                        None, "Could not fetch prices for this deck at the moment. Please try again later.")
+                embed, view = await self.pagination.first_page(deck, "deck", guild_id)
+                return {"embed": embed, "view": view}
+            await self._respond(ctx, "deck-price", lookup())
 
     def _register_rulings_command(self):
         if os.getenv("ENABLE_RULINGS_COMMAND", "true").lower() != "true":
-            print("ENABLE_RULINGS_COMMAND!=true. Rulings slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_RULINGS_COMMAND")
             return
-        print("ENABLE_RULINGS_COMMAND=true. Rulings slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_RULINGS_COMMAND")
 
         @self.bot.command(
             description="Fetch a specific Magic: The Gathering card's rulings from Scryfall.",
@@ -176,20 +266,21 @@ class SlashCommand:
         )
         async def rulings(ctx, card_name: str, set_code: str = None):
             guild_id = ctx.guild.id if ctx.guild else None
-            card = await ScryfallAPI.get_rulings(card_name, set_code)
-            if not card:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
-                return
 
-            view = PaginationView(self.card_lookup, card, "rulings", guild_id)
-            embed = await view.setup()
-            await ctx.respond(embed=embed, view=view if view.total_pages > 1 else None)
+            async def lookup():
+                card = await ScryfallAPI.get_rulings(card_name, set_code)
+                if not card:
+                    return self._embed_or_error(None)
+                embed, view = await self.pagination.first_page(card, "rulings", guild_id)
+                return {"embed": embed, "view": view}
+            skeleton = self.card_lookup.get_skeleton_embed(card_name, set_code, guild_id, "Loading rulings...")
+            await self._respond(ctx, "rulings", lookup(), skeleton, (card_name, set_code))
 
     def _register_legality_command(self):
         if os.getenv("ENABLE_LEGALITY_COMMAND", "true").lower() != "true":
-            print("ENABLE_LEGALITY_COMMAND!=true. Legality slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_LEGALITY_COMMAND")
             return
-        print("ENABLE_LEGALITY_COMMAND=true. Legality slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_LEGALITY_COMMAND")
 
         @self.bot.command(
             description="Fetch a specific Magic: The Gathering card's legality from Scryfall.",
@@ -203,17 +294,16 @@ class SlashCommand:
                 description="Set code (optional)", name="set", required=False)
         ):
             guild_id = ctx.guild.id if ctx.guild else None
-            card = await self.card_lookup.get_legality_embed(card_name, set_code, guild_id)
-            if not card:
-                await ctx.respond("Could not fetch a card at the moment. Please try again later.")
-                return
-            await ctx.respond(embed=card)
+
+            async def lookup():
+                return self._embed_or_error(await self.card_lookup.get_legality_embed(card_name, set_code, guild_id))
+            await self._respond(ctx, "legality", lookup(), card=(card_name, set_code))
 
     def _register_sets_command(self):
         if os.getenv("ENABLE_SETS_COMMAND", "true").lower() != "true":
-            print("ENABLE_SETS_COMMAND!=true. Sets slash command DISABLED.")
+            log.info("Slash command disabled", setting="ENABLE_SETS_COMMAND")
             return
-        print("ENABLE_SETS_COMMAND=true. Sets slash command ENABLED.")
+        log.info("Slash command enabled", setting="ENABLE_SETS_COMMAND")
 
         @self.bot.command(
             description="Show all sets that contain a specific Magic: The Gathering card.",
@@ -221,14 +311,15 @@ class SlashCommand:
         )
         async def sets(ctx, card_name: str):
             guild_id = ctx.guild.id if ctx.guild else None
-            card = await ScryfallAPI.get_sets(card_name)
-            if not card:
-                await ctx.respond("Could not fetch sets at the moment. Please try again later.")
-                return
 
-            view = PaginationView(self.card_lookup, card, "sets", guild_id)
-            embed = await view.setup()
-            await ctx.respond(embed=embed, view=view if view.total_pages > 1 else None)
+            async def lookup():
+                card = await ScryfallAPI.get_sets(card_name)
+                if not card:
+                    return self._embed_or_error(None, "Could not fetch sets at the moment. Please try again later.")
+                embed, view = await self.pagination.first_page(card, "sets", guild_id)
+                return {"embed": embed, "view": view}
+            skeleton = self.card_lookup.get_skeleton_embed(card_name, None, guild_id, "Loading sets...")
+            await self._respond(ctx, "sets", lookup(), skeleton, (card_name, None))
 
     def _register_settings_command(self):
         @self.bot.command(
@@ -263,13 +354,13 @@ class SlashCommand:
                 # View current settings
                 embed = discord.Embed(
                     title=f"Settings for {ctx.guild.name}",
-                    color=self.db.get_embed_color(guild_id)
+                    color=await self.db.get_embed_color(guild_id)
                 )
                 # Get all settings for the guild
-                settings = self.db.get_guild_settings(guild_id)
+                settings = await self.db.get_guild_settings(guild_id)
                 if not settings:
-                    self.db.set_embed_color(guild_id, str(discord.Color.blurple())[1:])
-                    settings = self.db.get_guild_settings(guild_id)
+                    await self.db.set_embed_color(guild_id, str(discord.Color.blurple())[1:])
+                    settings = await self.db.get_guild_settings(guild_id)
                 for key, value in settings.items():
                     if value is not None and key == "random_card_channel_id":
                         channel = self.bot.get_channel(int(value))
@@ -291,12 +382,12 @@ class SlashCommand:
                     await ctx.respond("Please specify a setting to remove.", ephemeral=True)
                     return
                 
-                success = self.db.remove_guild_setting(guild_id, setting.replace("-", "_"))
+                success = await self.db.remove_guild_setting(guild_id, setting.replace("-", "_"))
                 if success:
                     # Get the parent bot instance to reload schedules if necessary
                     if setting == "random-card-schedule" or setting == "random-card-channel-id":
                         if self.parent_bot:
-                            self.parent_bot.reload_guild_schedule(guild_id)
+                            await self.parent_bot.reload_guild_schedule(guild_id)
                         
                     await ctx.respond(f"Setting {setting} removed successfully.", ephemeral=True)
                 else:
@@ -330,7 +421,7 @@ class SlashCommand:
                         )
                         return
                     
-                    success = self.db.set_embed_color(guild_id, value)
+                    success = await self.db.set_embed_color(guild_id, value)
                     if success:
                         # Create an embed with the new color to show as an example
                         new_color = discord.Color(int(value, 16))
@@ -344,15 +435,15 @@ class SlashCommand:
                         await ctx.respond("Failed to update embed color. Please try again.", ephemeral=True)
                 elif setting == "random-card-schedule":
                     # Try to parse natural language schedule into cron expression
-                    cron_schedule = Helper.parse_schedule(value)
+                    cron_schedule = await Helper.parse_schedule_async(value)
                     
                     try:
                         # Display both the natural language and cron format in the response
-                        self.db.set_random_card_schedule(guild_id, cron_schedule)
+                        await self.db.set_random_card_schedule(guild_id, cron_schedule)
                         embed = discord.Embed(
                             title="Random Card Schedule Updated",
                             description=f"Random cards will now be posted on schedule: `{value}`",
-                            color=self.db.get_embed_color(guild_id)
+                            color=await self.db.get_embed_color(guild_id)
                         )
                         
                         # If the schedule was parsed successfully, show the cron expression
@@ -362,10 +453,12 @@ class SlashCommand:
                         # Load the schedules again
                         try:
                             if self.parent_bot:
-                                self.parent_bot.reload_guild_schedule(guild_id)
-                                embed.description += "\n\nSchedule has been reloaded successfully."
-                        except Exception as e:
-                            print(f"Error reloading schedule: {e}")
+                                if await self.parent_bot.reload_guild_schedule(guild_id):
+                                    embed.description += "\n\nSchedule has been reloaded successfully."
+                                else:
+                                    embed.description += "\n\nThis is not a valid schedule, so no cards will be posted."
+                        except Exception:
+                            log.exception("Could not reload schedule", guild=guild_id)
                         
                         await ctx.respond(embed=embed, ephemeral=True)
                     except Exception as e:
@@ -381,22 +474,22 @@ class SlashCommand:
                         await ctx.respond("Channel not found. Please provide a valid channel ID.", ephemeral=True)
                         return
                     # Update the channel ID in the database
-                    success = self.db.set_random_card_channel_id(guild_id, value)
+                    success = await self.db.set_random_card_channel_id(guild_id, value)
                     if success:
                         channel = ctx.guild.get_channel(int(value))
                         embed = discord.Embed(
                             title="Random Card Channel Updated",
                             description=f"Random cards will now be posted in {channel.mention}",
-                            color=self.db.get_embed_color(guild_id)
+                            color=await self.db.get_embed_color(guild_id)
                         )
                         
                         # Reload the schedule
                         try:
                             if self.parent_bot:
-                                self.parent_bot.reload_guild_schedule(guild_id)
+                                await self.parent_bot.reload_guild_schedule(guild_id)
                                 embed.description += "\n\nSchedule has been reloaded successfully."
-                        except Exception as e:
-                            print(f"Error reloading schedule: {e}")
+                        except Exception:
+                            log.exception("Could not reload schedule", guild=guild_id)
                             
                         await ctx.respond(embed=embed, ephemeral=True)
                 else:
@@ -404,6 +497,131 @@ class SlashCommand:
             else:
                 await ctx.respond(f"Unknown action: {action}", ephemeral=True)
 
+    def _register_watch_commands(self):
+        if os.getenv("ENABLE_WATCH_COMMAND", "true").lower() != "true":
+            log.info("Slash command disabled", setting="ENABLE_WATCH_COMMAND")
+            return
+        log.info("Slash command enabled", setting="ENABLE_WATCH_COMMAND")
+
+        watch = self.bot.create_group("watch", "Get alerts in a channel when card prices move.")
+
+        @watch.command(
+            description="Watch a card's price and post in a channel when it crosses a threshold or moves.",
+            name="add"
+        )
+        async def watch_add(
+            ctx,
+            card_name: str = discord.Option(
+                description="Name of the card", name="card-name"),
+            set_code: str = discord.Option(
+                description="Set code (optional)", name="set", required=False),
+            above: float = discord.Option(
+                float, description="Alert when the price rises above this many dollars", required=False, min_value=0.0),
+            below: float = discord.Option(
+                float, description="Alert when the price falls below this many dollars", required=False, min_value=0.0),
+            change: float = discord.Option(
+                float, description="Alert when the price moves by this many percent", required=False, min_value=1.0),
+            channel: discord.TextChannel = discord.Option(
+                description="Channel for the alerts (default: this one)", required=False)
+        ):
+            if not ctx.guild:
+                await ctx.respond("Prices can only be watched in a server.", ephemeral=True)
+                return
+            if not ctx.author.guild_permissions.manage_guild:
+                await ctx.respond("You need the 'Manage Server' permission to watch prices.", ephemeral=True)
+                return
+            if above is None and below is None and change is None:
+                await ctx.respond("Give a price to alert `above` or `below`, or a percent `change`.", ephemeral=True)
+                return
+
+            await ctx.defer(ephemeral=True)
+            card = await ScryfallAPI.get_printing(card_name, set_code)
+            if not card:
+                await ctx.respond(NOT_FOUND, ephemeral=True)
+                return
+            # Replacing the watch on this printing is allowed at the limit
+            if await self.db.count_price_watches(ctx.guild.id, card["id"]) >= MAX_WATCHES_PER_GUILD:
+                await ctx.respond(f"This server already watches {MAX_WATCHES_PER_GUILD} cards, "
+                                  f"remove one with `/watch remove` first.", ephemeral=True)
+                return
+
+            price = None if math.isnan(card["price"]) else card["price"]
+            new_watch = {
+                "guild_id": ctx.guild.id,
+                "card_id": card["id"],
+                "channel_id": (channel or ctx.channel).id,
+                "card_name": card["name"],
+                "set_code": card["set"],
+                "above": above,
+                "below": below,
+                "change_percent": change,
+                "reference_price": price,
+                "last_price": price,
+            }
+            await self.db.set_price_watch(new_watch)
+            embed = discord.Embed(
+                title=f"Watching {card['name']} ({card['set'].upper()})",
+                url=card["scryfall_uri"],
+                description=f"Now {'no price' if price is None else f'${price:.2f}'}. "
+                            f"Alerts go to <#{new_watch['channel_id']}> when it {describe(new_watch)}.",
+                color=await self.db.get_embed_color(ctx.guild.id)
+            )
+            await ctx.respond(embed=embed, ephemeral=True)
+
+        @watch.command(
+            description="Stop watching a card's price.",
+            name="remove"
+        )
+        async def watch_remove(
+            ctx,
+            card_name: str = discord.Option(
+                description="Name of the card, as /watch list shows it", name="card-name"),
+            set_code: str = discord.Option(
+                description="Set code, needed when several printings of the card are watched",
+                name="set", required=False)
+        ):
+            if not ctx.guild:
+                await ctx.respond("Prices can only be watched in a server.", ephemeral=True)
+                return
+            if not ctx.author.guild_permissions.manage_guild:
+                await ctx.respond("You need the 'Manage Server' permission to watch prices.", ephemeral=True)
+                return
+
+            card_name = card_name.strip()
+            matches = [w for w in await self.db.get_price_watches(ctx.guild.id)
+                       if w["card_name"].lower() == card_name.lower()
+                       and (not set_code or (w["set_code"] or "").lower() == set_code.strip().lower())]
+            if not matches:
+                await ctx.respond(f"No card named {card_name} is watched, see `/watch list`.", ephemeral=True)
+            elif len(matches) > 1:
+                sets = ", ".join((w["set_code"] or "").upper() for w in matches)
+                await ctx.respond(f"Several printings of {card_name} are watched ({sets}), "
+                                  f"give the `set` of the one to remove.", ephemeral=True)
+            else:
+                await self.db.remove_price_watch(ctx.guild.id, matches[0]["card_id"])
+                await ctx.respond(f"Stopped watching {matches[0]['card_name']} "
+                                  f"({(matches[0]['set_code'] or '').upper()}).", ephemeral=True)
+
+        @watch.command(
+            description="Show the cards this server watches.",
+            name="list"
+        )
+        async def watch_list(ctx):
+            if not ctx.guild:
+                await ctx.respond("Prices can only be watched in a server.", ephemeral=True)
+                return
+            watches = await self.db.get_price_watches(ctx.guild.id)
+            embed = discord.Embed(
+                title=f"Watched prices ({len(watches)}/{MAX_WATCHES_PER_GUILD})",
+                description="\n".join(
+                    f"{w['card_name']} ({(w['set_code'] or '').upper()}) in <#{w['channel_id']}>: {describe(w)}"
+                    + (f", now ${w['last_price']:.2f}" if w["last_price"] is not None else "")
+                    for w in watches
+                )[:4096] or "No cards are watched. Add one with `/watch add`.",
+                color=await self.db.get_embed_color(ctx.guild.id)
+            )
+            await ctx.respond(embed=embed, ephemeral=True)
+
     def _register_help_command(self):
         @self.bot.command(
             description="Display help for all available commands.",
@@ -414,7 +632,7 @@ class SlashCommand:
             embed = discord.Embed(
                 title="Scryfall Bot Help",
                 description=f"Here are the available commands for the {self.bot.user.display_name} bot.",
-                color=self.db.get_embed_color(guild_id)
+                color=await self.db.get_embed_color(guild_id)
             )
 
             if os.getenv("ENABLE_RANDOM_COMMAND", "true").lower() == "true":
@@ -445,6 +663,13 @@ class SlashCommand:
                     inline=False,
                 )
 
+            if os.getenv("ENABLE_DECK_PRICE_COMMAND", "true").lower() == "true":
+                embed.add_field(
+                    name="/deck-price [decklist] [file]",
+                    value="Price a whole decklist, written out or attached as a text file.",
+                    inline=False,
+                )
+
             if os.getenv("ENABLE_RULINGS_COMMAND", "true").lower() == "true":
                 embed.add_field(
                     name="/rulings [card-name]",
@@ -466,6 +691,13 @@ class SlashCommand:
                     inline=False,
                 )
             
+            if os.getenv("ENABLE_WATCH_COMMAND", "true").lower() == "true":
+                embed.add_field(
+                    name="/watch [add|remove|list]",
+                    value="Post in a channel when a watched card's price crosses a threshold or moves by a percent.",
+                    inline=False,
+                )
+
             # Always show settings command with updated description
             embed.add_field(
                 name="/settings [action] [setting] [value]",
@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+from datetime import date
+from scryfall.scryfall import ScryfallAPI
+from .helpers import Helper
+from .saved_state import write_json_gz, read_json_gz
+from telemetry.log import get_logger
+
+SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "./data/cache_snapshot.json.gz")
+# Seconds between periodic snapshots; 0 only snapshots on shutdown
+SNAPSHOT_INTERVAL = float(os.getenv("CACHE_SNAPSHOT_INTERVAL", "900"))
+# Snapshots older than this are ignored at startup
+SNAPSHOT_MAX_AGE = float(os.getenv("CACHE_SNAPSHOT_MAX_AGE", "86400"))
+SNAPSHOT_VERSION = 1
+log = get_logger(__name__)
+
+
+class CacheSnapshot:
+    """Saves the in-memory caches to disk and restores them on the next start
+
+    Covers the Scryfall response cache (resolved names and card data), the emoji map
+    and, in card-of-the-day mode, today's scheduled card. Entries keep their original
+    expiry, so a restored cache never serves anything it would not have served before
+    the restart.
+    """
+
+    def __init__(self, scryfall_bot, path=SNAPSHOT_PATH, daily_cards: bool = False):
+        """
+        Args:
+            daily_cards: Whether scheduled cards are picked once a day, keying the bot's slot cards by date
+        """
+        self.scryfall_bot = scryfall_bot
+        self.path = path
+        self.daily_cards = daily_cards
+        self._task = None
+
+    def _collect(self):
+        slot_cards = {}
+        for key, card in self.scryfall_bot._slot_cards.items():
+            if isinstance(card, asyncio.Future):
+                if not card.done() or card.cancelled() or card.exception():
+                    continue
+                card = card.result()
+            # Only whole-day cards stay meaningful across a restart
+            if type(key) is date and card:
+                slot_cards[key.isoformat()] = card
+        return {
+            "version": SNAPSHOT_VERSION,
+            "written_at": time.time(),
+            "scryfall": ScryfallAPI._cache.dump(),
+            "emojis": {"loaded_at": Helper.emoji_ids_loaded_at, "ids": Helper.emoji_ids},
+            "daily_cards": slot_cards,
+        }
+
+    async def save(self):
+        """Write a snapshot; serialization happens off the event loop"""
+        snapshot = self._collect()
+        try:
+            await asyncio.to_thread(write_json_gz, self.path, snapshot)
+            log.info("Saved cache snapshot", path=self.path, responses=len(snapshot["scryfall"]))
+        except OSError as e:
+            log.warning("Could not save cache snapshot", path=self.path, error=e)
+
+    def load(self):
+        """Restore the caches from the last snapshot if there is a recent enough one"""
+        snapshot = read_json_gz(self.path)
+        if snapshot is None:
+            return
+
+        age = time.time() - snapshot.get("written_at", 0)
+        if snapshot.get("version") != SNAPSHOT_VERSION or age > SNAPSHOT_MAX_AGE:
+            log.info("Ignoring stale cache snapshot", path=self.path, age_hours=round(age / 3600, 1))
+            return
+
+        restored = ScryfallAPI._cache.load(snapshot["scryfall"])
+        emojis = snapshot["emojis"]
+        if emojis["ids"] is not None and Helper.emoji_ids is None:
+            Helper.emoji_ids = emojis["ids"]
+            Helper.emoji_ids_loaded_at = emojis["loaded_at"]
+        # Slot cards are keyed by fire time outside card-of-the-day mode, where a day's card means nothing
+        today = date.today()
+        for day, card in snapshot["daily_cards"].items() if self.daily_cards else ():
+            if date.fromisoformat(day) == today:
+                self.scryfall_bot._slot_cards[today] = card
+        log.info("Restored cache snapshot", path=self.path, responses=restored, age_minutes=round(age / 60))
+
+    def start(self):
+        """Save periodically until stop()"""
+        if SNAPSHOT_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._save_periodically())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.save()
@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire a fixed time after being set"""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, min_ttl: float = 0.0) -> Optional[object]:
+        """Get a value, or None if it is missing, expired or expires within min_ttl seconds"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if entry[0] < now:
+            del self._data[key]
+            return None
+        if entry[0] - now < min_ttl:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def dump(self) -> list:
+        """Unexpired entries as [key, expires_at, value] lists, oldest first, for snapshots"""
+        now = time.time()
+        return [[key, expires_at, value] for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def load(self, entries: list) -> int:
+        """Add entries from dump(), skipping any that expired since; returns how many were kept"""
+        now = time.time()
+        kept = 0
+        for key, expires_at, value in entries:
+            if expires_at > now and key not in self._data:
+                self._data[key] = (expires_at, value)
+                kept += 1
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return kept
@@ -0,0 +1,130 @@
+import json
+import time
+import asyncio
+import itertools
+from typing import Optional
+from .cache import TTLCache
+from telemetry.log import get_logger
+
+# Lines carry whole Scryfall responses, which can be far larger than asyncio's 64 KiB default
+STREAM_LIMIT = 2 ** 24
+log = get_logger(__name__)
+
+
+class Coordinator:
+    """Local server that lets every cluster worker share one Scryfall cache and rate limit
+
+    Workers talk to it over a Unix socket with newline-delimited JSON:
+        {"id": 1, "op": "get", "key": url}                       -> {"id": 1, "value": data or null}
+        {"id": 2, "op": "set", "key": url, "value": data}         -> {"id": 2}
+        {"id": 3, "op": "acquire"}                                -> {"id": 3, "wait": seconds}
+
+    "acquire" reserves the next request slot across all workers and answers with how long
+    the caller has to sleep before using it, keeping the cluster as a whole at Scryfall's rate.
+    """
+
+    def __init__(self, path: str, min_delay: float, cache: TTLCache):
+        self.path = path
+        self.min_delay = min_delay
+        self.cache = cache
+        self._next_slot = 0.0
+        self._server = None
+        self._clients = set()
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle_client, self.path, limit=STREAM_LIMIT)
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+
+    def _acquire(self) -> float:
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.min_delay
+        return slot - now
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                response = {"id": request["id"]}
+                op = request["op"]
+                if op == "get":
+                    response["value"] = self.cache.get(request["key"])
+                elif op == "set":
+                    self.cache.set(request["key"], request["value"])
+                elif op == "acquire":
+                    response["wait"] = self._acquire()
+                else:
+                    response["error"] = f"Unknown op {op}"
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError, KeyError) as e:
+            log.warning("Coordinator client error", error=e)
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+class CoordinatorClient:
+    """Worker-side connection to a Coordinator; calls may be made concurrently"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._ids = itertools.count()
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=STREAM_LIMIT)
+                self._reader_task = asyncio.create_task(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                response = json.loads(line)
+                future = self._pending.pop(response["id"], None)
+                if future and not future.done():
+                    future.set_result(response)
+        finally:
+            # Fail anything still waiting so callers fall back to working alone
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Coordinator connection closed"))
+            self._pending.clear()
+            if self._writer:
+                self._writer.close()
+
+    async def _call(self, op: str, **fields) -> dict:
+        await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(json.dumps({"id": request_id, "op": op, **fields}).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def cache_get(self, key: str) -> Optional[dict]:
+        return (await self._call("get", key=key)).get("value")
+
+    async def cache_set(self, key: str, value: dict):
+        await self._call("set", key=key, value=value)
+
+    async def acquire(self) -> float:
+        """Reserve the next cluster-wide request slot, returning how long to wait for it"""
+        return (await self._call("acquire"))["wait"]
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+        if self._reader_task:
+            self._reader_task.cancel()
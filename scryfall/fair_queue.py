@@ -0,0 +1,100 @@
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from collections import Counter, deque
+
+# Who the Scryfall requests made in this context are for, e.g. a guild id; None is the bot itself
+current_flow = contextvars.ContextVar("scryfall_flow", default=None)
+# Whether the Scryfall requests made in this context can wait for spare capacity, like cache prewarming
+in_background = contextvars.ContextVar("scryfall_background", default=False)
+
+
+class FairQueue:
+    """Hands out Scryfall request slots fairly between flows
+
+    While several flows (guilds, or users in DMs) have requests waiting, each gets an equal
+    share of the rate limit no matter how many requests it queues, so a flow that floods
+    lookups only delays itself. Requests are tagged with a virtual finish time, as in
+    start-time fair queueing, and slots go out in tag order one every min_delay seconds.
+
+    Background requests sit in a lane of their own, first come first served, and only
+    get slots no other request is waiting for. One queued under a key can be promoted to
+    the fair queue once a lookup comes to depend on it.
+    """
+
+    def __init__(self, min_delay: float):
+        self.min_delay = min_delay
+        self.served = Counter()  # flow -> requests let through
+        self._heap = []  # (finish_tag, seq, flow, future)
+        self._background = deque()  # (flow, future)
+        self._promotable = {}  # key -> future of a background request that can still be promoted
+        self._finish_tags = {}  # flow -> finish tag of its last queued request
+        self._virtual_time = 0.0
+        self._next_slot = 0.0
+        self._seq = itertools.count()
+        self._dispatcher = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def acquire(self, flow=None, background: bool = False, key=None):
+        """Wait until it is this flow's turn to send a request, or for a spare slot if in the background
+
+        A background request with a key can be moved into the fair queue by promote(key).
+        """
+        future = asyncio.get_running_loop().create_future()
+        if background:
+            self._background.append((flow, future))
+            if key is not None:
+                self._promotable[key] = future
+        else:
+            self._enqueue(flow, future)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        finally:
+            if key is not None and self._promotable.get(key) is future:
+                del self._promotable[key]
+
+    def promote(self, key, flow=None) -> bool:
+        """Queue the background request waiting under key as one of flow's, returning False if none is waiting
+
+        Its place in the background lane is skipped once it has been let through.
+        """
+        future = self._promotable.pop(key, None)
+        if future is None or future.done():
+            return False
+        self._enqueue(flow, future)
+        return True
+
+    def _enqueue(self, flow, future: asyncio.Future):
+        # Every request costs the same, so a flow's tags advance by one per request
+        finish = max(self._virtual_time, self._finish_tags.get(flow, 0.0)) + 1.0
+        self._finish_tags[flow] = finish
+        heapq.heappush(self._heap, (finish, next(self._seq), flow, future))
+
+    async def _dispatch(self):
+        while self._heap or self._background:
+            # Sleep before choosing, so requests queued meanwhile can still go first
+            wait = self._next_slot - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if self._heap:
+                finish, _, flow, future = heapq.heappop(self._heap)
+                if future.done():  # The caller gave up waiting
+                    continue
+                self._virtual_time = finish
+            else:
+                flow, future = self._background.popleft()
+                if future.done():  # Gave up waiting, or promoted and let through already
+                    continue
+            self._next_slot = time.monotonic() + self.min_delay
+            self.served[flow] += 1
+            future.set_result(None)
+        # Idle, so every flow has caught up and the old tags no longer matter
+        self._finish_tags.clear()
+        self._virtual_time = 0.0
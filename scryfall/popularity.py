@@ -0,0 +1,114 @@
+import time
+import heapq
+import base64
+import hashlib
+from array import array
+from operator import itemgetter
+
+
+def lookup_key(card_name: str, set_code: str = None) -> str:
+    """How a lookup is counted: the name as written, in the form the response cache keys it, and the set"""
+    name = " ".join(card_name.lower().split())
+    return f"{name}|{set_code.strip().lower()}" if set_code and set_code.strip() else name
+
+
+class PopularityTracker:
+    """Approximate lookup counts in fixed memory, with the most looked up keys kept ranked
+
+    A count-min sketch of depth rows of width counters estimates any key's count (never
+    under it, and rarely much over), and the k keys with the highest estimates are kept
+    in a min-heap. Counts halve every half_life seconds through decay(), so a card that
+    stops being looked up falls out of the top over time.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, k: int = 500, half_life: float = 86400):
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.half_life = half_life
+        self.decayed_at = time.time()
+        self._rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+        self._top = {}  # key -> estimate, for the k keys with the highest estimates
+        self._heap = []  # (estimate, key), keeping stale entries of keys whose estimate has since grown
+
+    def __len__(self):
+        return len(self._top)
+
+    def _columns(self, key: str) -> list:
+        # A stable hash rather than hash(), so a saved sketch still matches after a restart
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width for row in range(self.depth)]
+
+    def estimate(self, key: str) -> float:
+        return min(row[column] for row, column in zip(self._rows, self._columns(key)))
+
+    def add(self, key: str, count: float = 1.0):
+        columns = self._columns(key)
+        # Conservative update: only counters below the new estimate are raised, which keeps
+        # keys that share counters from inflating each other
+        estimate = min(row[column] for row, column in zip(self._rows, columns)) + count
+        for row, column in zip(self._rows, columns):
+            if row[column] < estimate:
+                row[column] = estimate
+
+        if key in self._top or len(self._top) < self.k:
+            self._top[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        else:
+            lowest, lowest_key = self._lowest()
+            if estimate <= lowest:
+                return
+            heapq.heappop(self._heap)
+            del self._top[lowest_key]
+            self._top[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 2 * self.k + 16:
+            self._rebuild_heap()
+
+    def _lowest(self) -> tuple:
+        """The (estimate, key) of the lowest ranked key, discarding stale heap entries on the way"""
+        while self._top.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def _rebuild_heap(self):
+        self._heap = [(estimate, key) for key, estimate in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n: int) -> list:
+        """The n most looked up keys as (key, estimated count), highest first"""
+        return heapq.nlargest(n, self._top.items(), key=itemgetter(1))
+
+    def decay(self, now: float = None):
+        """Scale every count down by the time passed since the last decay"""
+        now = time.time() if now is None else now
+        factor = 0.5 ** (max(now - self.decayed_at, 0.0) / self.half_life)
+        self.decayed_at = now
+        self._rows = [array("d", (count * factor for count in row)) for row in self._rows]
+        self._top = {key: estimate * factor for key, estimate in self._top.items()}
+        self._rebuild_heap()
+
+    def dump(self) -> dict:
+        """The sketch and top keys as JSON-serializable data, for saving"""
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "decayed_at": self.decayed_at,
+            "rows": [base64.b64encode(row.tobytes()).decode("ascii") for row in self._rows],
+            "top": self._top,
+        }
+
+    def load(self, state: dict) -> bool:
+        """Restore data from dump(); False if it came from a sketch of another shape"""
+        if state.get("width") != self.width or state.get("depth") != self.depth:
+            return False
+        rows = []
+        for encoded in state["rows"]:
+            row = array("d")
+            row.frombytes(base64.b64decode(encoded))
+            rows.append(row)
+        self._rows = rows
+        self._top = dict(heapq.nlargest(self.k, state["top"].items(), key=itemgetter(1)))
+        self._rebuild_heap()
+        self.decayed_at = state["decayed_at"]
+        return True
@@ -1,16 +1,33 @@
+import os
 import re
 import aiohttp
 import asyncio
 import time
 from typing import Optional
+from telemetry.metrics import SCRYFALL_REQUESTS, SCRYFALL_REQUEST_LATENCY, RATE_LIMIT_WAIT, CACHE_LOOKUPS
+from telemetry.tracing import span
+from telemetry.log import get_logger
+from .cache import TTLCache
+from .coordinator import CoordinatorClient
+from .fair_queue import FairQueue, current_flow, in_background
+
+log = get_logger(__name__)
 
 
 class ScryfallAPI:
-    BASE_URL = "https://api.scryfall.com"
+    BASE_URL = os.getenv("SCRYFALL_BASE_URL", "https://api.scryfall.com")
     _session = None
     _semaphore = asyncio.Semaphore(10)  # Max 10 concurrent requests
-    _last_request_time = 0
     _min_delay = 0.1  # 100ms between requests (10 per second)
+    COLLECTION_BATCH_SIZE = 75  # Most identifiers Scryfall takes in one /cards/collection request
+    _fair_queue = FairQueue(_min_delay)  # Shares those requests out between guilds
+    # Responses by URL. Card data changes rarely, prices at most daily.
+    _cache = TTLCache(
+        max_entries=int(os.getenv("SCRYFALL_CACHE_SIZE", "4096")),
+        ttl=float(os.getenv("SCRYFALL_CACHE_TTL", "3600")),
+    )
+    _inflight = {}  # URL -> task fetching it, so concurrent lookups share one request
+    _coordinator: Optional[CoordinatorClient] = None  # Set in cluster mode
 
     @classmethod
     async def get_session(cls) -> aiohttp.ClientSession:
@@ -19,51 +36,258 @@ class ScryfallAPI:
             cls._session = aiohttp.ClientSession()
         return cls._session
 
+    @classmethod
+    def use_coordinator(cls, path: str):
+        """Share the response cache and rate limit with other processes through a Coordinator"""
+        cls._coordinator = CoordinatorClient(path)
+
     @classmethod
     async def close(cls):
         """Close the session"""
         if cls._session:
             await cls._session.close()
             cls._session = None
+        if cls._coordinator:
+            await cls._coordinator.close()
+
+    @classmethod
+    async def _coordinator_call(cls, method, *args):
+        """Call the coordinator, dropping back to this process's own cache and limit if it is gone"""
+        try:
+            with span("coordinator"):
+                return await method(*args)
+        except (OSError, ConnectionError) as e:
+            log.warning("Lost the cluster coordinator, continuing without it", error=e)
+            cls._coordinator = None
+            return None
 
     @classmethod
-    async def _rate_limited_request(cls, url: str) -> Optional[dict]:
-        """Make a rate-limited request to Scryfall"""
-        # Ensure minimum delay between requests
-        current_time = time.time()
-        time_since_last = current_time - cls._last_request_time
-        if time_since_last < cls._min_delay:
-            await asyncio.sleep(cls._min_delay - time_since_last)
+    async def _wait_for_slot(cls, key: str = None):
+        """Sleep until this request may go out without breaking the rate limit
+
+        A background request for key is moved ahead when a lookup joins it; see _rate_limited_request.
+        """
+        start = time.perf_counter()
+        with span("scryfall rate limit"):
+            # Take turns with the other guilds, which also keeps this process to the minimum delay
+            await cls._fair_queue.acquire(current_flow.get(), background=in_background.get(), key=key)
+
+            if cls._coordinator:
+                wait = await cls._coordinator_call(cls._coordinator.acquire)
+                if wait is not None:
+                    await asyncio.sleep(wait)
+        RATE_LIMIT_WAIT.observe(time.perf_counter() - start)
 
+    @classmethod
+    async def _fetch(cls, url: str, payload: dict = None) -> Optional[dict]:
+        """GET the url, or POST payload to it as JSON when one is given"""
+        # GETs can be joined by other lookups, so their URL lets a joiner promote them
+        await cls._wait_for_slot(url if payload is None else None)
         async with cls._semaphore:
             session = await cls.get_session()
-            cls._last_request_time = time.time()
-            async with session.get(url) as response:
-                return await response.json() if response.status == 200 else None
+            start = time.perf_counter()
+            try:
+                with span("scryfall request"):
+                    request = session.get(url) if payload is None else session.post(url, json=payload)
+                    async with request as response:
+                        SCRYFALL_REQUESTS.inc(str(response.status))
+                        return await response.json() if response.status == 200 else None
+            except aiohttp.ClientError:
+                SCRYFALL_REQUESTS.inc("error")
+                raise
+            finally:
+                SCRYFALL_REQUEST_LATENCY.observe(time.perf_counter() - start)
 
     @classmethod
-    async def _get_card_named(cls, card_name: str, set_code: str = None) -> Optional[dict]:
-        """Base method to fetch a card by name"""
+    async def _rate_limited_request(cls, url: str, cache: bool = True, min_ttl: float = 0.0) -> Optional[dict]:
+        """Make a rate-limited request to Scryfall, answering from the cache when possible
+
+        Cached responses expiring within min_ttl seconds are fetched again.
+        """
+        if not cache:
+            return await cls._fetch(url)
+
+        data = cls._cache.get(url, min_ttl)
+        if data is not None:
+            CACHE_LOOKUPS.inc("hit")
+            return data
+
+        # Join an identical request that is already in flight. Callers wait through a shield,
+        # so one giving up (a timeout, a cancelled lookup) never cancels the others' request.
+        if url in cls._inflight:
+            CACHE_LOOKUPS.inc("shared")
+            if not in_background.get():
+                # A prewarm fetch waiting for spare capacity now has a lookup waiting on it
+                cls._fair_queue.promote(url, current_flow.get())
+            with span("scryfall joined request"):
+                return await asyncio.shield(cls._inflight[url])
+        CACHE_LOOKUPS.inc("miss")
+        task = asyncio.ensure_future(cls._cached_fetch(url))
+        cls._inflight[url] = task
+        task.add_done_callback(lambda done: cls._fetch_done(url, done))
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _fetch_done(cls, url: str, task: asyncio.Task):
+        if cls._inflight.get(url) is task:
+            del cls._inflight[url]
+        # Retrieve the error, so one nobody was left waiting for isn't logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    async def _cached_fetch(cls, url: str) -> Optional[dict]:
+        if cls._coordinator:
+            data = await cls._coordinator_call(cls._coordinator.cache_get, url)
+            if data is not None:
+                cls._cache.set(url, data)
+                return data
+
+        data = await cls._fetch(url)
+        if data is not None:
+            cls._cache.set(url, data)
+            if cls._coordinator:
+                await cls._coordinator_call(cls._coordinator.cache_set, url, data)
+        return data
+
+    @classmethod
+    def _named_url(cls, card_name: str, set_code: str = None) -> str:
+        # Fuzzy matching ignores case and spacing, so every way of writing a name shares one cache entry
+        card_name = " ".join(card_name.lower().split())
         if set_code:
-            url = f"{cls.BASE_URL}/cards/named?fuzzy={card_name}&set={set_code}"
-        else:
-            url = f"{cls.BASE_URL}/cards/named?fuzzy={card_name}"
-        return await cls._rate_limited_request(url)
+            return f"{cls.BASE_URL}/cards/named?fuzzy={card_name}&set={set_code}"
+        return f"{cls.BASE_URL}/cards/named?fuzzy={card_name}"
+
+    @classmethod
+    async def _get_card_named(cls, card_name: str, set_code: str = None, min_ttl: float = 0.0) -> Optional[dict]:
+        """Base method to fetch a card by name"""
+        data = await cls._rate_limited_request(cls._named_url(card_name, set_code), min_ttl=min_ttl)
+        if data and data.get("id"):
+            # Later lookups by id, such as pagination buttons, can reuse this response
+            cls._cache.set(f"{cls.BASE_URL}/cards/{data['id']}", data)
+        return data
+
+    @classmethod
+    async def _get_card_by_id(cls, card_id: str) -> Optional[dict]:
+        """Base method to fetch a card by its Scryfall id"""
+        return await cls._rate_limited_request(f"{cls.BASE_URL}/cards/{card_id}")
 
     @classmethod
     async def _get_card_random(cls) -> Optional[dict]:
         """Base method to fetch a random card"""
         url = f"{cls.BASE_URL}/cards/random"
-        return await cls._rate_limited_request(url)
+        return await cls._rate_limited_request(url, cache=False)
+
+    @classmethod
+    def _collection_key(cls, identifier: dict):
+        if "id" in identifier:
+            return identifier["id"]
+        return identifier["name"].lower(), (identifier.get("set") or "").lower()
+
+    @classmethod
+    def _collection_url(cls, identifier: dict) -> str:
+        """The URL a lookup of this card by itself would cache its response under"""
+        if "id" in identifier:
+            return f"{cls.BASE_URL}/cards/{identifier['id']}"
+        return cls._named_url(identifier["name"], identifier.get("set"))
+
+    @classmethod
+    async def prewarm(cls, card_name: str, set_code: str = None, min_ttl: float = 0.0) -> bool:
+        """
+        Cache a card's lookup, rulings and printings, fetching any missing or expiring within min_ttl seconds
+
+        Run with in_background set, so the requests only take slots no lookup is waiting for.
+
+        Returns:
+            bool: False if the card was not found
+        """
+        data = await cls._get_card_named(card_name, set_code, min_ttl)
+        if not data:
+            return False
+        for url in (data.get("rulings_uri"), data.get("prints_search_uri")):
+            if url:
+                await cls._rate_limited_request(url, min_ttl=min_ttl)
+        return True
+
+    @classmethod
+    async def get_collection(cls, identifiers: list) -> Optional[list]:
+        """
+        Cards for many {"id": ...} or {"name": ..., "set": ...} identifiers ("set" optional) at once
+
+        Cards already in the response cache are not fetched again; the rest are fetched
+        COLLECTION_BATCH_SIZE at a time from /cards/collection, which matches exact names.
+
+        Returns:
+            list: Card data for each identifier in order, None for those not found, or
+                None instead of the list if Scryfall could not be reached
+        """
+        keys = [cls._collection_key(identifier) for identifier in identifiers]
+        found = {}
+        missing = {}  # key -> identifier, each card asked for once however often it is listed
+        for key, identifier in zip(keys, identifiers):
+            data = cls._cache.get(cls._collection_url(identifier))
+            if data is not None:
+                CACHE_LOOKUPS.inc("hit")
+                found[key] = data
+            elif key not in found and key not in missing:
+                CACHE_LOOKUPS.inc("miss")
+                missing[key] = identifier
+
+        missing = list(missing.values())
+        batches = [missing[start:start + cls.COLLECTION_BATCH_SIZE]
+                   for start in range(0, len(missing), cls.COLLECTION_BATCH_SIZE)]
+        responses = await asyncio.gather(
+            *(cls._fetch(f"{cls.BASE_URL}/cards/collection", {"identifiers": batch}) for batch in batches))
+        if any(response is None for response in responses):
+            return None
+
+        for batch, response in zip(batches, responses):
+            # Scryfall leaves out cards it can't find, so match what came back by id or name
+            by_key = {}
+            for data in response.get("data", []):
+                by_key[data.get("id")] = data
+                names = [data.get("name", "")] + [face.get("name", "") for face in data.get("card_faces", [])]
+                for name in names:
+                    by_key[name.lower(), ""] = data
+                    by_key[name.lower(), data.get("set", "").lower()] = data
+            for identifier in batch:
+                key = cls._collection_key(identifier)
+                data = by_key.get(key)
+                if data is None:
+                    continue
+                found[key] = data
+                # Later lookups of these cards, by name or id, can reuse the response
+                cls._cache.set(cls._collection_url(identifier), data)
+                if data.get("id"):
+                    cls._cache.set(f"{cls.BASE_URL}/cards/{data['id']}", data)
+        return [found.get(key) for key in keys]
 
     @staticmethod
-    def _get_card_images(data: dict) -> list:
-        """Helper method to extract card images"""
-        if "card_faces" in data and "image_uris" in data["card_faces"][0]:
-            image = data["card_faces"][0]["image_uris"]["large"]
+    def usd_price(data: Optional[dict], finish: str = None) -> float:
+        """
+        The card's USD price, or its foil or etched price if it has no other, NaN if it has none
+
+        Args:
+            finish: "foil" or "etched" for the price of that finish alone
+        """
+        prices = (data or {}).get("prices") or {}
+        if finish:
+            price = prices.get(f"usd_{finish}")
         else:
-            image = data["image_uris"]["large"] if "image_uris" in data else None
-        return [image] if image else []
+            price = prices.get("usd") or prices.get("usd_foil") or prices.get("usd_etched")
+        return float(price) if price else float("nan")
+
+    @staticmethod
+    def _get_card_images(data: dict) -> list:
+        """Large image of each face; cards with one image for every face (split, flip) have one"""
+        if "image_uris" in data:
+            return [data["image_uris"]["large"]]
+        return [face["image_uris"]["large"] for face in data.get("card_faces", []) if "image_uris" in face]
+
+    @staticmethod
+    def _front_image_uris(data: dict) -> dict:
+        """Image URIs by size of the card, or of its front face when each face has its own"""
+        return data.get("image_uris") or (data.get("card_faces") or [{}])[0].get("image_uris") or {}
 
     @staticmethod
     def _get_mana_types(mana: str) -> list:
@@ -74,6 +298,20 @@ class ScryfallAPI:
         mana_types = re.findall(reg, mana)
         return [f'mana{mana_type.lower()}' for mana_type in mana_types]
 
+    @classmethod
+    def get_cached_card(cls, card_name: str, set_code: str = None) -> Optional[dict]:
+        """The card's name, link and small image if its lookup is cached, without fetching anything"""
+        data = cls._cache.get(cls._named_url(card_name, set_code))
+        if not data:
+            return None
+
+        images = cls._front_image_uris(data)
+        return {
+            "name": data.get("name"),
+            "scryfall_uri": data.get("scryfall_uri"),
+            "small_image": images.get("small"),
+        }
+
     @classmethod
     async def get_random_card(cls):
         data = await cls._get_card_random()
@@ -88,7 +326,14 @@ class ScryfallAPI:
 
     @classmethod
     async def get_rulings(cls, card_name: str, set_code: str = None) -> Optional[dict]:
-        data = await cls._get_card_named(card_name, set_code)
+        return await cls._rulings_for(await cls._get_card_named(card_name, set_code))
+
+    @classmethod
+    async def get_rulings_by_id(cls, card_id: str) -> Optional[dict]:
+        return await cls._rulings_for(await cls._get_card_by_id(card_id))
+
+    @classmethod
+    async def _rulings_for(cls, data: Optional[dict]) -> Optional[dict]:
         if not data:
             return None
 
@@ -97,6 +342,7 @@ class ScryfallAPI:
             rulings_data = await cls._rate_limited_request(rulings_uri)
             if rulings_data:
                 return {
+                    "id": data.get("id"),
                     "name": data.get("name"),
                     "scryfall_uri": data.get("scryfall_uri"),
                     "rulings": [
@@ -154,6 +400,21 @@ class ScryfallAPI:
                 }
         return None
 
+    @classmethod
+    async def get_printing(cls, card_name: str, set_code: str = None) -> Optional[dict]:
+        """The printing a lookup of the card finds, with its current USD price (NaN if none)"""
+        data = await cls._get_card_named(card_name, set_code)
+        if not data:
+            return None
+
+        return {
+            "id": data.get("id"),
+            "name": data.get("name"),
+            "set": data.get("set"),
+            "scryfall_uri": data.get("scryfall_uri"),
+            "price": cls.usd_price(data),
+        }
+
     @classmethod
     async def get_image(cls, card_name: str, set_code: str = None):
         if card_name == "random":
@@ -165,6 +426,7 @@ class ScryfallAPI:
             return None
 
         return {
+            "id": data.get("id"),
             "name": data.get("name"),
             "images": cls._get_card_images(data),
             "scryfall_uri": data.get("scryfall_uri"),
@@ -181,14 +443,21 @@ class ScryfallAPI:
             "scryfall_uri": data.get("scryfall_uri"),
             "oracle_text": data.get("oracle_text"),
             "mana_cost": cls._get_mana_types(data.get("mana_cost")),
-            "small_image": data["image_uris"]["small"],
+            "small_image": cls._front_image_uris(data).get("small"),
             "type_line": data.get("type_line"),
             "oracle_text": data.get("oracle_text")
         }
 
     @classmethod
     async def get_sets(cls, card_name: str) -> Optional[dict]:
-        data = await cls._get_card_named(card_name)
+        return await cls._sets_for(await cls._get_card_named(card_name))
+
+    @classmethod
+    async def get_sets_by_id(cls, card_id: str) -> Optional[dict]:
+        return await cls._sets_for(await cls._get_card_by_id(card_id))
+
+    @classmethod
+    async def _sets_for(cls, data: Optional[dict]) -> Optional[dict]:
         if not data:
             return None
 
@@ -197,6 +466,7 @@ class ScryfallAPI:
             prints_data = await cls._rate_limited_request(prints_search_uri)
             if prints_data:
                 return {
+                    "id": data.get("id"),
                     "name": data.get("name"),
                     "scryfall_uri": data.get("scryfall_uri"),
                     "sets": [
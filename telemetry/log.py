@@ -0,0 +1,173 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from collections import OrderedDict
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for key=value lines, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# A message logged with a repeat key and repeated within this many seconds is counted instead of written; 0 writes every one
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", "60"))
+# Records waiting for the writer thread; past this they are dropped rather than block the bot
+LOG_QUEUE_SIZE = 10000
+MAX_TRACKED_MESSAGES = 1000
+# Keyword arguments that logging itself takes; any others become fields of the record
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+_pid = None
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger taking fields as keyword arguments: log.info("Posted card", guild=1, channel=2)
+
+    Keep the message itself constant and put what varies in fields, which keeps the JSON
+    output queryable. Messages that can flood pass extra={"repeat_key": ...}; see RepeatFilter.
+    """
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+class RepeatFilter(logging.Filter):
+    """Drops repeats of a message within a window, then notes how many were dropped
+
+    Only records logged with extra={"repeat_key": ...} are deduplicated, told apart by
+    logger, level, message and key but not their other fields, so a warning repeated for
+    the same key is written once a window with a repeated= count on the next one. Every
+    other record is written, as ones differing only in their fields say different things.
+    """
+
+    def __init__(self, window: float):
+        super().__init__()
+        self.window = window
+        self._seen = OrderedDict()  # (logger, level, message, repeat key) -> [written at, repeats dropped since]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        repeat_key = getattr(record, "repeat_key", None)
+        if not self.window or repeat_key is None:
+            return True
+        key = (record.name, record.levelno, record.msg, repeat_key)
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                return False
+            if seen is not None and seen[1]:
+                record.fields = {**getattr(record, "fields", {}), "repeated": seen[1]}
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            while len(self._seen) > MAX_TRACKED_MESSAGES:
+                self._seen.popitem(last=False)
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """time LEVEL logger: message key=value ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if record.processName != "MainProcess":
+            line = f"{line} process={record.processName}"
+        for key, value in getattr(record, "fields", {}).items():
+            if isinstance(value, (list, dict)):
+                text = json.dumps(value, default=str)
+            else:
+                text = str(value)
+                text = json.dumps(text) if not text or " " in text or "\n" in text else text
+            line += f" {key}={text}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.processName != "MainProcess":
+            entry["process"] = record.processName
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread, dropping them if it has fallen too far behind"""
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but keeps the traceback apart for the formatter to place
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.dropped:
+            record.fields = {**getattr(record, "fields", {}), "dropped": self.dropped}
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than lose the sentinel when the queue is full at exit
+        self.queue.put(self._sentinel)
+
+
+def setup_logging():
+    """Send logging through a queue to a writer thread, so the event loop never waits on stdout
+
+    Runs once per process; get_logger() calls it, so modules need not.
+    """
+    global _pid
+    if _pid == os.getpid():
+        return
+    _pid = os.getpid()
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _QueueHandler(records)
+    handler.addFilter(RepeatFilter(LOG_REPEAT_WINDOW))
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # py-cord is chatty at INFO about gateway sessions
+    logging.getLogger("discord").setLevel(max(root.level, logging.WARNING))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    listener = _QueueListener(records, output)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    setup_logging()
+    return StructuredLogger(logging.getLogger(name), {})
@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from .profiler import EventLoopProfiler
+from .log import get_logger
+
+# Port for the Prometheus metrics endpoint; 0 leaves it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# How often the event loop is checked for lag, in seconds
+LOOP_LAG_INTERVAL = 0.5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+log = get_logger(__name__)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> value
+
+    def _label_text(self, values, extra=""):
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in list(self._values.items()):
+            lines.append(f"{self.name}{self._label_text(values)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+    def clear(self):
+        self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        # Per bucket counts plus an overflow slot, then the sum; made cumulative when rendered
+        series = self._values.get(label_values)
+        if series is None:
+            series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in list(self._values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                bound_label = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._label_text(values, bound_label)} {total}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {series[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {total}")
+        return lines
+
+
+class Registry:
+    """Every metric, plus collectors that refresh gauges from live state right before a scrape"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                log.exception("Metrics collector failed", collector=collector.__qualname__)
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = REGISTRY.histogram(
+    "command_latency_seconds", "Time to answer a slash command or page button", ("command",))
+LOOKUP_LATENCY = REGISTRY.histogram(
+    "lookup_latency_seconds", "Time to build a [[card]] lookup's embeds, by embed type", ("embed_type",))
+SCRYFALL_REQUESTS = REGISTRY.counter(
+    "scryfall_requests_total", "Requests sent to Scryfall, by HTTP status", ("status",))
+SCRYFALL_REQUEST_LATENCY = REGISTRY.histogram(
+    "scryfall_request_seconds", "Time for Scryfall to answer a request")
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "scryfall_rate_limit_wait_seconds", "Time requests waited for a Scryfall rate limit slot")
+CACHE_LOOKUPS = REGISTRY.counter(
+    "scryfall_cache_lookups_total", "Cacheable Scryfall lookups, by where the answer came from", ("result",))
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_seconds", "Time for a database call, including its wait for a worker thread", ("method",))
+SEND_QUEUE_WAIT = REGISTRY.histogram(
+    "send_queue_wait_seconds", "Time outgoing messages waited in the send queue", ("priority",))
+SHARD_LATENCY = REGISTRY.gauge(
+    "gateway_latency_seconds", "Heartbeat latency of each gateway shard", ("shard",))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "queue_depth", "Work waiting in each internal queue", ("queue",))
+CACHE_ENTRIES = REGISTRY.gauge(
+    "scryfall_cache_entries", "Responses held in the Scryfall cache")
+GUILD_LOOKUPS = REGISTRY.gauge(
+    "guild_lookups", "[[card]] lookup usage of the busiest guilds", ("guild", "kind"))
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer, a sign of blocking work",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+async def _watch_loop_lag():
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL))
+
+
+class MetricsServer:
+    """Serves REGISTRY at /metrics over HTTP, and watches event loop lag while running
+
+    /debug/profile?seconds=N samples the event loop for N seconds and answers with a flame
+    profile in collapsed-stack form.
+    """
+
+    def __init__(self, port: int = METRICS_PORT, host: str = METRICS_HOST):
+        self.port = port
+        self.host = host
+        self._runner = None
+        self._lag_task = None
+        self._profiler = EventLoopProfiler()
+
+    async def start(self):
+        # Only pull in aiohttp's server side when metrics are turned on
+        from aiohttp import web
+
+        async def metrics(request):
+            return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+        async def profile(request):
+            try:
+                seconds = float(request.query.get("seconds", "10"))
+            except ValueError:
+                return web.Response(status=400, text="seconds must be a number")
+            if self._profiler.running:
+                return web.Response(status=409, text="A profile is already being taken")
+            return web.Response(text=await self._profiler.profile(seconds), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", metrics)
+        app.router.add_get("/debug/profile", profile)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(_watch_loop_lag())
+        log.info("Serving metrics", url=f"http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
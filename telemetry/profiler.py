@@ -0,0 +1,73 @@
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+
+# Longest profile one request may ask for, in seconds
+MAX_PROFILE_SECONDS = 60
+PROFILE_INTERVAL = 0.005
+# GIL switch interval while profiling. The sampler can only look when the loop thread lets go
+# of the GIL, which it otherwise does mostly while idle in select(), hiding short callbacks.
+PROFILE_SWITCH_INTERVAL = 0.0002
+
+
+def _stack(frame) -> tuple:
+    """A frame's call stack, outermost first, as "function (file:line)" labels"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def sample(thread_id: int, seconds: float, interval: float = PROFILE_INTERVAL) -> Counter:
+    """Sample a thread's stack every interval for some seconds, counting each stack seen
+
+    Runs in its own thread; the sampled thread is only read, never paused.
+    """
+    counts = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        counts[_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    """Stacks in the collapsed format flamegraph.pl and speedscope read: "outer;inner count" lines"""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+
+class EventLoopProfiler:
+    """Captures flame profiles of the thread running the event loop, one at a time"""
+
+    def __init__(self):
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def profile(self, seconds: float) -> str:
+        """Sample the event loop for some seconds and return the collapsed stacks
+
+        Raises RuntimeError if another profile is still being taken.
+        """
+        if self._running:
+            raise RuntimeError("A profile is already being taken")
+        self._running = True
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(PROFILE_SWITCH_INTERVAL)
+        try:
+            seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+            counts = await asyncio.to_thread(sample, threading.get_ident(), seconds)
+        finally:
+            sys.setswitchinterval(switch_interval)
+            self._running = False
+        return collapsed(counts)
@@ -0,0 +1,85 @@
+import os
+import gzip
+import time
+import asyncio
+import hashlib
+import itertools
+from .log import get_logger
+
+# Append anonymized [[card]] lookups to this gzip file for replaying later; empty leaves it off
+LOOKUP_RECORD_PATH = os.getenv("LOOKUP_RECORD_PATH", "")
+# Keyed into the guild hashes; set it to keep a guild's hash the same across restarts
+LOOKUP_RECORD_SALT = os.getenv("LOOKUP_RECORD_SALT", "") or os.urandom(16).hex()
+RECORD_FLUSH_SECONDS = 10
+LOOKUP_PREFIXES = "!$?#@"
+log = get_logger(__name__)
+
+
+def parse_lookup(lookup: str):
+    """Split a [[...]] lookup into (prefix, normalized name, set code) the way the bot reads it"""
+    card_parts = lookup.split('|')
+    name = card_parts[0].strip()
+    set_code = card_parts[1].strip().lower() if len(card_parts) > 1 else ""
+    prefix = name[:1] if name[:1] in LOOKUP_PREFIXES else ""
+    name = " ".join(name[len(prefix):].lower().split())
+    return prefix, name, set_code
+
+
+class LookupRecorder:
+    """Writes anonymized lookup events to a compact log for benchmarks/replay.py
+
+    Each line is tab separated: time, message number, guild hash, prefix, set code and
+    the lowercased card name. Lookups from the same message share a message number. No
+    user, channel or message content is kept, and guild ids are replaced by a salted hash.
+    Events are buffered and written from a worker thread every few seconds.
+    """
+
+    def __init__(self, path: str = LOOKUP_RECORD_PATH, salt: str = LOOKUP_RECORD_SALT):
+        self.path = path
+        self.salt = salt.encode()
+        self._buffer = []
+        self._messages = itertools.count()
+        self._task = None
+
+    def _guild_hash(self, guild_id) -> str:
+        if guild_id is None:
+            return "dm"
+        return hashlib.blake2b(str(guild_id).encode(), key=self.salt, digest_size=6).hexdigest()
+
+    def record(self, guild_id, lookups):
+        """Record the lookups found in one message"""
+        now = f"{time.time():.3f}"
+        message = next(self._messages)
+        guild = self._guild_hash(guild_id)
+        for lookup in lookups:
+            prefix, name, set_code = parse_lookup(lookup)
+            self._buffer.append(f"{now}\t{message}\t{guild}\t{prefix}\t{set_code}\t{name}\n")
+
+    def _write(self, lines):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Each flush adds a gzip member; readers see one continuous file
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.writelines(lines)
+
+    async def flush(self):
+        lines, self._buffer = self._buffer, []
+        if lines:
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except OSError as e:
+                log.warning("Could not write lookup recording", path=self.path, error=e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(RECORD_FLUSH_SECONDS)
+            await self.flush()
@@ -0,0 +1,76 @@
+import os
+import time
+from contextvars import ContextVar
+from .log import get_logger
+
+# Log the span breakdown of requests slower than this many seconds; 0 turns it off
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2.0"))
+# Spans kept per request, so a runaway request can't grow its trace without end
+MAX_SPANS = 200
+
+# (trace, start offsets of the enclosing spans) for the request this task is working on,
+# copied into the tasks it starts
+_current = ContextVar("trace", default=None)
+log = get_logger(__name__)
+
+
+class Trace:
+    """The timed stages of one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []  # (start offsets of the span and its parents, duration, name)
+
+    def breakdown(self) -> list:
+        """One "+start duration name" line per span, indented under its parent"""
+        # Sorting by the offsets path puts every span right after its parent
+        return [f"{'  ' * (len(path) - 1)}+{path[-1]:.3f}s {duration:.3f}s {name}"
+                for path, duration, name in sorted(self.spans)]
+
+
+class span:
+    """Times a stage of the current request; does nothing outside of a trace
+
+    Works around awaits, and stages run in tasks started inside it are nested under it.
+    """
+    __slots__ = ("name", "_trace", "_path", "_start", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        current = _current.get()
+        if current is not None:
+            self._trace, parents = current
+            self._start = time.perf_counter()
+            self._path = parents + (self._start - self._trace.start,)
+            self._token = _current.set((self._trace, self._path))
+        return self
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            _current.reset(self._token)
+            if len(self._trace.spans) < MAX_SPANS:
+                self._trace.spans.append((self._path, time.perf_counter() - self._start, self.name))
+
+
+class trace:
+    """Traces one request, logging its span breakdown if it takes over SLOW_REQUEST_SECONDS"""
+    __slots__ = ("trace", "_token")
+
+    def __init__(self, name: str):
+        self.trace = Trace(name)
+
+    def __enter__(self):
+        self.trace.start = time.perf_counter()
+        self._token = _current.set((self.trace, ()))
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        total = time.perf_counter() - self.trace.start
+        if SLOW_REQUEST_SECONDS and total >= SLOW_REQUEST_SECONDS:
+            log.warning("Slow request", request=self.trace.name, seconds=round(total, 3),
+                        stages=self.trace.breakdown(), extra={"repeat_key": self.trace.name})
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from database.db import Database, MIGRATIONS
+
+
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "guild_settings.db")
+        self.addCleanup(Database._settings_cache.pop, self.path, None)
+        self.addCleanup(Database.close_connections)
+
+    def test_migrates_a_database_from_before_versioning(self):
+        # The original table, before embed_color and user_version existed
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE guild_settings (guild_id INTEGER PRIMARY KEY, random_card_schedule TEXT)')
+        conn.execute("INSERT INTO guild_settings VALUES (1, '0 9 * * *')")
+        conn.commit()
+        conn.close()
+
+        db = Database(self.path)
+        version = db._connect().execute('PRAGMA user_version').fetchone()[0]
+        self.assertEqual(version, len(MIGRATIONS))
+        self.assertIn('embed_color', db.get_all_setting_keys())
+        self.assertIn('random_card_last_posted', db.get_all_setting_keys())
+        self.assertEqual(db.get_random_card_schedule(1), '0 9 * * *')
+        self.assertEqual(db.get_price_watches(), [])
+
+    def test_migrations_are_not_applied_twice(self):
+        Database(self.path)
+        Database.close_connections()
+        Database._settings_cache.pop(self.path)
+        # _add_last_posted would fail on the existing column if it ran again
+        db = Database(self.path)
+        self.assertEqual(db._connect().execute('PRAGMA user_version').fetchone()[0], len(MIGRATIONS))
+
+    def test_failed_batch_rolls_back_the_database_and_settings(self):
+        db = Database(self.path)
+        db.set_embed_color(1, "FF0000")
+        with self.assertRaises(RuntimeError):
+            with db.batch():
+                db.set_embed_color(1, "00FF00")
+                db.set_random_card_schedule(2, "0 9 * * *")
+                raise RuntimeError
+
+        self.assertEqual(db.get_embed_color(1).value, 0xFF0000)
+        self.assertIsNone(db.get_guild_settings(2))
+        stored = db._connect().execute('SELECT guild_id, embed_color FROM guild_settings').fetchall()
+        self.assertEqual(stored, [(1, "FF0000")])
+
+    def test_batch_commits_every_write(self):
+        db = Database(self.path)
+        with db.batch():
+            db.set_embed_color(1, "FF0000")
+            db.set_random_card_channel_id(1, "42")
+        Database.close_connections()
+        Database._settings_cache.pop(self.path)
+        self.assertEqual(Database(self.path).get_random_card_channel_id(1), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from not_scryfall.decks import DeckEntry, parse_decklist
+
+
+class ParseDecklistTest(unittest.TestCase):
+    def test_sections_comments_and_sideboard(self):
+        text = "// Burn\nDeck\n4 Lightning Bolt\n\n20x Mountain\nSideboard\n2 Smash to Smithereens\nSB: 1 Duress"
+        self.assertEqual(parse_decklist(text), [
+            DeckEntry(4, "Lightning Bolt"),
+            DeckEntry(20, "Mountain"),
+            DeckEntry(2, "Smash to Smithereens", sideboard=True),
+            DeckEntry(1, "Duress", sideboard=True),
+        ])
+
+    def test_set_collector_number_and_finish(self):
+        text = "4 Lightning Bolt (M10) 146 *F*\n1 Sol Ring (CMM) 464 *E*\n2 Counterspell (MH2) 267"
+        self.assertEqual(parse_decklist(text), [
+            DeckEntry(4, "Lightning Bolt", "M10", finish="foil"),
+            DeckEntry(1, "Sol Ring", "CMM", finish="etched"),
+            DeckEntry(2, "Counterspell", "MH2"),
+        ])
+
+    def test_inline_list_split_at_counts(self):
+        self.assertEqual(parse_decklist("4 Lightning Bolt 20 Mountain"), [
+            DeckEntry(4, "Lightning Bolt"),
+            DeckEntry(20, "Mountain"),
+        ])
+
+    def test_inline_list_keeps_collector_numbers(self):
+        self.assertEqual(parse_decklist("4 Lightning Bolt (M10) 146 20 Mountain"), [
+            DeckEntry(4, "Lightning Bolt", "M10"),
+            DeckEntry(20, "Mountain"),
+        ])
+        self.assertEqual(parse_decklist("4 Lightning Bolt (M10) 146 *F* 2x Duress (M19) 94 1 Sol Ring"), [
+            DeckEntry(4, "Lightning Bolt", "M10", finish="foil"),
+            DeckEntry(2, "Duress", "M19"),
+            DeckEntry(1, "Sol Ring"),
+        ])
+
+    def test_inline_list_split_at_semicolons(self):
+        self.assertEqual(parse_decklist("4 Lightning Bolt (M10) 146; 1 1996 World Champion"), [
+            DeckEntry(4, "Lightning Bolt", "M10"),
+            DeckEntry(1, "1996 World Champion"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from not_scryfall.scheduler import CronScheduler
+
+HOURLY = "0 * * * *"
+
+
+class CronSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fired = []
+
+        async def on_due(fire_time, due):
+            self.fired.append((fire_time, due))
+
+        self.scheduler = CronScheduler(on_due)
+        self.addCleanup(self.scheduler.stop)
+
+    async def run_briefly(self):
+        self.scheduler.start()
+        await asyncio.sleep(0.05)
+
+    async def test_missed_fires_are_caught_up_once(self):
+        # Down for three hourly slots; only the first missed one is posted
+        last_posted = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        self.scheduler.set(1, HOURLY, 10, last_posted)
+        await self.run_briefly()
+        self.assertEqual(self.fired, [(last_posted + timedelta(hours=1), [(1, 10)])])
+
+    async def test_fires_older_than_the_catch_up_window_are_skipped(self):
+        self.scheduler.set(1, HOURLY, 10, datetime.now() - timedelta(days=3))
+        await self.run_briefly()
+        self.assertEqual(self.fired, [])
+
+    async def test_new_schedules_wait_for_their_next_fire(self):
+        self.scheduler.set(1, HOURLY, 10)
+        await self.run_briefly()
+        self.assertEqual(self.fired, [])
+
+    async def test_guilds_due_at_the_same_time_fire_together(self):
+        last_posted = datetime.now() - timedelta(hours=2)
+        self.scheduler.set(1, HOURLY, 10, last_posted)
+        self.scheduler.set(2, HOURLY, 20, last_posted)
+        await self.run_briefly()
+        self.assertEqual(len(self.fired), 1)
+        self.assertCountEqual(self.fired[0][1], [(1, 10), (2, 20)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+from scryfall.cache import TTLCache
+from scryfall.fair_queue import FairQueue, current_flow, in_background
+from scryfall.scryfall import ScryfallAPI
+
+
+class FakeResponse:
+    status = 200
+
+    def __init__(self, url):
+        self.url = url
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def json(self):
+        return {"object": "card", "id": self.url}
+
+
+class FakeSession:
+    """Answers every GET at once, counting the requests per URL"""
+
+    def __init__(self):
+        self.requests = {}
+
+    def get(self, url):
+        self.requests[url] = self.requests.get(url, 0) + 1
+        return FakeResponse(url)
+
+
+class InflightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.saved = ScryfallAPI._session, ScryfallAPI._fair_queue, ScryfallAPI._cache, ScryfallAPI._inflight
+        self.session = FakeSession()
+        ScryfallAPI._session = self.session
+        ScryfallAPI._fair_queue = FairQueue(0.02)
+        ScryfallAPI._cache = TTLCache(max_entries=64, ttl=60)
+        ScryfallAPI._inflight = {}
+
+    async def asyncTearDown(self):
+        ScryfallAPI._session, ScryfallAPI._fair_queue, ScryfallAPI._cache, ScryfallAPI._inflight = self.saved
+
+    async def _busy_flow(self, flow):
+        """Keep a request of flow's always queued, so the background lane never gets a spare slot"""
+        current_flow.set(flow)
+        while True:
+            await ScryfallAPI._rate_limited_request(f"busy/{flow}", cache=False)
+
+    async def _background_lookup(self, url):
+        in_background.set(True)
+        return await ScryfallAPI._rate_limited_request(url)
+
+    async def test_lookup_joining_a_background_fetch_is_not_starved(self):
+        busy = [asyncio.create_task(self._busy_flow(flow)) for flow in range(3)]
+        try:
+            await asyncio.sleep(0.05)
+            prewarm = asyncio.create_task(self._background_lookup("card"))
+            await asyncio.sleep(0.1)
+            self.assertFalse(prewarm.done())
+
+            current_flow.set("guild")
+            data = await asyncio.wait_for(ScryfallAPI._rate_limited_request("card"), 1)
+            self.assertEqual(data["id"], "card")
+            self.assertEqual(await prewarm, data)
+            self.assertEqual(self.session.requests["card"], 1)
+        finally:
+            for task in busy:
+                task.cancel()
+            await asyncio.gather(*busy, return_exceptions=True)
+
+    async def test_cancelling_the_first_caller_keeps_the_fetch_for_joiners(self):
+        first = asyncio.create_task(ScryfallAPI._rate_limited_request("card"))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(ScryfallAPI._rate_limited_request("card"))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        data = await asyncio.wait_for(joiner, 1)
+        self.assertEqual(data["id"], "card")
+        self.assertEqual(self.session.requests["card"], 1)
+        self.assertEqual(ScryfallAPI._inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+from not_scryfall.send_queue import SendQueue, INTERACTIVE, SCHEDULED
+
+
+class FakeChannel:
+    """Records what is sent; sends whose content is in gates wait for that event first"""
+
+    def __init__(self, channel_id, log, gates=None):
+        self.id = channel_id
+        self.log = log
+        self.gates = gates or {}
+        self.in_flight = 0
+
+    async def send(self, content=None, **kwargs):
+        self.in_flight += 1
+        try:
+            if content in self.gates:
+                await self.gates[content].wait()
+            self.log.append(content)
+            return content
+        finally:
+            self.in_flight -= 1
+
+
+class SendQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.log = []
+
+    async def asyncTearDown(self):
+        await self.queue.close()
+
+    async def test_replies_go_before_scheduled_posts(self):
+        self.queue = SendQueue(concurrency=1)
+        gate = asyncio.Event()
+        busy = FakeChannel(0, self.log, {"busy": gate})
+        first = asyncio.create_task(self.queue.send(busy, INTERACTIVE, "busy"))
+        await asyncio.sleep(0)
+
+        # Queued while the only sender is busy, the reply overtakes the earlier post
+        posts = [asyncio.create_task(self.queue.send(FakeChannel(1, self.log), SCHEDULED, "post"))]
+        await asyncio.sleep(0)
+        posts.append(asyncio.create_task(self.queue.send(FakeChannel(2, self.log), INTERACTIVE, "reply")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *posts)
+        self.assertEqual(self.log, ["busy", "reply", "post"])
+
+    async def test_scheduled_lane_limit(self):
+        self.queue = SendQueue(concurrency=4, scheduled_concurrency=1)
+        gate = asyncio.Event()
+        channels = [FakeChannel(index, self.log, {"post": gate}) for index in range(3)]
+        posts = [asyncio.create_task(self.queue.send(channel, SCHEDULED, "post")) for channel in channels]
+        await asyncio.sleep(0.05)
+        self.assertEqual(sum(channel.in_flight for channel in channels), 1)
+
+        # A reply still gets one of the free senders
+        reply = FakeChannel(9, self.log)
+        self.assertEqual(await asyncio.wait_for(self.queue.send(reply, INTERACTIVE, "reply"), 1), "reply")
+        gate.set()
+        await asyncio.gather(*posts)
+        self.assertEqual(self.log.count("post"), 3)
+
+    async def test_reply_is_not_stuck_behind_a_full_scheduled_lane(self):
+        self.queue = SendQueue(concurrency=2, scheduled_concurrency=1)
+        post_gate, reply_gate = asyncio.Event(), asyncio.Event()
+        scheduled = FakeChannel(0, self.log, {"post": post_gate})
+        channel = FakeChannel(1, self.log, {"first": reply_gate})
+        post = asyncio.create_task(self.queue.send(scheduled, SCHEDULED, "post"))
+        first = asyncio.create_task(self.queue.send(channel, INTERACTIVE, "first"))
+        await asyncio.sleep(0.01)
+
+        # With both senders busy, the channel queues another reply and then a post, leaving a
+        # ready entry for a reply that is sent by the time that entry comes up
+        second = asyncio.create_task(self.queue.send(channel, INTERACTIVE, "second", view=object()))
+        later_post = asyncio.create_task(self.queue.send(channel, SCHEDULED, "later post"))
+        await asyncio.sleep(0)
+        reply_gate.set()
+        await asyncio.wait_for(asyncio.gather(first, second), 1)
+
+        # The scheduled lane is still full, yet a reply elsewhere goes out
+        other = FakeChannel(2, self.log)
+        self.assertEqual(await asyncio.wait_for(self.queue.send(other, INTERACTIVE, "other"), 1), "other")
+        self.assertFalse(later_post.done())
+        post_gate.set()
+        await asyncio.wait_for(asyncio.gather(post, later_post), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest import mock
+from not_scryfall.bot import ScryfallBot
+from not_scryfall.snapshot import CacheSnapshot
+from scryfall.scryfall import ScryfallAPI
+
+CARD = {"name": "Lightning Bolt", "images": [], "scryfall_uri": "https://scryfall.com/card/m10/146"}
+
+
+class CacheSnapshotTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "snapshot.json.gz")
+        # A bot that picked today's card in card-of-the-day mode before restarting
+        saved_by = SimpleNamespace(_slot_cards={date.today(): CARD})
+        await CacheSnapshot(saved_by, self.path, daily_cards=True).save()
+
+    def test_restores_the_day_card_in_card_of_the_day_mode(self):
+        bot = SimpleNamespace(_slot_cards={})
+        CacheSnapshot(bot, self.path, daily_cards=True).load()
+        self.assertEqual(bot._slot_cards, {date.today(): CARD})
+
+    async def test_slot_keys_stay_datetimes_outside_card_of_the_day_mode(self):
+        bot = SimpleNamespace(_slot_cards={})
+        CacheSnapshot(bot, self.path, daily_cards=False).load()
+        self.assertEqual(bot._slot_cards, {})
+
+        with mock.patch("not_scryfall.bot.SCHEDULED_CARD_OF_THE_DAY", False), \
+                mock.patch.object(ScryfallAPI, "get_random_card", mock.AsyncMock(return_value=CARD)):
+            card = await ScryfallBot._get_slot_card(bot, datetime.now().replace(second=0, microsecond=0))
+        self.assertEqual(card, CARD)
+
+
+if __name__ == "__main__":
+    unittest.main()